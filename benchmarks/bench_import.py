@@ -0,0 +1,71 @@
+'''
+Created on 19.10.2026
+
+Cold import time of the electricity_markets core.
+
+Each module is imported in a fresh interpreter with "-X importtime" and the
+cumulative import time of the module is compared with its budget. The heavy
+dependencies must not be loaded by the import at all.
+'''
+
+import json
+import re
+import subprocess
+import sys
+
+# Budget of the cold import in seconds
+IMPORT_BUDGETS = {
+    "electricity_markets.products": 0.01,
+    "electricity_markets.market_price_generator": 0.05,
+}
+
+# Dependencies that must not be loaded when importing the core
+HEAVY_MODULES = ["pandas", "numpy", "pyomo", "oemof", "matplotlib"]
+
+REPEATS = 5
+
+
+def cold_import(module):
+    '''
+    Imports a module in a fresh interpreter.
+    Returns the cumulative import time in seconds and the heavy modules
+    which were loaded.
+
+    :param module: Name of the module
+    '''
+    code = (
+        f"import json, sys, {module}\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} "
+        f"if m in sys.modules]))")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, check=True)
+
+    cumulative = None
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(\S+)$",
+                         line)
+        if match and match.group(2) == module:
+            cumulative = int(match.group(1)) / 1e6
+
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return cumulative, loaded
+
+
+def main():
+    failed = False
+    for module, budget in IMPORT_BUDGETS.items():
+        results = [cold_import(module) for _ in range(REPEATS)]
+        best = min(r[0] for r in results)
+        loaded = results[0][1]
+        ok = best <= budget and not loaded
+        failed = failed or not ok
+        print(f"{module}: {best * 1000:.1f} ms "
+              f"(budget {budget * 1000:.0f} ms), "
+              f"heavy modules loaded: {loaded or 'none'} "
+              f"{'OK' if ok else 'FAILED'}")
+    return not failed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,79 @@
+'''
+Created on 19.10.2026
+
+Scaling of the portfolio build with the number of assets.
+
+Measures the time and the peak memory needed to build the energy system and
+the pyomo model of a portfolio of 1 to 1000 assets. Synthetic profiles and
+prices are used so no data has to be read.
+'''
+
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from examples.portfolio_model import create_energy_system, create_example_portfolio
+try:
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints
+except Exception:
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints
+
+
+def synthetic_data(days=1, seed=1):
+    '''
+    Creates per unit profiles and market prices for a number of days
+
+    :param days: Number of days
+    :param seed: Seed of the random generator
+    '''
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2019-01-01", periods=days * 24 * 4, freq="15T")
+    hour = index.hour.values
+
+    profiles = pd.DataFrame(index=index)
+    profiles["PV_pu"] = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+    profiles["Wind_pu"] = rng.uniform(0, 1, len(index))
+
+    market_data = pd.DataFrame(index=index)
+    market_data["day_ahead"] = np.repeat(
+        rng.uniform(20, 60, len(index) // 4), 4)
+    market_data["intra_day"] = rng.uniform(20, 60, len(index))
+    market_data["future_base"] = 40.
+    peak = (hour >= 8) & (hour < 21) & (index.dayofweek.values < 5)
+    market_data["future_peak"] = np.where(peak, 50., 0)
+
+    return profiles, market_data
+
+
+def bench_build(n_assets, days=1):
+    '''
+    Time and peak memory of building the portfolio model
+
+    :param n_assets: Number of assets
+    :param days: Number of days
+    '''
+    profiles, market_data = synthetic_data(days=days)
+    assets = create_example_portfolio(n_assets=n_assets)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    es = create_energy_system(assets, profiles, market_data)
+    build_model_and_constraints(es)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"assets": n_assets,
+            "build_s": round(elapsed, 3),
+            "peak_MB": round(peak / 1e6, 1),
+            "s_per_asset": round(elapsed / n_assets, 5)}
+
+
+def main(sizes=(1, 10, 100, 1000), days=1):
+    table = pd.DataFrame([bench_build(n, days=days) for n in sizes])
+    print(table.to_string(index=False))
+    return table
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,7 @@ EXAMPLES_DIR = join(BASE_DIR, "examples")
 EXAMPLES_DATA_DIR = join(EXAMPLES_DIR, "data")
 EXAMPLES_RESULTS_DIR = join(EXAMPLES_DIR, "results")
 EXAMPLES_PLOTS_DIR = join(EXAMPLES_DIR, "plots")
+EXAMPLES_MODELS_DIR = join(EXAMPLES_DATA_DIR, "dumped_models")
 
 
 if __name__ == '__main__':
@@ -23,6 +23,7 @@ The Energy System of the District consists of:
 * 4 Sinks for selling energy representing the 4 electric markets
 '''
 
+import numpy as np
 import pandas as pd
 from examples.common import (
     EXAMPLES_DATA_DIR,
@@ -31,25 +32,54 @@ from examples.common import (
 from oemof.solph import (EnergySystem, Bus, Sink, Source, Flow,
                          Transformer, GenericStorage)
 from oemof.solph import views, processing
-import matplotlib.pyplot as plt
 import logging
 from enum import Enum
 import os
 from os.path import join
 import json
+import copy
+import time
 try:
     from electricity_markets.market_price_generator import create_markets_info
-    from electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from electricity_markets.fileio import atomic_write, write_csv
+    from electricity_markets.backends import check_backend, from_polars, market_kpis, polars_frame
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints, market_costs
+    from electricity_markets.decomposition import solve_decomposed, split_horizon
+    from electricity_markets.stochastic import (build_extensive_form, price_scenarios, solve_extensive_form,
+                                                solve_scenarios_decomposed)
+    from electricity_markets.estimator import estimate_resources
+    from electricity_markets.matrix_model import check_engine, solve_matrix_model
+    from electricity_markets.products import Products, SINK_LABELS
+    from electricity_markets.plotting import render_plots
+    from electricity_markets.scaling import solve_scaled
+    from electricity_markets.sensitivity import solve_with_sensitivity, market_sensitivity
+    from electricity_markets.solver_tuning import (budget_options, check_time_limit,
+                                                   solve_with_budget, tune_solver, tuned_options)
+    from electricity_markets.warm_start import (allocate_surplus, evaluate_start, market_revenues,
+                                                set_start)
 except Exception:
     from src.electricity_markets.market_price_generator import create_markets_info
-    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from src.electricity_markets.fileio import atomic_write, write_csv
+    from src.electricity_markets.backends import check_backend, from_polars, market_kpis, polars_frame
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints, market_costs
+    from src.electricity_markets.decomposition import solve_decomposed, split_horizon
+    from src.electricity_markets.stochastic import (build_extensive_form, price_scenarios, solve_extensive_form,
+                                                    solve_scenarios_decomposed)
+    from src.electricity_markets.estimator import estimate_resources
+    from src.electricity_markets.matrix_model import check_engine, solve_matrix_model
+    from src.electricity_markets.products import Products, SINK_LABELS
+    from src.electricity_markets.plotting import render_plots
+    from src.electricity_markets.scaling import solve_scaled
+    from src.electricity_markets.sensitivity import solve_with_sensitivity, market_sensitivity
+    from src.electricity_markets.solver_tuning import (budget_options, check_time_limit,
+                                                       solve_with_budget, tune_solver, tuned_options)
+    from src.electricity_markets.warm_start import (allocate_surplus, evaluate_start, market_revenues,
+                                                    set_start)
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
-logging.basicConfig(level=logging.INFO)
-
 GAS_PRICE = 3.66  # EUR per mmBTU
 
 # EUR/mmBTU / (293.07 kWh/mmBTU)*(1000 kWh/MWh)
@@ -66,6 +96,37 @@ class Scenarios(Enum):
     FUTURE_PEAK = 4
 
 
+# Factors of the inflated market prices for each scenario
+SCENARIO_MULTIPLIERS = {
+    Scenarios.BASELINE: {},
+    Scenarios.DAY_AHEAD: {"day_ahead": 2},
+    Scenarios.FUTURE_BASE: {"future_base": 3},
+    Scenarios.FUTURE_PEAK: {"future_peak": 3},
+}
+
+# Default Data of the devices of the district
+DEFAULT_SIZING = {
+    "PV": 200,  # kW
+    "Boiler": {"Power": 300,  # kW
+               "Eff": 0.85,  # 1
+               },
+    "Battery": {
+        "Input_Power": 10,  # kW
+        "Output_Power": 10,  # kW
+        "Self_Discharge": 0.01,  # 1
+        "Capacity": 200,  # kWh
+        "Eff_Inflow": 0.98,  # 1
+        "Eff_Outflow": 0.98,  # 1
+    },
+    "CHP": {
+        "ElectricPower": 30,  # kW
+        "ThermalPower": 60,  # kW
+        "ElectricEfficiency": 0.3,  # 1
+        "ThermalEfficiency": 0.6,  # 1
+    },
+}
+
+
 def get_district_dataframe(year=2017):
     '''
     Build a dataframe with the information of the district found
@@ -143,7 +204,8 @@ def get_district_dataframe(year=2017):
     return district_df[:-1]
 
 
-def get_market_dataframe(days=7, year=2017, scenario=Scenarios.BASELINE):
+def get_market_dataframe(days=7, year=2017, scenario=Scenarios.BASELINE,
+                         store=None):
     """
     The scenarios are showing a strong preference for intraday markets
     "Artifical" scenarios are built. These inflate Future Base, Future Peak,
@@ -152,13 +214,17 @@ def get_market_dataframe(days=7, year=2017, scenario=Scenarios.BASELINE):
     :param days: Days of the year, beginning on 01/01/YYYY.
     :param year: Year
     :param scenario: One of the Scenarios.
+    :param store: Optional PriceStore. Prices are read from the store and
+        only generated if the year is missing.
     """
 
     # Get market data as per the price generator
+    if store is not None:
+        market_data = store.get_or_create(year)
+    else:
+        market_data = create_markets_info(year=year, save_csv=False)
 
-    market_data = create_markets_info(
-        year=year, save_csv=False).head(
-        days * 24 * 4)
+    market_data = market_data.head(days * 24 * 4).copy()
     # Definition of scenarios.
     # Inflation of market prices for functionality evaluation
     if scenario == Scenarios.BASELINE:
@@ -166,51 +232,55 @@ def get_market_dataframe(days=7, year=2017, scenario=Scenarios.BASELINE):
 
     if scenario == Scenarios.DAY_AHEAD:
         logging.info("Day Ahead Price Inflated")
-        market_data["day_ahead"] = market_data["day_ahead"] * 2
 
     if scenario == Scenarios.FUTURE_BASE:
         logging.info("Future Base Price Inflated")
-        market_data["future_base"] = market_data["future_base"] * 3
 
-    if scenario == Scenarios.FUTURE_PEAK:
-        market_data["future_peak"] = market_data["future_peak"] * 3
+    for market, factor in SCENARIO_MULTIPLIERS[scenario].items():
+        market_data[market] = market_data[market] * factor
 
     return market_data
 
 
+def load_sizing(sizing=None):
+    '''
+    Returns the sizing data of the district as a dictionary
+
+    :param sizing: Sizing dictionary, path to a sizing JSON or None for the
+        default sizing
+    '''
+    if sizing is None:
+        return copy.deepcopy(DEFAULT_SIZING)
+
+    if isinstance(sizing, dict):
+        return sizing
+
+    with open(sizing) as json_file:
+        return json.load(json_file)
+
+
+def save_sizing(sizing=None, path=None):
+    '''
+    Writes a sizing to a JSON file, e.g. as a template for changes to the
+    district configuration
+
+    :param sizing: Sizing dictionary, path to a sizing JSON or None for the
+        default sizing
+    :param path: Path of the JSON file. Defaults to district_sizing.json in
+        the examples data directory
+    '''
+    if path is None:
+        path = join(EXAMPLES_DATA_DIR, "district_sizing.json")
+    with atomic_write(path, "w", encoding="utf-8", lock=True) as fp:
+        json.dump(load_sizing(sizing), fp)
+    return path
+
+
 def create_energy_system(boundary_data, market_data, sizing=None):
     # Default Data of the devices of the disctrit
     # The same configuration needs to be passed if changes are to be made
-    # to the district configuraiton
-    if sizing is None:
-        sizing = dict()
-        sizing["PV"] = 200  # kW
-        sizing["Boiler"] = {"Power": 300,  # kW
-                            "Eff": 0.85,  # 1
-                            }
-        sizing["Battery"] = {
-            "Input_Power": 10,  # kW
-            "Output_Power": 10,  # kW
-            "Self_Discharge": 0.01,  # 1
-            "Capacity": 200,  # kWh
-            "Eff_Inflow": 0.98,  # 1
-            "Eff_Outflow": 0.98,  # 1
-        }
-        sizing["CHP"] = {
-            "ElectricPower": 30,  # kW
-            "ThermalPower": 60,  # kW
-            "ElectricEfficiency": 0.3,  # 1
-            "ThermalEfficiency": 0.6,  # 1
-        }
-
-        JSON_DIR = join(EXAMPLES_DATA_DIR, "district_sizing.json")
-
-        with open(JSON_DIR, 'w') as fp:
-            json.dump(sizing, fp)
-
-    elif os.path.exists(sizing):
-        with open(sizing) as json_file:
-            sizing = json.load(json_file)
+    # to the district configuraiton. See save_sizing for a template
+    sizing = load_sizing(sizing)
 
     # Create Energy System with the dataframe time series
     energy_system = EnergySystem(timeindex=boundary_data.index)
@@ -313,60 +383,113 @@ def create_energy_system(boundary_data, market_data, sizing=None):
 
     energy_system.add(t_boiler, s_pv, sto_battery, t_chp)
 
-    # Markets. Prices are in EUR/kWh for consistency.
+    # Markets. Prices are in EUR/kWh for consistency. Constant prices (e.g.
+    # the future base) are passed as a single value
     s_day_ahead = Sink(
         label="s_da",
         inputs={
             b_el_out: Flow(
-                variable_costs=-
-                market_data["day_ahead"] /
-                1000)})
+                variable_costs=market_costs(market_data["day_ahead"],
+                                            -1 / 1000))})
 
     s_intraday = Sink(
         label="s_id",
         inputs={
             b_el_out: Flow(
-                variable_costs=-
-                market_data["intra_day"] /
-                1000)})
+                variable_costs=market_costs(market_data["intra_day"],
+                                            -1 / 1000))})
 
     s_future_base = Sink(
         label="s_fb",
         inputs={
             b_el_out: Flow(
-                variable_costs=-
-                market_data["future_base"] /
-                1000)})
+                variable_costs=market_costs(market_data["future_base"],
+                                            -1 / 1000))})
 
     s_future_peak = Sink(
         label="s_fp",
         inputs={
             b_el_out: Flow(
-                variable_costs=-
-                market_data["future_peak"] /
-                1000)})
+                variable_costs=market_costs(market_data["future_peak"],
+                                            -1 / 1000))})
 
     energy_system.add(s_day_ahead, s_intraday, s_future_base, s_future_peak)
 
     return energy_system
 
 
-def solve_model(model):
+def solve_model(model, solver="cbc", cmdline_options=None, scaling=False,
+                time_limit=None, gap=None, model_class=None, warm_start=False):
     '''
     Solve the constrained model
 
     :param model: oemof.solph model.
+    :param solver: Name of the solver. "highs" is solved with highspy
+    :param cmdline_options: Options passed to the solver
+    :param scaling: If True the rows, columns and costs of the model are
+        scaled before solving, see electricity_markets.scaling.
+        Only for the solvers "cbc" and "highs"
+    :param time_limit: Time limit in seconds. With a time limit or a gap
+        the best feasible solution found within the budget is kept instead
+        of raising, see energy_system.results['status'].
+        Only for the solver "highs"
+    :param gap: Relative gap at which the solver stops
+    :param model_class: Name of the model class, e.g. "district". If no
+        options are given, the options stored by tune_solver for the class
+        are used
+    :param warm_start: If True, the values of the variables (see
+        greedy_dispatch and warm_start.set_start) are passed to HiGHS as its
+        start and kept as the solution if the solver stops on the time limit
+        without one and they satisfy the model. Not with scaling
     '''
+    if cmdline_options is None and model_class is not None:
+        cmdline_options = tuned_options(model_class, solver)
+    if cmdline_options is None:
+        cmdline_options = {'ratio': 0.1} if solver == "cbc" else {}
+
     # Solve the model
-    model.solve(solver="cbc",
-                solve_kwargs={'tee': False},
-                solver_io='lp',
-                cmdline_options={'ratio': 0.1})
+    budget = time_limit is not None or gap is not None or warm_start
+    check_time_limit(solver, time_limit)
+    if scaling:
+        if budget:
+            cmdline_options = budget_options(
+                solver, cmdline_options, time_limit, gap)
+        solve_scaled(model, solver=solver, cmdline_options=cmdline_options)
+    elif budget:
+        solve_with_budget(model, solver=solver,
+                          cmdline_options=cmdline_options,
+                          time_limit=time_limit, gap=gap,
+                          warm_start=warm_start)
+    elif solver == "highs":
+        # Pyomo has no LP file interface of HiGHS, highspy solves the LP file
+        solve_with_budget(model, solver=solver,
+                          cmdline_options=cmdline_options)
+    else:
+        model.solve(solver=solver,
+                    solve_kwargs={'tee': False},
+                    solver_io='lp',
+                    cmdline_options=cmdline_options)
+    return collect_results(model, accept_feasible=budget)
+
+
+def collect_results(model, accept_feasible=False):
+    '''
+    Checks the solver status of a solved model and stores the results in
+    its energy system
+
+    :param model: Solved oemof.solph model
+    :param accept_feasible: If True, a feasible solution of a solver stopped
+        on its time limit or gap is accepted
+    '''
     energy_system = model.es
-    if model.solver_results.Solver[0].Status != "ok":
+    solver = model.solver_results.Solver[0]
+    feasible = accept_feasible and \
+        str(solver.Termination_condition) == "feasible"
+    if solver.Status != "ok" and not feasible:
         raise AssertionError("Solver did not converge. Stopping simulation")
 
     energy_system.results['valid'] = True
+    energy_system.results['status'] = "feasible" if feasible else "optimal"
     energy_system.results['solve_and_write_data'] = processing.results(
         model)
     energy_system.results['solve_and_write_data'] = views.convert_keys_to_strings(
@@ -377,12 +500,16 @@ def solve_model(model):
     return energy_system
 
 
-def post_process_results(energy_system):
+def post_process_results(energy_system, backend="pandas"):
     '''
     Process Results into a nicer Data Frame
 
     :param energy_system: Solved energy system
+    :param backend: Type of the returned table. One of "pandas", "polars"
+        or "arrow". Polars and Arrow tables are built from the arrays of the
+        flows, with the time stamps in a "Date" column
     '''
+    check_backend(backend)
 
     results = energy_system.results['solve_and_write_data']
     results_list = []
@@ -395,42 +522,87 @@ def post_process_results(energy_system):
                         "(", "'", ")"]:  # remove ( ' ) characters
                     key_name = key_name.replace(s, "")
                 flow.rename(key_name, inplace=True)
-                flow_df = pd.DataFrame(flow)
-                results_list.append(flow_df)
-    results = pd.concat(results_list, axis=1)
+                results_list.append(flow)
+
+    if backend != "pandas":
+        frame = polars_frame({f.name: f.values for f in results_list},
+                             results_list[0].index)
+        return from_polars(frame, backend)
+
+    results = pd.concat([pd.DataFrame(f) for f in results_list], axis=1)
 
     return results
 
 
-def save_plot_results(results, year, scenario):
+def calculate_market_kpis(results, market_data):
+    '''
+    Calculate the energy sold and the income for each market
+
+    :param results: Results dataframe. Polars and Arrow tables are
+        computed with Polars expressions
+    :param market_data: Market dataframe
+    '''
+    kpis = {}
+    markets = {"da": "day_ahead", "id": "intra_day",
+               "fb": "future_base", "fp": "future_peak"}
+    if isinstance(results, pd.DataFrame):
+        for m, column in markets.items():
+            sold = results[f"b_el_out, s_{m}"].values
+            # kWh in 15min intervals, prices in EUR/MWh
+            kpis[f"energy, {m}"] = sold.sum() / 4
+            kpis[f"income, {m}"] = (sold * market_data[column].values).sum() \
+                / 4 / 1000
+    else:
+        kpis = market_kpis(results, market_data, markets,
+                           steps_per_hour=4, price_factor=1000)
+
+    kpis["income, total"] = sum(kpis[f"income, {m}"] for m in markets)
+    return pd.Series(kpis).round(3)
+
+
+def save_plot_results(results, year, scenario, plot=True):
     '''
     Save the results in cleaner dataframes and in a graphic
 
     :param results: Results dataframe
     :param year: Year of the analysis
     :param scenario: Scenario number
+    :param plot: If False only the csv is saved, e.g. to render the plots
+        of several scenarios in parallel with save_plots
     '''
-    columns = results.columns
+    write_csv(results, join(EXAMPLES_RESULTS_DIR,
+                            "MarketResults{}-Sc{}.csv".format(year, scenario.value)),
+              lock=True)
+    if plot:
+        save_plots({scenario: results}, year, processes=1)
+    logging.info(
+        f"Results saved for year {year} and Scenario {scenario.value}")
 
-    # Get the results of selling energy
-    res_sell = [c for c in columns if "b_el_out" in c.split(",")[0]]
-    styles = ['b', 'r:', 'y-.', 'g-.']
 
-    # Create a plot
-    results[res_sell].plot(figsize=(16, 12),
-                           style=styles,
-                           title=str(scenario.name)
-                           )
+def save_plots(results_dict, year, processes=None):
+    '''
+    Plot the energy sold to the markets for several scenarios.
+    The series are downsampled to the width of the figure and the figures
+    are rendered in parallel processes.
 
-    results.to_csv(join(EXAMPLES_RESULTS_DIR,
-                        "MarketResults{}-Sc{}.csv".format(year, scenario.value)))
-    plt.savefig(join(EXAMPLES_PLOTS_DIR,
-                     "MarketResults{}-Sc{}.jpg".format(year, scenario.value)))
-    logging.info(
-        f"Results saved for year {year} and Scenario {scenario.value}")
+    :param results_dict: Dictionary with the results of each scenario
+    :param year: Year of the analysis
+    :param processes: Number of worker processes. None for one per CPU
+    '''
+    jobs = []
+    for scenario, results in results_dict.items():
+        # Get the results of selling energy
+        res_sell = [c for c in results.columns
+                    if "b_el_out" in c.split(",")[0]]
+        path = join(EXAMPLES_PLOTS_DIR,
+                    "MarketResults{}-Sc{}.jpg".format(year, scenario.value))
+        jobs.append((results[res_sell], path, str(scenario.name)))
 
+    return render_plots(jobs, processes=processes)
 
-def create_and_solve_scenario(days=7, year=2017, sizing=None, scenario=1):
+
+def create_and_solve_scenario(days=7, year=2017, sizing=None, scenario=1,
+                              plot=True, engine="pyomo"):
     '''
     Chain of functions to model the different scenarios
 
@@ -438,22 +610,342 @@ def create_and_solve_scenario(days=7, year=2017, sizing=None, scenario=1):
     :param year: Year of simulation
     :param sizing: Sizing data. Can be empty and default data will be passed
     :param scenario: Scenario Enum value
+    :param plot: If True the plot of the results is saved
+    :param engine: "pyomo" to build the model with oemof.solph and solve it
+        with cbc, "matrix" to assemble it as sparse matrices and solve it
+        in-process with HiGHS, see electricity_markets.matrix_model
     '''
+    check_engine(engine)
+    boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=year, scenario=scenario)
+    energy_system = create_energy_system(boundary_data, market_data, sizing)
+    if engine == "matrix":
+        results = solve_matrix_model(energy_system)["results"]
+    else:
+        model = build_model_and_constraints(energy_system)
+        solved_energy_system = solve_model(model)
+        results = post_process_results(solved_energy_system)
+    save_plot_results(results, year, scenario, plot=plot)
+    return results
+
 
+def estimate_scenario(days=7, year=2017, sizing=None,
+                      scenario=Scenarios.BASELINE, processes=1):
+    '''
+    Dry run of create_and_solve_scenario: the exact size of the LP and the
+    estimated build memory, build time, LP file size and solve time,
+    without building the model. See electricity_markets.estimator
+
+    :param days: Number of days
+    :param year: Year of simulation
+    :param sizing: Sizing data. Can be empty and default data will be passed
+    :param scenario: Scenario Enum value
+    :param processes: Number of scenarios built at once
+    '''
     boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
     market_data = get_market_dataframe(days=days, year=year, scenario=scenario)
     energy_system = create_energy_system(boundary_data, market_data, sizing)
+    return estimate_resources(energy_system, processes=processes)
+
+
+def analyze_price_sensitivity(days=7, year=2017, sizing=None, solver="highs"):
+    '''
+    Sensitivity of the market allocation of the baseline scenario to the
+    market prices, from a single solve instead of the inflated scenarios
+
+    :param days: Number of days
+    :param year: Year of simulation
+    :param sizing: Sizing data. Can be empty and default data will be passed
+    :param solver: "highs" for price ranges, "cbc" for duals only
+    '''
+    boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=year)
+    energy_system = create_energy_system(
+        boundary_data, market_data, load_sizing(sizing))
+    # One cost per time step, so that each step has its own price range
+    model = build_model_and_constraints(energy_system, compact_costs=False)
+    sensitivity = solve_with_sensitivity(model, solver=solver)
+    # Prices are in EUR/MWh, the variable costs in EUR/kWh
+    return market_sensitivity(sensitivity, model, market_data,
+                              price_factor=1000)
+
+
+def tune_district_solver(days=7, year=2019, solver="cbc", time_limit=60.):
+    '''
+    Tunes the solver options of the district model on a sample horizon.
+    Later calls of solve_model with model_class="district" use them.
+
+    :param days: Number of days of the sample horizon
+    :param year: Year of simulation
+    :param solver: One of "cbc" or "highs"
+    :param time_limit: Time limit of each candidate in seconds
+    '''
+    boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=year)
+    energy_system = create_energy_system(boundary_data, market_data)
     model = build_model_and_constraints(energy_system)
-    solved_energy_system = solve_model(model)
-    results = post_process_results(solved_energy_system)
-    save_plot_results(results, year, scenario)
+    return tune_solver(model, "district", solver=solver,
+                       time_limit=time_limit)
+
+
+def _window_results(model):
+    '''
+    Results dataframe of a solved window or scenario model of
+    solve_district_decomposed and solve_district_stochastic
+    '''
+    return post_process_results(collect_results(model))
+
+
+def solve_district_decomposed(days=365, year=2019,
+                              scenario=Scenarios.BASELINE, sizing=None,
+                              freq="W", processes=None, tolerance=1e-5):
+    '''
+    Solves a long horizon of the district as windows in parallel processes,
+    coupled by the futures volumes and the battery content, see
+    electricity_markets.decomposition. The objective is the one of the
+    monolithic model within the tolerance.
+
+    Returns the results dataframe of the whole horizon and the report of
+    solve_decomposed (bounds and timings of each iteration).
+
+    :param days: Number of days
+    :param year: Year of simulation
+    :param scenario: One of the Scenarios
+    :param sizing: Sizing data. Can be empty and default data will be passed
+    :param freq: pandas period frequency of the windows, e.g. "W" or "M"
+    :param processes: Number of worker processes. None for one per CPU
+    :param tolerance: Relative gap between the bounds of the objective
+    '''
+    sizing = load_sizing(sizing)
+    boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=year,
+                                       scenario=scenario)
+    windows = [(boundary_data.iloc[start:stop], market_data.iloc[start:stop],
+                sizing)
+               for start, stop in split_horizon(boundary_data.index, freq)]
+
+    # Only the renewable bus feeds the markets
+    volume_bound = sizing["PV"] + sizing["CHP"]["ElectricPower"] + \
+        sizing["Battery"]["Output_Power"]
+    report = solve_decomposed(create_energy_system, windows, volume_bound,
+                              processes=processes, tolerance=tolerance,
+                              process_results=_window_results)
+    return pd.concat(report["results"]), report
+
+
+def solve_district_stochastic(days=7, year=2019,
+                              scenario=Scenarios.BASELINE, sizing=None,
+                              n_scenarios=10, spread=0.2, seed=1,
+                              method="extensive", processes=None):
+    '''
+    Two-stage stochastic model of the district: the futures volumes are
+    committed once for random day ahead and intraday price scenarios, see
+    electricity_markets.stochastic.
+
+    Returns a dictionary with the results dataframe of each scenario and
+    the report of the solve, with the first stage volumes in "first_stage".
+
+    :param days: Number of days
+    :param year: Year of simulation
+    :param scenario: One of the Scenarios, the prices of the scenarios are
+        drawn around its prices
+    :param sizing: Sizing data. Can be empty and default data will be passed
+    :param n_scenarios: Number of price scenarios
+    :param spread: Standard deviation of the random price factors
+    :param seed: Seed of the price scenarios
+    :param method: "extensive" to solve all scenarios in one model or
+        "decomposed" to solve them in parallel processes
+    :param processes: Number of worker processes of "decomposed"
+    '''
+    if method not in ["extensive", "decomposed"]:
+        raise ValueError(
+            'Parameter "method" must be one "extensive" or "decomposed".')
+
+    sizing = load_sizing(sizing)
+    boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=year,
+                                       scenario=scenario)
+    scenarios = price_scenarios(market_data, n_scenarios, spread=spread,
+                                seed=seed)
+
+    if method == "extensive":
+        model = build_extensive_form(
+            [create_energy_system(boundary_data, m, sizing)
+             for m in scenarios])
+        report = solve_extensive_form(model)
+        results = [_window_results(m) for m in model.scenario_models]
+    else:
+        volume_bound = sizing["PV"] + sizing["CHP"]["ElectricPower"] + \
+            sizing["Battery"]["Output_Power"]
+        report = solve_scenarios_decomposed(
+            create_energy_system,
+            [(boundary_data, m, sizing) for m in scenarios], volume_bound,
+            processes=processes, process_results=_window_results)
+        results = report.pop("results")
+
+    logging.info(f"Futures volumes of {n_scenarios} price scenarios: "
+                 f"{report['first_stage']}")
+    return {"results": results, "report": report}
+
+
+def greedy_dispatch(energy_system, boundary_data, market_data, sizing=None):
+    '''
+    Feasible dispatch of the district from greedy rules, without solving
+    the model. It is the start of solve_model(..., warm_start=True), see
+    electricity_markets.warm_start:
+
+    * The CHP runs at full load where its electricity and the boiler gas it
+      saves are worth more than its gas, otherwise at the load the boiler
+      needs to cover the heat demand
+    * The battery charges from the PV and the CHP in the cheapest quarter of
+      the time steps of each day and discharges in the most expensive one
+    * The demand is covered locally where the grid price is above the intra
+      day revenue. The rest is allocated to the markets and PV is curtailed
+      at negative intra day prices
+
+    Returns the flows as a dataframe with the columns of
+    post_process_results and the battery contents as a dataframe.
+
+    :param energy_system: Energy system of create_energy_system
+    :param boundary_data: Boundary data of the energy system
+    :param market_data: Market data of the energy system
+    :param sizing: Sizing data of the energy system
+    '''
+    sizing = load_sizing(sizing)
+    chp, boiler, battery = sizing["CHP"], sizing["Boiler"], sizing["Battery"]
+    revenues, peak = market_revenues(energy_system)
+    steps = len(boundary_data)
+    # Hours per time step
+    dt = boundary_data.index.freq.nanos / 3.6e12
+
+    pv = boundary_data["PV_pu"].values * sizing["PV"]
+    el_demand = boundary_data["Electricity"].values
+    heat = boundary_data["Heat"].values
+    grid = market_data["day_ahead"].values / 1000  # EUR/kWh
+    sell = revenues[Products.INTRA_DAY]
+    value = np.where(pv >= el_demand, sell, np.maximum(sell, grid))
+
+    # CHP by the value of its electricity
+    eff_el, eff_th = chp["ElectricEfficiency"], chp["ThermalEfficiency"]
+    gas_max = np.minimum(chp["ElectricPower"] / max(eff_el, eff_th),
+                         heat / eff_th)
+    gas_min = np.clip((heat - boiler["Power"]) / eff_th, 0., gas_max)
+    margin = eff_el * value + (eff_th / boiler["Eff"] - 1) * GAS_PRICE / 1000
+    chp_gas = np.where(margin > 0, gas_max, gas_min)
+    boiler_heat = heat - chp_gas * eff_th
+    generation = pv + chp_gas * eff_el
+
+    # Battery by the rank of the value within each day
+    rank = pd.Series(value).groupby(
+        boundary_data.index.date).rank(pct=True).values
+    retained = (1 - battery["Self_Discharge"]) ** dt
+    eta_in, eta_out = battery["Eff_Inflow"], battery["Eff_Outflow"]
+    charge, discharge = np.zeros(steps), np.zeros(steps)
+    content = np.zeros(steps)
+    level = 0.
+    for t in range(steps):
+        level *= retained
+        if rank[t] <= 0.25:
+            charge[t] = min(battery["Input_Power"], generation[t],
+                            (battery["Capacity"] - level) / (eta_in * dt))
+        elif rank[t] > 0.75:
+            discharge[t] = min(battery["Output_Power"],
+                               level * eta_out / dt)
+        level = max(level + (charge[t] * eta_in -
+                             discharge[t] / eta_out) * dt, 0.)
+        content[t] = level
+
+    available = generation - charge + discharge
+    local = np.where(grid >= sell, np.minimum(el_demand, available), 0.)
+    surplus = available - local
+    markets, curtailed = allocate_surplus(
+        surplus, revenues, peak, curtailable=np.minimum(pv, surplus))
+
+    flows = {
+        "s_pv, b_renewable": pv - curtailed,
+        "m_gas, b_gas": chp_gas + boiler_heat / boiler["Eff"],
+        "b_gas, t_chp": chp_gas,
+        "t_chp, b_renewable": chp_gas * eff_el,
+        "t_chp, b_heat_supply": chp_gas * eff_th,
+        "b_gas, t_boiler": boiler_heat / boiler["Eff"],
+        "t_boiler, b_heat_supply": boiler_heat,
+        "b_heat_supply, d_heat": heat,
+        "b_renewable, sto_battery": charge,
+        "sto_battery, b_renewable": discharge,
+        "b_renewable, b_electric_supply": local,
+        "s_electric_grid, b_electric_supply": el_demand - local,
+        "b_electric_supply, d_el": el_demand,
+        "b_renewable, b_el_out": surplus - curtailed}
+    for product, flow in markets.items():
+        flows[f"b_el_out, {SINK_LABELS[product]}"] = flow
+
+    index = boundary_data.index
+    return pd.DataFrame(flows, index=index), \
+        pd.DataFrame({"sto_battery": content}, index=index)
+
+
+def benchmark_warm_start(days=7, year=2019, scenario=Scenarios.BASELINE,
+                         sizing=None, solver="highs", time_limit=None):
+    '''
+    Solves a scenario cold and from the greedy dispatch and returns the
+    times in seconds and the objective values as a series: the time of the
+    heuristic, its objective and largest constraint violation, the solve
+    times, statuses and objectives of both solves and the gap of the
+    heuristic to the optimum. The objective of a solve without a solution
+    (e.g. stopped on the time limit) is NaN.
+
+    :param days: Number of days
+    :param year: Year of simulation
+    :param scenario: One of the Scenarios
+    :param sizing: Sizing data. Can be empty and default data will be passed
+    :param solver: One of "cbc" or "highs"
+    :param time_limit: Time limit of the solves in seconds
+    '''
+    sizing = load_sizing(sizing)
+    boundary_data = get_district_dataframe(year=year).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=year,
+                                       scenario=scenario)
+
+    start = time.perf_counter()
+    energy_system = create_energy_system(boundary_data, market_data, sizing)
+    flows, contents = greedy_dispatch(
+        energy_system, boundary_data, market_data, sizing)
+    benchmark = {"heuristic_time": time.perf_counter() - start}
+    quality = evaluate_start(energy_system, flows, contents)
+    benchmark["heuristic_objective"] = quality["objective"]
+    benchmark["heuristic_violation"] = quality["violation"]
+
+    for name, warm_start in [("cold", False), ("warm", True)]:
+        energy_system = create_energy_system(
+            boundary_data, market_data, sizing)
+        model = build_model_and_constraints(energy_system)
+        if warm_start:
+            set_start(model, flows, contents)
+        # Both solves write the same LP file for the same solver
+        start = time.perf_counter()
+        status = solve_with_budget(model, solver=solver,
+                                   time_limit=time_limit,
+                                   warm_start=warm_start)
+        benchmark[f"{name}_time"] = time.perf_counter() - start
+        benchmark[f"{name}_status"] = status
+        # A solve stopped on the time limit may have no solution
+        benchmark[f"{name}_objective"] = model.objective() \
+            if status in ["optimal", "feasible"] else float("nan")
+    benchmark["heuristic_gap"] = \
+        (benchmark["heuristic_objective"] - benchmark["warm_objective"]) / \
+        max(abs(benchmark["warm_objective"]), 1.)
+    return pd.Series(benchmark)
 
 
 def main(year=2019, days=28):
+    results_dict = {}
     for scenario in Scenarios:
-        create_and_solve_scenario(days=days, year=year, scenario=scenario)
+        results_dict[scenario] = create_and_solve_scenario(
+            days=days, year=year, scenario=scenario, plot=False)
+    save_plots(results_dict, year)
     logging.info("All scenarios terminated succesfully")
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     main(year=2020, days=28)
@@ -0,0 +1,246 @@
+'''
+Created on 19.10.2026
+
+Sizing sweeps of the district model.
+
+The district model is built only once. For every point of a grid of sizings
+the capacities are changed in place as bounds of the model variables and the
+model is solved again:
+
+* PV: Upper bounds of the PV flow (per unit profile times the size)
+* Boiler.Power, Battery.Input_Power, Battery.Output_Power,
+  CHP.ElectricPower: Upper bounds of the flows with these nominal values
+* Battery.Capacity: Upper bounds of the storage content
+
+With a persistent solver (e.g. "appsi_highs", needs highspy) the model stays
+loaded in the solver and only the changed bounds are passed on, so each point
+starts from the solution of the previous one. Other solvers (e.g. "cbc") write the model
+again for every point, but the energy system and the model are still built
+only once. The grid can be split into chunks solved in parallel processes,
+each process building its own model once.
+
+Efficiencies and other coefficients of the constraints are not part of the
+sweep, they are taken from the base sizing.
+'''
+
+import copy
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyomo.environ as po
+from examples import district_model_4_markets as district
+try:
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from electricity_markets.persistent_model import PersistentModel
+except Exception:
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from src.electricity_markets.persistent_model import PersistentModel
+
+# Parameters of the sizing that can be swept, as "Device.Key"
+SWEEP_PARAMETERS = ["PV", "Boiler.Power", "Battery.Input_Power",
+                    "Battery.Output_Power", "Battery.Capacity",
+                    "CHP.ElectricPower"]
+
+
+def set_sizing_value(sizing, parameter, value):
+    '''
+    Sets a parameter like "Battery.Capacity" in a sizing dictionary
+
+    :param sizing: Sizing dictionary
+    :param parameter: Name of the parameter, see SWEEP_PARAMETERS
+    :param value: New value
+    '''
+    if parameter not in SWEEP_PARAMETERS:
+        raise ValueError(
+            f"Parameter {parameter} can not be swept. "
+            f"Use one of {SWEEP_PARAMETERS}")
+    keys = parameter.split(".")
+    target = sizing
+    for k in keys[:-1]:
+        target = target[k]
+    target[keys[-1]] = value
+
+
+def sizing_grid(grid, sizing=None):
+    '''
+    Returns the list of sizings of all the combinations of a grid
+
+    :param grid: Dictionary of parameter: list of values, e.g.
+        {"PV": [100, 200], "Battery.Capacity": [100, 200, 400]}
+    :param sizing: Base sizing for the parameters not in the grid
+    '''
+    base = district.load_sizing(sizing)
+    parameters = list(grid)
+    points = []
+    for values in itertools.product(*[grid[p] for p in parameters]):
+        point = copy.deepcopy(base)
+        for p, v in zip(parameters, values):
+            set_sizing_value(point, p, v)
+        points.append((dict(zip(parameters, values)), point))
+    return points
+
+
+class SizingModel(PersistentModel):
+    '''
+    District model built once and solved for several sizings.
+
+    :param boundary_data: Boundary data of the district
+    :param market_data: Market data
+    :param sizing: Base sizing, see district_model_4_markets.load_sizing
+    :param solver: Name of the solver. Persistent solvers (see
+        persistent_model.PERSISTENT_SOLVERS) keep the model loaded between
+        the points
+    :param cmdline_options: Options passed to a non persistent solver
+    '''
+
+    def __init__(self, boundary_data, market_data, sizing=None,
+                 solver="appsi_highs", cmdline_options=None):
+        start = time.perf_counter()
+        self.boundary_data = boundary_data
+        self.market_data = market_data
+        self.sizing = district.load_sizing(sizing)
+
+        es = district.create_energy_system(
+            boundary_data, market_data, self.sizing)
+        super().__init__(build_model_and_constraints(es), es.nodes,
+                         boundary_data.index, solver=solver,
+                         cmdline_options=cmdline_options)
+        self.build_time = time.perf_counter() - start
+
+    def _flow_bounds(self, source, target, values):
+        n = self.nodes
+        for t, value in zip(self.timesteps, values):
+            self.model.flow[n[source], n[target], t].setub(value)
+
+    def apply(self, sizing):
+        '''
+        Changes the capacities of the model to the ones of a sizing
+
+        :param sizing: Sizing dictionary
+        '''
+        steps = len(self.timesteps)
+        pv = self.boundary_data["PV_pu"].values * sizing["PV"]
+        self._flow_bounds("s_pv", "b_renewable", pv)
+        self._flow_bounds("t_boiler", "b_heat_supply",
+                          [sizing["Boiler"]["Power"]] * steps)
+        self._flow_bounds("b_renewable", "sto_battery",
+                          [sizing["Battery"]["Input_Power"]] * steps)
+        self._flow_bounds("sto_battery", "b_renewable",
+                          [sizing["Battery"]["Output_Power"]] * steps)
+        # Both outputs of the CHP use the electric power as nominal value
+        for target in ["b_renewable", "b_heat_supply"]:
+            self._flow_bounds("t_chp", target,
+                              [sizing["CHP"]["ElectricPower"]] * steps)
+
+        storage = self.nodes["sto_battery"]
+        content = self.model.GenericStorageBlock.storage_content
+        for t in self.timesteps:
+            content[storage, t].setub(
+                sizing["Battery"]["Capacity"] * storage.max_storage_level[t])
+
+    def run(self, sizing):
+        '''
+        Solves the model for a sizing. Returns a dictionary with the status,
+        objective value, solve time and market KPIs.
+
+        :param sizing: Sizing dictionary
+        '''
+        row = {}
+        heat = self.boundary_data["Heat"].max()
+        if sizing["Boiler"]["Power"] + sizing["CHP"]["ElectricPower"] < heat:
+            # Same check as district_model_4_markets.create_energy_system
+            row["status"] = "undersized"
+            return row
+
+        start = time.perf_counter()
+        self.apply(sizing)
+        row["status"] = self.solve()
+        row["solve_time"] = round(time.perf_counter() - start, 4)
+        if row["status"] != "optimal":
+            return row
+
+        row["objective"] = po.value(self.model.objective)
+        kpis = district.calculate_market_kpis(
+            self.market_results(), self.market_data)
+        row.update(kpis.to_dict())
+        return row
+
+
+def _sweep_chunk(args):
+    '''
+    Builds the model once and solves a chunk of the grid points
+    '''
+    boundary_data, market_data, sizing, points, solver, options = args
+    sizing_model = SizingModel(boundary_data, market_data, sizing,
+                               solver=solver, cmdline_options=options)
+    rows = []
+    for values, point in points:
+        row = dict(values)
+        row.update(sizing_model.run(point))
+        row["build_time"] = round(sizing_model.build_time, 4)
+        rows.append(row)
+    return rows
+
+
+def run_sizing_sweep(grid, year=2019, days=7,
+                     scenario=district.Scenarios.BASELINE, sizing=None,
+                     processes=1, solver="appsi_highs", cmdline_options=None):
+    '''
+    Solves the district model for all the sizings of a grid.
+
+    Returns a tidy dataframe with one row per grid point, with the values of
+    the swept parameters, the solver status, the objective value, the energy
+    sold and income of each market and the solve time.
+
+    :param grid: Dictionary of parameter: list of values, e.g.
+        {"PV": [100, 200], "Battery.Capacity": [100, 200, 400]}
+    :param year: Year of the simulation
+    :param days: Number of days
+    :param scenario: One of the Scenarios
+    :param sizing: Base sizing for the parameters not in the grid
+    :param processes: Number of worker processes. The grid is split into
+        one chunk of neighbouring points per process
+    :param solver: Name of the solver. Persistent solvers (see
+        persistent_model.PERSISTENT_SOLVERS) keep the model loaded between
+        the points
+    :param cmdline_options: Options passed to a non persistent solver
+    '''
+    boundary_data = district.get_district_dataframe(
+        year=year).head(days * 24 * 4)
+    market_data = district.get_market_dataframe(
+        days=days, year=year, scenario=scenario)
+    points = sizing_grid(grid, sizing)
+
+    processes = max(min(processes or 1, len(points)), 1)
+    size = -(-len(points) // processes)
+    chunks = [(boundary_data, market_data, sizing, points[k:k + size],
+               solver, cmdline_options)
+              for k in range(0, len(points), size)]
+
+    start = time.perf_counter()
+    if len(chunks) == 1:
+        rows = _sweep_chunk(chunks[0])
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            rows = [r for chunk in executor.map(_sweep_chunk, chunks)
+                    for r in chunk]
+
+    logging.info("Sizing sweep of {} points solved in {:.1f} s".format(
+        len(points), time.perf_counter() - start))
+    return pd.DataFrame(rows)
+
+
+def main(year=2019, days=7):
+    grid = {"PV": [100, 200, 400],
+            "Battery.Capacity": [50, 200, 800],
+            "CHP.ElectricPower": [30, 60]}
+    sweep = run_sizing_sweep(grid, year=year, days=days, processes=2)
+    logging.info(sweep)
+    return sweep
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main(year=2019, days=7)
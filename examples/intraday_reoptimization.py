@@ -0,0 +1,242 @@
+'''
+Created on 19.10.2026
+
+Re-optimization of the district during the day.
+
+When the intraday prices or the PV forecast change, the rest of the day is
+planned again on the model that is already built, instead of building the
+energy system and the model again:
+
+* The flows and storage contents of the time steps that are already past
+  are fixed to their planned values by their bounds
+* The intraday costs of the remaining time steps are mutable Params of the
+  objective (see build_model_and_constraints) and are changed in place
+* The upper bounds of the PV flow of the remaining time steps follow the
+  new per unit forecast
+
+With a persistent solver (e.g. "appsi_highs", needs highspy) only these
+changes are passed on to the loaded model, which starts from the basis of
+the last solve. The time of each step of every re-optimization is recorded.
+'''
+
+import logging
+import time
+import numpy as np
+import pandas as pd
+import pyomo.environ as po
+from examples import district_model_4_markets as district
+try:
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from electricity_markets.persistent_model import PersistentModel
+    from electricity_markets.products import Products
+except Exception:
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from src.electricity_markets.persistent_model import PersistentModel
+    from src.electricity_markets.products import Products
+
+# Variable costs per market price, prices in EUR/MWh and costs in EUR/kWh
+PRICE_FACTOR = -1 / 1000
+
+
+class IntradayModel(PersistentModel):
+    '''
+    District model built once and re-optimized during the day.
+
+    :param boundary_data: Boundary data of the district, e.g. of one day
+    :param market_data: Market data
+    :param sizing: Sizing, see district_model_4_markets.load_sizing
+    :param solver: Name of the solver. Persistent solvers (see
+        persistent_model.PERSISTENT_SOLVERS) keep the model loaded between
+        the solves
+    :param cmdline_options: Options passed to a non persistent solver
+    '''
+
+    def __init__(self, boundary_data, market_data, sizing=None,
+                 solver="appsi_highs", cmdline_options=None):
+        start = time.perf_counter()
+        self.boundary_data = boundary_data
+        self.market_data = market_data
+        self.sizing = district.load_sizing(sizing)
+
+        es = district.create_energy_system(
+            boundary_data, market_data, self.sizing)
+        super().__init__(
+            build_model_and_constraints(
+                es, mutable_costs=[Products.INTRA_DAY]),
+            es.nodes, boundary_data.index, solver=solver,
+            cmdline_options=cmdline_options)
+        self.weights = np.array([self.model.objective_weighting[t]
+                                 for t in self.timesteps])
+
+        # Variables of each time step, fixed once the time step is past
+        self._step_variables = {t: [] for t in self.timesteps}
+        for (_, _, t), var in self.model.flow.items():
+            self._step_variables[t].append(var)
+        for (_, t), var in \
+                self.model.GenericStorageBlock.storage_content.items():
+            self._step_variables[t].append(var)
+        self.fixed_until = 0
+
+        if self._opt is not None:
+            # Only bounds and Params change
+            update = self._opt.update_config
+            update.check_for_new_or_removed_constraints = False
+            update.check_for_new_or_removed_vars = False
+            update.check_for_new_or_removed_params = False
+            update.check_for_new_objective = False
+            update.update_constraints = False
+            update.update_named_expressions = False
+        self.build_time = time.perf_counter() - start
+        self.metrics = []
+
+    def _positions(self, values, now, index):
+        '''
+        Time steps and values of an update. Series are matched by their
+        time stamps in index, arrays start at the time step now. Past time
+        steps are left out.
+        '''
+        if isinstance(values, pd.Series):
+            steps = index.get_indexer(values.index)
+            if (steps < 0).any():
+                raise ValueError("Time stamps of the update not in the model")
+            values = values.values
+        else:
+            values = np.asarray(values, dtype=float)
+            steps = np.arange(now, now + len(values))
+        keep = (steps >= now) & (steps < len(self.timesteps))
+        return steps[keep], values[keep]
+
+    def fix_past(self, now):
+        '''
+        Fixes the flows and storage contents of the time steps before now to
+        their current values. They are pinned by their bounds: the
+        persistent solvers do not pass on variables that are fixed after
+        the model is loaded, and would keep solving with the old bounds.
+
+        :param now: First time step that is not past
+        '''
+        for t in range(self.fixed_until, min(now, len(self.timesteps))):
+            for var in self._step_variables[t]:
+                value = var.value if var.value is not None else 0.
+                var.setlb(value)
+                var.setub(value)
+        self.fixed_until = max(self.fixed_until, now)
+
+    def update_intra_day(self, prices, now=0):
+        '''
+        Changes the intraday prices of the remaining time steps
+
+        :param prices: Series of prices indexed by the time stamps of the
+            market data, or array of the prices from the time step now on,
+            in EUR/MWh
+        :param now: First time step that is not past
+        '''
+        costs = self.model.intra_day_costs
+        steps, prices = self._positions(prices, now, self.market_data.index)
+        for t, price in zip(steps, prices):
+            costs[int(t)] = float(self.weights[t] * price * PRICE_FACTOR)
+        self.market_data.iloc[steps, self.market_data.columns.get_loc(
+            Products.INTRA_DAY.value)] = prices
+        return len(steps)
+
+    def update_pv(self, pv_pu, now=0):
+        '''
+        Changes the per unit PV forecast of the remaining time steps
+
+        :param pv_pu: Series of the per unit PV production indexed by the
+            time stamps of the boundary data, or array from the time step
+            now on
+        :param now: First time step that is not past
+        '''
+        flow = self.model.flow
+        pv, bus = self.nodes["s_pv"], self.nodes["b_renewable"]
+        steps, pv_pu = self._positions(pv_pu, now, self.boundary_data.index)
+        for t, value in zip(steps, pv_pu):
+            flow[pv, bus, int(t)].setub(float(value) * self.sizing["PV"])
+        self.boundary_data.iloc[steps, self.boundary_data.columns.get_loc(
+            "PV_pu")] = pv_pu
+        return len(steps)
+
+    def reoptimize(self, now, intra_day=None, pv_pu=None):
+        '''
+        Plans the rest of the horizon again: fixes the past time steps,
+        updates the intraday prices and the PV forecast and solves.
+        Returns the metrics of the re-optimization as a dictionary.
+
+        :param now: First time step that is not past, as position or time
+            stamp of the boundary data
+        :param intra_day: New intraday prices, see update_intra_day
+        :param pv_pu: New per unit PV forecast, see update_pv
+        '''
+        if not isinstance(now, (int, np.integer)):
+            now = self.boundary_data.index.get_loc(now)
+
+        metrics = {"now": now}
+        start = time.perf_counter()
+        self.fix_past(now)
+        metrics["fix_time"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics["prices_updated"] = 0 if intra_day is None \
+            else self.update_intra_day(intra_day, now)
+        metrics["pv_updated"] = 0 if pv_pu is None \
+            else self.update_pv(pv_pu, now)
+        metrics["update_time"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        metrics["status"] = self.solve()
+        metrics["solve_time"] = time.perf_counter() - start
+        metrics["total_time"] = metrics["fix_time"] + \
+            metrics["update_time"] + metrics["solve_time"]
+        if metrics["status"] == "optimal":
+            metrics["objective"] = po.value(self.model.objective)
+
+        self.metrics.append(metrics)
+        logging.info("Re-optimized from step {} in {:.3f} s ({})".format(
+            now, metrics["total_time"], metrics["status"]))
+        return metrics
+
+    def latency(self):
+        '''
+        Metrics of all the re-optimizations as a dataframe, times in seconds
+        '''
+        return pd.DataFrame(self.metrics)
+
+
+def main(year=2019, day=180, updates=8, seed=1):
+    '''
+    Plans a day of the district and re-plans it every few hours with noisy
+    intraday prices and PV forecasts
+
+    :param year: Year of data
+    :param day: Day of the year
+    :param updates: Number of re-optimizations during the day
+    :param seed: Seed of the noise
+    '''
+    boundary_data = district.get_district_dataframe(year=year)
+    market_data = district.get_market_dataframe(days=day + 1, year=year)
+    steps = 24 * 4
+    day_slice = slice(day * steps, (day + 1) * steps)
+
+    intraday = IntradayModel(boundary_data.iloc[day_slice].copy(),
+                             market_data.iloc[day_slice].copy())
+    logging.info(f"Model built in {intraday.build_time:.2f} s")
+    intraday.reoptimize(0)
+
+    rng = np.random.default_rng(seed)
+    for now in np.linspace(0, steps, updates + 1, dtype=int)[1:-1]:
+        remaining = intraday.boundary_data.index[now:]
+        prices = intraday.market_data["intra_day"].iloc[now:] * \
+            rng.normal(1, 0.1, len(remaining))
+        pv_pu = (intraday.boundary_data["PV_pu"].iloc[now:] *
+                 rng.normal(1, 0.1, len(remaining))).clip(lower=0)
+        intraday.reoptimize(int(now), intra_day=prices, pv_pu=pv_pu)
+
+    latency = intraday.latency()
+    logging.info(latency[["now", "status", "total_time", "solve_time"]])
+    return intraday.market_results(), latency
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
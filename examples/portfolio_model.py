@@ -0,0 +1,229 @@
+'''
+Created on 19.10.2026
+
+Portfolio of power plants sharing one market bus.
+
+Instead of one energy system per power plant, all the assets of a
+portfolio (wind and PV parks, conventional plants, district units) are
+described by a columnar asset table and built into a single energy system.
+Every asset is a source feeding the shared "b_el_out" bus, which is
+connected to the four market sinks.
+
+#1 Describe the portfolio as an asset table and a table of per unit profiles
+#2 Build all the sources of the portfolio in one pass
+#3 Solve the portfolio against the markets
+#4 Attribute the market income back to the single assets
+'''
+
+import logging
+import numpy as np
+import pandas as pd
+from oemof.solph import (EnergySystem, Bus, Sink, Source, Flow)
+from examples.district_model_4_markets import solve_model, post_process_results
+from examples.power_plants_model import VARIABLE_COSTS, get_boundary_data
+try:
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints, market_costs
+except Exception:
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints, market_costs
+
+# Column names of the market data and the labels of the market sinks
+MARKETS = {"s_da": "day_ahead",
+           "s_id": "intra_day",
+           "s_fb": "future_base",
+           "s_fp": "future_peak"}
+
+
+def prepare_asset_table(assets):
+    '''
+    Check an asset table and complete the optional columns
+
+    The asset table has one row per asset with the columns:
+
+    * name: Label of the asset. The index is used if the column is missing.
+    * type: Type of power plant, e.g. "wind", "pv", "coal".
+    * capacity: Installed capacity in MW.
+    * variable_costs: Variable costs in EUR/MWh. Optional, taken from the
+      type of the power plant if missing.
+    * profile: Name of the column in the profiles table with the per unit
+      production. Optional, dispatchable assets are left empty.
+
+    :param assets: Dataframe with the asset table
+    '''
+    assets = pd.DataFrame(assets).copy()
+
+    if "name" not in assets.columns:
+        assets["name"] = assets.index.astype(str)
+    assets = assets.set_index("name", drop=False)
+
+    for c in ["type", "capacity"]:
+        if c not in assets.columns:
+            raise ValueError(f'Asset table needs a "{c}" column')
+
+    if assets["name"].duplicated().any():
+        raise ValueError("Asset names must be unique")
+
+    if "variable_costs" not in assets.columns:
+        assets["variable_costs"] = np.nan
+    missing_costs = assets["variable_costs"].isna()
+    assets.loc[missing_costs, "variable_costs"] = \
+        assets.loc[missing_costs, "type"].str.lower().map(VARIABLE_COSTS)
+    if assets["variable_costs"].isna().any():
+        raise ValueError(
+            "Variable costs missing for types {}".format(
+                set(assets.loc[assets["variable_costs"].isna(), "type"])))
+
+    if "profile" not in assets.columns:
+        assets["profile"] = None
+
+    return assets
+
+
+def create_energy_system(assets, profiles, market_data):
+    '''
+    Creates one oemof energy system with all the assets of the portfolio
+
+    The columns of the asset table are read once as arrays. Assets with the
+    same profile share the same array, so the memory grows with the number
+    of profiles and not with the number of assets.
+
+    :param assets: Dataframe with the asset table. See prepare_asset_table
+    :param profiles: Dataframe with per unit production profiles
+    :param market_data: Dataframe with market prices for each market
+    '''
+    assets = prepare_asset_table(assets)
+
+    energy_system = EnergySystem(timeindex=profiles.index)
+
+    b_el = Bus(label="b_el_out")
+
+    names = assets["name"].to_numpy()
+    capacities = assets["capacity"].to_numpy(dtype=float)
+    costs = assets["variable_costs"].to_numpy(dtype=float)
+    profile_names = assets["profile"].to_numpy()
+
+    # One array per profile column, shared by all the assets using it
+    used_profiles = pd.unique(profile_names[pd.notna(profile_names)])
+    missing = set(used_profiles) - set(profiles.columns)
+    if missing:
+        raise ValueError(f"Profiles {missing} not found in profiles table")
+    profile_arrays = {
+        p: profiles[p].to_numpy(dtype=float) for p in used_profiles}
+
+    sources = [
+        Source(label=name, outputs={b_el: Flow(
+            nominal_value=capacity,
+            max=profile_arrays[profile] if pd.notna(profile) else 1,
+            variable_costs=cost)})
+        for name, capacity, cost, profile in zip(
+            names, capacities, costs, profile_names)]
+
+    # The markets each are modelled as a sink, shared by all the assets
+    sinks = [
+        Sink(label=label,
+             inputs={b_el: Flow(variable_costs=market_costs(market_data[column], -1))})
+        for label, column in MARKETS.items()]
+
+    energy_system.add(b_el, *sources, *sinks)
+
+    return energy_system
+
+
+def calculate_portfolio_kpis(results, assets, market_data):
+    '''
+    Calculate KPIs per asset of the portfolio
+
+    The markets only see the aggregated production of the portfolio. In every
+    time step the energy sold to each market is attributed to the assets
+    proportionally to their share of the production in that time step.
+
+    :param results: Results dataframe
+    :param assets: Dataframe with the asset table
+    :param market_data: Market dataframe
+    '''
+    assets = prepare_asset_table(assets)
+
+    names = assets["name"].tolist()
+    production = results[[f"{n}, b_el_out" for n in names]].values
+    total = production.sum(axis=1)
+
+    # Share of each asset in the production of each time step
+    share = np.divide(production, total[:, None],
+                      out=np.zeros_like(production),
+                      where=total[:, None] > 0)
+
+    # Since it it was in 15min intervals
+    kpis = pd.DataFrame(index=assets.index)
+    kpis["energy"] = production.sum(axis=0) / 4
+    kpis["income, total"] = 0.0
+    for label, column in MARKETS.items():
+        market = label.split("_")[1]
+        sold = results[f"b_el_out, {label}"].values
+        income = sold * market_data[column].values
+        kpis[f"energy, {market}"] = share.T @ sold / 4
+        kpis[f"income, {market}"] = share.T @ income / 4
+        kpis["income, total"] += kpis[f"income, {market}"]
+
+    kpis["variable_costs"] = kpis["energy"] * assets["variable_costs"]
+    kpis["profit"] = kpis["income, total"] - kpis["variable_costs"]
+    kpis["average_price EUR/MWh"] = kpis["income, total"] / \
+        kpis["energy"].where(kpis["energy"] > 1e-6)
+
+    return kpis.round(3)
+
+
+def model_portfolio(assets, profiles, market_data):
+    '''
+    Model a portfolio and calculate the KPIs of every asset
+
+    :param assets: Dataframe with the asset table
+    :param profiles: Dataframe with per unit production profiles
+    :param market_data: Market Data with electricity price information
+    '''
+    es = create_energy_system(assets, profiles, market_data)
+    model = build_model_and_constraints(es)
+    solved_model = solve_model(model)
+    results = post_process_results(solved_model)
+    kpis = calculate_portfolio_kpis(results, assets, market_data)
+
+    return results, kpis
+
+
+def create_example_portfolio(n_assets=10, seed=1):
+    '''
+    Creates an asset table with a random mix of power plants
+
+    :param n_assets: Number of assets
+    :param seed: Seed of the random generator
+    '''
+    rng = np.random.default_rng(seed)
+    types = rng.choice(list(VARIABLE_COSTS.keys()), size=n_assets)
+    profile = {"pv": "PV_pu", "wind": "Wind_pu"}
+
+    assets = pd.DataFrame({
+        "name": [f"{t}_{i}" for i, t in enumerate(types)],
+        "type": types,
+        "capacity": rng.uniform(1, 50, size=n_assets).round(1),
+        "profile": [profile.get(t) for t in types],
+    })
+    return assets
+
+
+def main(year=2020, days=28, n_assets=10):
+    '''
+    Model a random portfolio with the district PV and Wind profiles
+
+    :param year: Year of data
+    :param days: Number of days to model, starting on 01/01
+    :param n_assets: Number of assets in the portfolio
+    '''
+    district_df, market_data = get_boundary_data(year=year, days=days)
+    assets = create_example_portfolio(n_assets=n_assets)
+    results, kpis = model_portfolio(assets, district_df, market_data)
+    logging.info(f"Portfolio of {n_assets} assets solved")
+    return results, kpis
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    results, kpis = main(year=2020, days=28, n_assets=10)
+    print(kpis)
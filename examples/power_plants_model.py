@@ -18,18 +18,41 @@ in the different markets
 from enum import Enum
 from oemof.solph import (EnergySystem, Bus, Sink, Source, Flow)
 import pandas as pd
-from examples.common import EXAMPLES_DATA_DIR, EXAMPLES_PLOTS_DIR
-import matplotlib.pyplot as plt
+from examples.common import (EXAMPLES_DATA_DIR, EXAMPLES_PLOTS_DIR,
+                             EXAMPLES_MODELS_DIR)
 from examples.district_model_4_markets import get_district_dataframe,\
     solve_model, post_process_results
+import os
 from os.path import join
 import logging
 try:
     from electricity_markets.market_price_generator import create_markets_info
-    from electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from electricity_markets.fileio import atomic_write
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints, market_costs
+    from electricity_markets.snapshot import dump_model, solve_snapshot
+    from electricity_markets.estimator import estimate_resources
+    from electricity_markets.matrix_model import check_engine, solve_matrix_model
+    from electricity_markets.products import SINK_LABELS
+    from electricity_markets.plotting import render_plots
+    from electricity_markets.warm_start import allocate_surplus, market_revenues
 except Exception:
     from src.electricity_markets.market_price_generator import create_markets_info
-    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from src.electricity_markets.fileio import atomic_write
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints, market_costs
+    from src.electricity_markets.snapshot import dump_model, solve_snapshot
+    from src.electricity_markets.estimator import estimate_resources
+    from src.electricity_markets.matrix_model import check_engine, solve_matrix_model
+    from src.electricity_markets.products import SINK_LABELS
+    from src.electricity_markets.plotting import render_plots
+    from src.electricity_markets.warm_start import allocate_surplus, market_revenues
+
+
+# Variable costs of the different power plants, EUR/MWh
+VARIABLE_COSTS = {"coal": 43.92,
+                  "gas": 46.17,
+                  "biogas": 68.15,
+                  "pv": 0,
+                  "wind": 0}
 
 
 class PowerPlants(Enum):
@@ -43,19 +66,22 @@ class PowerPlants(Enum):
     WIND = 5
 
 
-def get_boundary_data(year=2020, days=366):
+def get_boundary_data(year=2020, days=366, store=None):
     '''
     Constructs dataframes with the information for modelling
 
     :param year: Year under consideration
     :param days: Days to model. Default is 366 for a leap year
+    :param store: Optional PriceStore to read the market prices from
     '''
     district_df = get_district_dataframe(year=year).head(24 * 4 * days)
 
     # Create Energy System with the dataframe time series
-    market_data = create_markets_info(
-        year=year, save_csv=False).head(
-        days * 24 * 4)
+    if store is not None:
+        market_data = store.get_or_create(year)
+    else:
+        market_data = create_markets_info(year=year, save_csv=False)
+    market_data = market_data.head(days * 24 * 4).copy()
 
     return district_df, market_data
 
@@ -72,11 +98,7 @@ def create_energy_system(scenario, district_df, market_data):
     meta_data = {}
 
     # Variable costs information, EUR/MWh
-    meta_data["cv"] = {"coal": 43.92,
-                       "gas": 46.17,
-                       "biogas": 68.15,
-                       "pv": 0,
-                       "wind": 0}
+    meta_data["cv"] = VARIABLE_COSTS
 
     # Max energy values for Renewables based on Installed capacity of 1MW and
     # real production as a fraction of 1MW
@@ -104,19 +126,19 @@ def create_energy_system(scenario, district_df, market_data):
     # The markets each are modelled as a sink
     s_day_ahead = Sink(
         label="s_da",
-        inputs={b_el: Flow(variable_costs=-market_data["day_ahead"].values)})
+        inputs={b_el: Flow(variable_costs=market_costs(market_data["day_ahead"], -1))})
 
     s_intraday = Sink(
         label="s_id",
-        inputs={b_el: Flow(variable_costs=-market_data["intra_day"].values)})
+        inputs={b_el: Flow(variable_costs=market_costs(market_data["intra_day"], -1))})
 
     s_future_base = Sink(
         label="s_fb",
-        inputs={b_el: Flow(variable_costs=-market_data["future_base"].values)})
+        inputs={b_el: Flow(variable_costs=market_costs(market_data["future_base"], -1))})
 
     s_future_peak = Sink(
         label="s_fp",
-        inputs={b_el: Flow(variable_costs=-market_data["future_peak"].values)})
+        inputs={b_el: Flow(variable_costs=market_costs(market_data["future_peak"], -1))})
 
     energy_system.add(
         b_el,
@@ -160,7 +182,8 @@ def calculate_kpis(results, market_data):
     return kpis
 
 
-def model_power_plant_scenario(scenario, district_df, market_data, days=365):
+def model_power_plant_scenario(scenario, district_df, market_data, days=365,
+                               engine="pyomo"):
     '''
     Model an scenario and calculate KPIs based on the given boundary data
 
@@ -168,17 +191,123 @@ def model_power_plant_scenario(scenario, district_df, market_data, days=365):
     :param district_df: Dataframe with information of the District
     :param market_data: Market Data with electricity price information
     :param days: Number of days to model, starting on 01/01
+    :param engine: "pyomo" or "matrix", see create_and_solve_scenario of
+        the district model
     '''
-
+    check_engine(engine)
     es = create_energy_system(scenario, district_df, market_data)
-    model = build_model_and_constraints(es)
-    solved_model = solve_model(model)
-    results = post_process_results(solved_model)
+    if engine == "matrix":
+        results = solve_matrix_model(es)["results"]
+    else:
+        model = build_model_and_constraints(es)
+        solved_model = solve_model(model)
+        results = post_process_results(solved_model)
     kpis = calculate_kpis(results, market_data)
 
     return results, kpis
 
 
+def greedy_dispatch(energy_system, scenario, district_df):
+    '''
+    Feasible dispatch of a power plant from greedy rules, as the start of
+    solve_model(..., warm_start=True), see electricity_markets.warm_start.
+    The plant runs at its available power where the best market revenue
+    covers its variable costs and the energy is allocated to the markets.
+    Returns the flows as a dataframe with the columns of
+    post_process_results.
+
+    :param energy_system: Energy system of create_energy_system
+    :param scenario: One of the PowerPlants Scenario
+    :param district_df: Dataframe with the district information
+    '''
+    import numpy as np
+
+    label = scenario.name.lower()
+    costs = VARIABLE_COSTS[label]
+    available = {"wind": district_df["Wind_pu"].values,
+                 "pv": district_df["PV_pu"].values}.get(
+        label, np.ones(len(district_df)))
+
+    revenues, peak = market_revenues(energy_system)
+    best = np.max(list(revenues.values()), axis=0)
+    production = np.where(best >= costs, available, 0.)
+    markets, curtailed = allocate_surplus(
+        production, revenues, peak, curtailable=production,
+        reserve_price=costs)
+
+    flows = {"source, b_el_out": production - curtailed}
+    for product, flow in markets.items():
+        flows[f"b_el_out, {SINK_LABELS[product]}"] = flow
+    return pd.DataFrame(flows, index=district_df.index)
+
+
+def estimate_power_plant_scenario(scenario, district_df, market_data,
+                                  days=365, processes=1):
+    '''
+    Dry run of model_power_plant_scenario: the exact size of the LP and the
+    estimated build memory, build time, LP file size and solve time,
+    without building the model. See electricity_markets.estimator
+
+    :param scenario: Scenario from PowerPlants
+    :param district_df: Dataframe with information of the District
+    :param market_data: Market Data with electricity price information
+    :param days: Number of days to model, starting on 01/01
+    :param processes: Number of scenarios built at once
+    '''
+    es = create_energy_system(scenario, district_df, market_data)
+    return estimate_resources(es, processes=processes)
+
+
+def dump_scenarios(year=2020, days=365, dpath=EXAMPLES_MODELS_DIR):
+    '''
+    Build the models of all the scenarios and dump them, so that they can be
+    solved later without building them again.
+
+    For each scenario the energy system is dumped as an .oemof file and the
+    built model with its market constraints as a snapshot (compressed LP
+    file and index map).
+
+    :param year: Year of data
+    :param days: Number of days to model, starting on 01/01
+    :param dpath: Directory for the dumped files
+    '''
+    os.makedirs(dpath, exist_ok=True)
+    district_df, market_data = get_boundary_data(year=year, days=days)
+
+    paths = {}
+    for scenario in PowerPlants:
+        name = f"PowerPlant-{scenario.name}-{year}"
+        es = create_energy_system(scenario, district_df, market_data)
+        es.dump(dpath=dpath, filename=name + ".oemof")
+        model = build_model_and_constraints(es)
+        dump_model(model, join(dpath, name))
+        paths[scenario] = join(dpath, name)
+        logging.info(f"Scenario {scenario.name} dumped to {dpath}")
+
+    return paths
+
+
+def solve_dumped_scenarios(year=2020, days=365, dpath=EXAMPLES_MODELS_DIR):
+    '''
+    Solve the dumped scenarios and calculate their KPIs
+
+    :param year: Year of data
+    :param days: Number of days to model, starting on 01/01
+    :param dpath: Directory with the dumped files
+    '''
+    _, market_data = get_boundary_data(year=year, days=days)
+
+    results_dict = {}
+    kpis_dict = {}
+    for scenario in PowerPlants:
+        path = join(dpath, f"PowerPlant-{scenario.name}-{year}")
+        results, _ = solve_snapshot(path)
+        results_dict[scenario] = results
+        kpis_dict[scenario] = calculate_kpis(results, market_data)
+
+    return results_dict, kpis_dict
+
+
 def solve_and_write_data(year=2020, days=365):
     '''
     Solve the different scenarios and write the data to a XLSX
@@ -187,11 +316,10 @@ def solve_and_write_data(year=2020, days=365):
     :param days: Number of days to model, starting on 01/01
     '''
     data_path = join(EXAMPLES_DATA_DIR, 'PowerPlantsModels.xlsx')
-    writer = pd.ExcelWriter(data_path, engine='xlsxwriter')
 
     results_dict = {}
+    kpis_dict = {}
 
-    # One cannot open and close the workbook w/o deleting previous books
     district_df, market_data = get_boundary_data(year=year, days=days)
 
     for scenario in PowerPlants:
@@ -199,48 +327,43 @@ def solve_and_write_data(year=2020, days=365):
             scenario, district_df, market_data, days=days)
 
         results_dict[scenario] = results
+        kpis_dict[scenario] = kpis
+
+    # The workbook is written once all the scenarios are solved, so that a
+    # failed scenario or a parallel run never leaves a partial file
+    with atomic_write(data_path, "wb", lock=True) as f:
+        with pd.ExcelWriter(f, engine='xlsxwriter') as writer:
+            for scenario in PowerPlants:
+                # Labels for spreadsheets
+                results_dict[scenario].to_excel(
+                    writer, sheet_name=scenario.name + '-TimeSeries')
+                kpis_dict[scenario].to_excel(
+                    writer, sheet_name=scenario.name + '-KPIs')
 
-        # Labels for spreadsheets
-        ts_name = scenario.name + '-TimeSeries'
-        kpi_name = scenario.name + '-KPIs'
-
-        # Open Excel Writer
-        workbook = writer.book
-        worksheet = workbook.add_worksheet(ts_name)
-        writer.sheets[ts_name] = worksheet
-
-        # Save results and kpis to excel
-        results.to_excel(writer, sheet_name=ts_name)
-        worksheet = workbook.add_worksheet(kpi_name)
-        writer.sheets[kpi_name] = worksheet
-        kpis.to_excel(writer, sheet_name=kpi_name)
-
-    writer.save()
     logging.info(f"Results and KPIs saved to {data_path}")
     return results_dict
 
 
-def create_graphs(results_dict, year):
+def create_graphs(results_dict, year, processes=None):
     '''
-    Create graphs and save them in the Results visualization directory
+    Create graphs and save them in the Results visualization directory.
+    The series are downsampled to the width of the figure and the graphs
+    are rendered in parallel processes.
 
     :param results_dict: Dictionary with the results from the different scenarios
+    :param year: Year of the analysis
+    :param processes: Number of worker processes. None for one per CPU
     '''
+    jobs = []
     for scenario in PowerPlants:
         results = results_dict[scenario]
         c = [c for c in results.columns if "b_el_out" in c.split(",")[0]]
-        styles = ['b', 'r:', 'y-.', 'g-.']
+        path = join(EXAMPLES_PLOTS_DIR,
+                    f"PowerPlant-{scenario.name}-{year}.jpg")
+        jobs.append((results[c], path, str(scenario.name) + " Power Plant"))
 
-        # Create Plots
-        results[c].plot(
-            figsize=(16, 12),
-            style=styles,
-            title=str(scenario.name) + " Power Plant")
-        plt.savefig(
-            join(
-                EXAMPLES_PLOTS_DIR,
-                f"PowerPlant-{scenario.name}-{year}.jpg"))
-        logging.info(f"Plot saved for Scenario {scenario.name}")
+    render_plots(jobs, processes=processes)
+    logging.info(f"Plots saved for {len(jobs)} scenarios")
 
 
 def main(year=2020, days=365):
@@ -254,4 +377,5 @@ def main(year=2020, days=365):
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     main(year=2020, days=28)
@@ -0,0 +1,516 @@
+'''
+Created on 19.10.2026
+
+Runner for the scenarios of the district and power plant models.
+
+A scenario is described by a specification dictionary, e.g.
+
+{"model": "district", "year": 2019, "days": 28, "scenario": "BASELINE"}
+{"model": "power_plant", "year": 2019, "days": 28, "plant": "WIND"}
+
+All the inputs of a scenario (year, days, sizing, scenario multipliers,
+price and boundary data, solver options and library version) are hashed.
+With a result cache, runs with the same inputs are read from the cache
+instead of building and solving the model again.
+'''
+
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from os.path import join
+from examples.common import EXAMPLES_RESULTS_DIR
+from examples import district_model_4_markets as district
+from examples import power_plants_model as power_plants
+try:
+    from electricity_markets import __version__
+    from electricity_markets.result_cache import ResultCache, hash_inputs
+    from electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from electricity_markets.scaling import solver_results
+    from electricity_markets.snapshot import count_variables, load_values, solve_cbc, solve_highs
+    from electricity_markets.solver_tuning import budget_options, check_time_limit, tuned_options
+    from electricity_markets.work_queue import ResultStore, WorkQueue, run_workers
+except Exception:
+    from src.electricity_markets import __version__
+    from src.electricity_markets.result_cache import ResultCache, hash_inputs
+    from src.electricity_markets.electricity_market_constraints import build_model_and_constraints
+    from src.electricity_markets.scaling import solver_results
+    from src.electricity_markets.snapshot import count_variables, load_values, solve_cbc, solve_highs
+    from src.electricity_markets.solver_tuning import budget_options, check_time_limit, tuned_options
+    from src.electricity_markets.work_queue import ResultStore, WorkQueue, run_workers
+
+CACHE_DIR = join(EXAMPLES_RESULTS_DIR, "cache")
+
+# Work queue and result store of the batches, e.g. on a shared filesystem
+QUEUE_PATH = join(EXAMPLES_RESULTS_DIR, "batches", "queue.sqlite")
+STORE_DIR = join(EXAMPLES_RESULTS_DIR, "batches", "store")
+
+# Target of the job service and the work queue running the scenarios
+TARGET = "examples.scenario_runner:run_scenario"
+
+# Default solver options, see district_model_4_markets.solve_model
+SOLVER_OPTIONS = {"solver": "cbc", "cmdline_options": {"ratio": 0.1}}
+
+
+def normalize_spec(spec):
+    '''
+    Completes a scenario specification with the default values
+
+    :param spec: Scenario specification dictionary
+    '''
+    spec = dict(spec)
+    spec.setdefault("model", "district")
+    spec.setdefault("year", 2019)
+    spec.setdefault("days", 28)
+    spec.setdefault("solver_options", SOLVER_OPTIONS)
+
+    if spec["model"] == "district":
+        spec.setdefault("scenario", district.Scenarios.BASELINE.name)
+        spec["sizing"] = district.load_sizing(spec.get("sizing"))
+    elif spec["model"] == "power_plant":
+        spec.setdefault("plant", power_plants.PowerPlants.WIND.name)
+    else:
+        raise ValueError('Parameter "model" must be one "district" or '
+                         '"power_plant".')
+    return spec
+
+
+def load_scenario_data(spec):
+    '''
+    Reads the boundary and market data of a scenario
+
+    :param spec: Normalized scenario specification
+    '''
+    year, days = spec["year"], spec["days"]
+
+    if spec["model"] == "district":
+        scenario = district.Scenarios[spec["scenario"]]
+        boundary_data = district.get_district_dataframe(
+            year=year).head(days * 24 * 4)
+        market_data = district.get_market_dataframe(
+            days=days, year=year, scenario=scenario)
+    else:
+        boundary_data, market_data = power_plants.get_boundary_data(
+            year=year, days=days)
+
+    return boundary_data, market_data
+
+
+def scenario_key(spec, boundary_data, market_data):
+    '''
+    Hash of all the inputs of a scenario
+
+    :param spec: Normalized scenario specification
+    :param boundary_data: Boundary data of the scenario
+    :param market_data: Market data of the scenario
+    '''
+    multipliers = {}
+    if spec["model"] == "district":
+        multipliers = district.SCENARIO_MULTIPLIERS[
+            district.Scenarios[spec["scenario"]]]
+
+    return hash_inputs(
+        spec=spec,
+        multipliers=multipliers,
+        boundary_data=boundary_data,
+        market_data=market_data,
+        version=__version__)
+
+
+def build_scenario_model(spec, boundary_data, market_data):
+    '''
+    Creates the energy system of a scenario and builds the constrained model
+
+    :param spec: Normalized scenario specification
+    :param boundary_data: Boundary data of the scenario
+    :param market_data: Market data of the scenario
+    '''
+    if spec["model"] == "district":
+        es = district.create_energy_system(
+            boundary_data, market_data, spec["sizing"])
+    else:
+        es = power_plants.create_energy_system(
+            power_plants.PowerPlants[spec["plant"]],
+            boundary_data, market_data)
+    return build_model_and_constraints(es)
+
+
+def scenario_kpis(spec, results, market_data):
+    '''
+    KPIs of a solved scenario
+
+    :param spec: Normalized scenario specification
+    :param results: Results dataframe
+    :param market_data: Market data of the scenario
+    '''
+    if spec["model"] == "district":
+        return district.calculate_market_kpis(results, market_data)
+    return power_plants.calculate_kpis(results, market_data)
+
+
+def run_scenario(spec, cache=None, progress=None):
+    '''
+    Runs a scenario, reading the result from the cache if possible.
+
+    Returns a dictionary with the results dataframe, the KPIs, the timings of
+    each stage, the input hash and whether the result came from the cache.
+
+    :param spec: Scenario specification dictionary
+    :param cache: ResultCache, path of a cache directory or None for no cache
+    :param progress: Optional function called as progress(stage, seconds)
+        after each stage
+    '''
+    if isinstance(cache, str):
+        cache = ResultCache(cache)
+
+    timings = {}
+
+    def stage(name, start):
+        timings[name] = round(time.perf_counter() - start, 4)
+        if progress is not None:
+            progress(name, timings[name])
+
+    start = time.perf_counter()
+    spec = normalize_spec(spec)
+    boundary_data, market_data = load_scenario_data(spec)
+    key = scenario_key(spec, boundary_data, market_data)
+    stage("data", start)
+
+    if cache is not None:
+        start = time.perf_counter()
+        cached = cache.get(key)
+        stage("cache", start)
+        if cached is not None:
+            return dict(cached, timings=timings, key=key, cached=True)
+
+    start = time.perf_counter()
+    model = build_scenario_model(spec, boundary_data, market_data)
+    stage("build", start)
+
+    start = time.perf_counter()
+    solved_es = district.solve_model(model, **spec["solver_options"])
+    stage("solve", start)
+
+    start = time.perf_counter()
+    results = district.post_process_results(solved_es)
+    kpis = scenario_kpis(spec, results, market_data)
+    stage("post", start)
+
+    output = {"results": results, "kpis": kpis}
+    if cache is not None:
+        cache.put(key, output)
+
+    return dict(output, timings=timings, key=key, cached=False)
+
+
+def run_scenarios(specs, cache_dir=CACHE_DIR):
+    '''
+    Runs a list of scenarios with a shared result cache
+
+    :param specs: List of scenario specifications
+    :param cache_dir: Directory of the result cache. None for no cache
+    '''
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
+    outputs = []
+    for spec in specs:
+        output = run_scenario(spec, cache=cache)
+        logging.info(
+            "Scenario {} finished{} in {:.1f} s".format(
+                output["key"][:12],
+                " (cached)" if output["cached"] else "",
+                sum(output["timings"].values())))
+        outputs.append(output)
+    return outputs
+
+
+# Marks the end of the scenarios in the queues of the pipeline
+_DONE = object()
+
+# Solver options of solve_model supported by the pipeline
+PIPELINE_OPTIONS = ["solver", "cmdline_options", "time_limit", "gap",
+                    "model_class"]
+
+
+def pipeline_options(solver_options):
+    '''
+    Solver, solver options and whether a budget is set for the pipeline,
+    from the solver options of a specification, like solve_model does.
+    Options the pipeline does not support (e.g. scaling or warm_start)
+    raise an error instead of being ignored.
+
+    :param solver_options: Solver options of a specification
+    '''
+    unsupported = [k for k, v in solver_options.items()
+                   if k not in PIPELINE_OPTIONS and v]
+    if unsupported:
+        raise ValueError(
+            f"Solver options {unsupported} are not supported by "
+            "run_pipelined, use run_scenarios.")
+
+    solver = solver_options.get("solver", "cbc")
+    if solver not in ["cbc", "highs"]:
+        raise ValueError('Parameter "solver" must be one "cbc" or "highs".')
+    time_limit = solver_options.get("time_limit")
+    gap = solver_options.get("gap")
+    check_time_limit(solver, time_limit)
+
+    options = solver_options.get("cmdline_options")
+    if options is None and solver_options.get("model_class") is not None:
+        options = tuned_options(solver_options["model_class"], solver)
+    if options is None:
+        options = {"ratio": 0.1} if solver == "cbc" else {}
+    budget = time_limit is not None or gap is not None
+    if budget:
+        options = budget_options(solver, options, time_limit, gap)
+    return solver, options, budget
+
+
+def _build_stage(specs, cache, solve_queue, outputs):
+    '''
+    Loads the data, builds the models and writes their LP files.
+    Scenarios found in the cache skip the other stages.
+    '''
+    for k, spec in enumerate(specs):
+        timings = {}
+        try:
+            start = time.perf_counter()
+            spec = normalize_spec(spec)
+            boundary_data, market_data = load_scenario_data(spec)
+            key = scenario_key(spec, boundary_data, market_data)
+            timings["data"] = round(time.perf_counter() - start, 4)
+
+            if cache is not None:
+                cached = cache.get(key)
+                if cached is not None:
+                    outputs[k] = dict(cached, timings=timings, key=key,
+                                      cached=True)
+                    continue
+
+            start = time.perf_counter()
+            model = build_scenario_model(spec, boundary_data, market_data)
+            timings["build"] = round(time.perf_counter() - start, 4)
+
+            start = time.perf_counter()
+            tmp_dir = tempfile.mkdtemp(prefix="scenario_")
+            lp_file = os.path.join(tmp_dir, "model.lp")
+            _, smap_id = model.write(
+                lp_file, io_options={"symbolic_solver_labels": False})
+            timings["write"] = round(time.perf_counter() - start, 4)
+        except Exception as e:
+            outputs[k] = {"error": repr(e), "timings": timings}
+            continue
+
+        # Blocks while the solver is busy and the queue is full
+        solve_queue.put({"index": k, "spec": spec, "key": key,
+                         "model": model, "smap_id": smap_id,
+                         "market_data": market_data, "tmp_dir": tmp_dir,
+                         "lp_file": lp_file, "timings": timings})
+    solve_queue.put(_DONE)
+
+
+def _solve_stage(solve_queue, post_queue, outputs):
+    '''
+    Runs the solver on the written LP files, one scenario at a time.
+    '''
+    while True:
+        item = solve_queue.get()
+        if item is _DONE:
+            post_queue.put(_DONE)
+            return
+
+        try:
+            solver, options, item["budget"] = pipeline_options(
+                item["spec"]["solver_options"])
+            start = time.perf_counter()
+            if solver == "cbc":
+                solution = solve_cbc(item["lp_file"], item["tmp_dir"],
+                                     options)
+            else:
+                solution = solve_highs(item["lp_file"], options)
+            item["timings"]["solve"] = round(time.perf_counter() - start, 4)
+            item["solution"] = solution
+        except Exception as e:
+            outputs[item["index"]] = {"error": repr(e),
+                                      "timings": item["timings"]}
+            shutil.rmtree(item["tmp_dir"], ignore_errors=True)
+            continue
+        finally:
+            solve_queue.task_done()
+
+        shutil.rmtree(item["tmp_dir"], ignore_errors=True)
+        post_queue.put(item)
+
+
+def _post_stage(post_queue, cache, outputs):
+    '''
+    Loads the solutions into the models and processes the results.
+    '''
+    while True:
+        item = post_queue.get()
+        if item is _DONE:
+            return
+
+        try:
+            start = time.perf_counter()
+            status, objective, values = item["solution"]
+            model = item["model"]
+            symbol_map = model.solutions.symbol_map[item["smap_id"]]
+            if status in ["optimal", "feasible"]:
+                load_values(symbol_map, values)
+            model.solver_results = solver_results(
+                status, objective, item["timings"]["solve"],
+                count_variables(symbol_map), None, None)
+            model.es.results = model.solver_results
+
+            solved_es = district.collect_results(
+                model, accept_feasible=item["budget"])
+            results = district.post_process_results(solved_es)
+            kpis = scenario_kpis(item["spec"], results, item["market_data"])
+            item["timings"]["post"] = round(time.perf_counter() - start, 4)
+
+            output = {"results": results, "kpis": kpis}
+            if cache is not None:
+                cache.put(item["key"], output)
+            outputs[item["index"]] = dict(
+                output, timings=item["timings"], key=item["key"],
+                cached=False)
+        except Exception as e:
+            outputs[item["index"]] = {"error": repr(e),
+                                      "timings": item["timings"]}
+
+
+def run_pipelined(specs, cache_dir=CACHE_DIR, prefetch=1):
+    '''
+    Runs a list of scenarios as a pipeline of three threads: building the
+    models and writing their LP files, running the solver and processing
+    the results. The next models are built while the solver process of the
+    current one runs, and finished scenarios are processed in the
+    background. The wall time for many scenarios approaches the sum of the
+    solve times when solving dominates.
+
+    The solver runs as an external process (cbc) or releases the
+    interpreter while solving (HiGHS), so the threads overlap even though
+    building and processing are Python code. Only the solvers "cbc" and
+    "highs" and the solver options of PIPELINE_OPTIONS are supported, see
+    pipeline_options. Other options raise a ValueError before any scenario
+    is run.
+
+    Returns the outputs in the order of the specifications, like
+    run_scenario, or a dictionary with the error of a failed scenario.
+
+    :param specs: List of scenario specifications
+    :param cache_dir: Directory of the result cache. None for no cache
+    :param prefetch: Number of built models waiting for the solver. Limits
+        the memory used by models built ahead
+    '''
+    for spec in specs:
+        pipeline_options(normalize_spec(spec)["solver_options"])
+
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
+    outputs = [None] * len(specs)
+    solve_queue = queue.Queue(maxsize=prefetch)
+    post_queue = queue.Queue(maxsize=prefetch)
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=_build_stage, name="build",
+                         args=(specs, cache, solve_queue, outputs)),
+        threading.Thread(target=_solve_stage, name="solve",
+                         args=(solve_queue, post_queue, outputs)),
+        threading.Thread(target=_post_stage, name="post",
+                         args=(post_queue, cache, outputs)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    wall_time = time.perf_counter() - start
+    solve_time = sum(o["timings"].get("solve", 0) for o in outputs)
+    logging.info(
+        "{} scenarios run in {:.1f} s, of which {:.1f} s solving".format(
+            len(specs), wall_time, solve_time))
+    return outputs
+
+
+def batch_specs(year=2019, days=28):
+    '''
+    Specifications of all the district scenarios and power plants
+
+    :param year: Year of simulation
+    :param days: Number of days
+    '''
+    specs = [{"model": "district", "year": year, "days": days,
+              "scenario": s.name} for s in district.Scenarios]
+    specs += [{"model": "power_plant", "year": year, "days": days,
+               "plant": p.name} for p in power_plants.PowerPlants]
+    return specs
+
+
+def submit_batch(specs, batch="default", queue_path=QUEUE_PATH):
+    '''
+    Adds scenarios to a batch of the work queue, see
+    electricity_markets.work_queue. Submitting a batch again resumes it.
+    Returns the number of added scenarios.
+
+    :param specs: List of scenario specifications
+    :param batch: Name of the batch
+    :param queue_path: Path of the SQLite file of the queue
+    '''
+    return WorkQueue(queue_path).submit(specs, batch=batch)
+
+
+def run_batch(batch=None, processes=None, queue_path=QUEUE_PATH,
+              store_dir=STORE_DIR, cache_dir=CACHE_DIR):
+    '''
+    Runs workers of the work queue on this machine until the batch is
+    finished. Start it on every machine that sees the queue and the store.
+    Returns the number of scenarios run on this machine.
+
+    :param batch: Name of the batch. None for all batches
+    :param processes: Number of worker processes. None for one per CPU
+    :param queue_path: Path of the SQLite file of the queue
+    :param store_dir: Root directory of the result store
+    :param cache_dir: Directory of the result cache. None for no cache
+    '''
+    return run_workers(queue_path, store_dir, processes=processes,
+                       batch=batch, target=TARGET, cache_dir=cache_dir)
+
+
+def collect_batch(batch="default", queue_path=QUEUE_PATH, results=False,
+                  store_dir=STORE_DIR):
+    '''
+    KPIs of the finished scenarios of a batch as a dataframe, one row per
+    scenario with its specification, and the state of the other scenarios
+
+    :param batch: Name of the batch
+    :param queue_path: Path of the SQLite file of the queue
+    :param results: If True, also returns a dictionary of the results
+        dataframes read from the store, by task key
+    :param store_dir: Root directory of the result store on this machine
+    '''
+    import pandas as pd
+
+    tasks = WorkQueue(queue_path).tasks(batch)
+    done = tasks[tasks["state"] == "done"]
+    kpis = pd.DataFrame(
+        [dict(t["spec"], **t["result"]["kpis"]) for _, t in done.iterrows()])
+    logging.info("Batch {}: {}".format(
+        batch, tasks["state"].value_counts().to_dict()))
+    if not results:
+        return kpis
+    store = ResultStore(store_dir)
+    return kpis, {t["key"]: store.get(t["result"]["path"])["results"]
+                  for _, t in done.iterrows()}
+
+
+def main(year=2019, days=28):
+    return run_scenarios(batch_specs(year, days))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main(year=2019, days=28)
@@ -55,6 +55,11 @@ setup(
         "oemof.solph",
         "openpyxl",
         "xlsxwriter", ],
+    extras_require={
+        "highs": ["highspy"],
+        "matrix": ["scipy", "highspy"],
+        "polars": ["polars", "pyarrow"],
+    },
 
     project_urls={  # Optional
         'Bug Reports': 'https://github.com/Fernando3161/EnergyMarketsSimulation',
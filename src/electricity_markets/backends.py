@@ -0,0 +1,168 @@
+'''
+Created on 19.10.2026
+
+Table backends of the price tables and the dispatch results.
+
+* pandas: DataFrames with a DatetimeIndex, as always
+* polars: Polars DataFrames with the time stamps in a "Date" column
+* arrow: pyarrow Tables with the same columns as the Polars DataFrames
+
+The Polars and Arrow tables are built from the numpy arrays of the prices
+and flows, without an intermediate pandas DataFrame. Float columns are
+taken over from numpy without a copy, and Polars passes its buffers on to
+Arrow without a copy as well. The computations done on the tables (masks,
+resampling and KPIs) are Polars expressions, evaluated in parallel by the
+Polars thread pool. Divisions by scalars are done outside of Polars, so the
+prices are identical to the ones of the pandas path.
+
+polars (and pyarrow for the arrow backend) are only imported when used.
+'''
+
+import logging
+from .fileio import atomic_write
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ["pandas", "arrow", "polars"]
+
+# Name of the time column of the Polars and Arrow tables
+TIME_COLUMN = "Date"
+
+
+def check_backend(backend):
+    '''
+    Checks the name of a backend
+
+    :param backend: One of BACKENDS
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(
+            'Parameter "backend" must be one "pandas", "arrow" or "polars".')
+
+
+def time_series(index, name=TIME_COLUMN):
+    '''
+    Polars series of the time stamps of a pandas DatetimeIndex, keeping its
+    time zone
+
+    :param index: pandas DatetimeIndex
+    :param name: Name of the series
+    '''
+    import polars as pl
+
+    if index.tz is None:
+        return pl.Series(name, index.asi8).cast(pl.Datetime("ns"))
+    # asi8 holds the UTC time stamps of a time zone aware index
+    return pl.Series(name, index.asi8).cast(
+        pl.Datetime("ns", "UTC")).dt.convert_time_zone(str(index.tz))
+
+
+def polars_frame(columns, index, name=TIME_COLUMN):
+    '''
+    Polars DataFrame with a time column and a column per array
+
+    :param columns: Dictionary of column name: numpy array
+    :param index: pandas DatetimeIndex of the rows
+    :param name: Name of the time column
+    '''
+    import polars as pl
+
+    series = [time_series(index, name)]
+    series += [pl.Series(str(c), values) for c, values in columns.items()]
+    return pl.DataFrame(series)
+
+
+def from_polars(df, backend):
+    '''
+    Returns a Polars DataFrame in a backend other than pandas
+
+    :param df: Polars DataFrame
+    :param backend: One of "polars" or "arrow"
+    '''
+    if backend == "polars":
+        return df
+    if backend == "arrow":
+        return df.to_arrow()
+    raise ValueError('Parameter "backend" must be one "arrow" or "polars".')
+
+
+def to_polars(table):
+    '''
+    Polars DataFrame of a Polars DataFrame, an Arrow Table or a pandas
+    DataFrame. A pandas DatetimeIndex becomes the time column. pandas
+    columns are passed as numpy arrays, without pyarrow
+
+    :param table: Polars DataFrame, pyarrow Table or pandas DataFrame
+    '''
+    import pandas as pd
+    import polars as pl
+
+    if isinstance(table, pl.DataFrame):
+        return table
+    if isinstance(table, pd.DataFrame):
+        columns = {c: table[c].to_numpy() for c in table.columns}
+        if isinstance(table.index, pd.DatetimeIndex):
+            return polars_frame(columns, table.index)
+        return pl.DataFrame([pl.Series(str(c), values)
+                             for c, values in columns.items()])
+    return pl.from_arrow(table)
+
+
+def write_csv(table, path, lock=False):
+    '''
+    Writes a Polars DataFrame or Arrow Table to a csv file atomically, in
+    the format written by pandas
+
+    :param table: Polars DataFrame or pyarrow Table
+    :param path: Path of the csv file
+    :param lock: If True, holds fileio.file_lock on path while writing
+    '''
+    with atomic_write(path, "w", encoding="utf-8", newline="",
+                      lock=lock) as f:
+        to_polars(table).write_csv(
+            f, datetime_format="%Y-%m-%d %H:%M:%S%:z")
+    return path
+
+
+def market_kpis(results, market_data, markets, steps_per_hour=4,
+                price_factor=1000):
+    '''
+    Energy sold and income of each market from Polars, Arrow or pandas
+    tables (see to_polars), as in
+    district_model_4_markets.calculate_market_kpis. All the sums are one
+    Polars selection, evaluated in parallel.
+
+    Returns a dictionary of KPI: value.
+
+    :param results: Results table with the columns "b_el_out, s_<market>"
+    :param market_data: Price table with the market columns
+    :param markets: Dictionary of market abbreviation: price column
+    :param steps_per_hour: Time steps per hour
+    :param price_factor: Energy units per price unit, e.g. 1000 for kWh
+        and prices in EUR/MWh
+    '''
+    import polars as pl
+
+    results = to_polars(results)
+    prices = to_polars(market_data)
+    columns = {f"b_el_out, s_{m}": c for m, c in markets.items()}
+    both = pl.concat([results.select(list(columns)),
+                      prices.select(list(dict.fromkeys(columns.values())))],
+                     how="horizontal")
+
+    expressions = []
+    for m, column in markets.items():
+        sold = pl.col(f"b_el_out, s_{m}")
+        expressions.append(sold.sum().alias(f"energy, {m}"))
+        expressions.append(
+            (sold * pl.col(column)).sum().alias(f"income, {m}"))
+    sums = both.select(expressions).row(0, named=True)
+
+    # Divided here, Polars divides by a scalar as a multiplication with its
+    # inverse
+    return {k: v / steps_per_hour if k.startswith("energy")
+            else v / steps_per_hour / price_factor for k, v in sums.items()}
+
+
+if __name__ == '__main__':
+    pass
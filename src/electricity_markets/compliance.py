@@ -0,0 +1,185 @@
+'''
+Created on 19.10.2026
+
+Check of a dispatch against the rules of the market products, without
+solving the model again.
+
+The rules are the constraints of build_model_and_constraints:
+
+* day_ahead: The flow of each time step equals the flow of the first time
+  step of its hour
+* intra_day: No rule, the flow can change in every time step
+* future_base: The flow of each time step equals the first flow
+* future_peak: The flow of each peak time step equals the first peak flow
+  and the flows outside the peak hours are zero
+
+Each time step of each product is compared with a reference flow: the first
+flow of its block, itself for the intra day, or zero outside the peak hours.
+All the references are taken with one gather from the dispatch array, so a
+whole batch of dispatches of the same horizon is checked in one vectorized
+pass. The result is the largest violation of each product.
+
+Fast paths that do not solve the full model (aggregation, decomposition,
+heuristics or solves with a tolerance) can use it to confirm that their
+dispatch is still valid.
+'''
+
+import numpy as np
+from .products import (MARKET_BUS, PRICE_TOLERANCE, Products, SINK_LABELS,
+                       STEPS_PER_HOUR)
+
+# Order of the products in the dispatch arrays
+PRODUCTS = list(Products)
+
+# Relative tolerance of the checks, see check_compliance
+TOLERANCE = 1e-6
+
+
+def peak_steps(prices, tolerance=PRICE_TOLERANCE):
+    '''
+    Mask of the time steps with a future peak price. These are the peak time
+    steps of build_model_and_constraints.
+
+    The tolerance is relative to the largest absolute price, so the prices
+    and the variable costs of the market sink (e.g. -price / 1000 in
+    EUR/kWh) give the same mask.
+
+    :param prices: Future peak prices or variable costs
+    :param tolerance: Prices up to this share of the largest absolute price
+        are taken as zero
+    '''
+    prices = np.abs(np.asarray(prices, dtype=float))
+    return prices > tolerance * prices.max(initial=0.)
+
+
+def block_starts(product, peak, steps):
+    '''
+    First time step of the block of each time step of a product, or None
+    if the product has no blocks. Time steps outside the blocks are -1.
+
+    :param product: Member of Products
+    :param peak: Mask of the peak time steps, see peak_steps. Only used
+        for the future peak
+    :param steps: Number of time steps
+    '''
+    t = np.arange(steps)
+    if product == Products.DAY_AHEAD:
+        return t - t % STEPS_PER_HOUR
+    if product == Products.FUTURE_BASE:
+        return np.zeros(steps, dtype=int)
+    if product == Products.FUTURE_PEAK:
+        peak = np.asarray(peak, dtype=bool)[:steps]
+        if not peak.any():
+            return np.full(steps, -1)
+        return np.where(peak, np.argmax(peak), -1)
+    return None
+
+
+def reference_steps(peak, steps):
+    '''
+    Time step of the reference flow of each product and time step as an
+    array of shape (len(PRODUCTS), steps). Time steps without a block refer
+    to themselves, the ones outside the blocks are -1 (reference zero).
+
+    :param peak: Mask of the peak time steps, see peak_steps
+    :param steps: Number of time steps
+    '''
+    references = np.empty((len(PRODUCTS), steps), dtype=int)
+    for i, product in enumerate(PRODUCTS):
+        starts = block_starts(product, peak, steps)
+        references[i] = np.arange(steps) if starts is None else starts
+    return references
+
+
+def product_violations(dispatch, peak):
+    '''
+    Largest violation of the rules of each product and the time step where
+    it occurs.
+
+    Returns two arrays of the shape of dispatch without its last axis: the
+    largest absolute deviation of a flow from its reference flow, and the
+    time step of that deviation.
+
+    :param dispatch: Array of the flows to the markets with the shape
+        (..., len(PRODUCTS), steps), the products in the order of PRODUCTS.
+        Leading axes are e.g. the scenarios of a batch
+    :param peak: Mask of the peak time steps, see peak_steps
+    '''
+    dispatch = np.asarray(dispatch, dtype=float)
+    steps = dispatch.shape[-1]
+    references = reference_steps(peak, steps)
+
+    gathered = np.take_along_axis(
+        dispatch, np.broadcast_to(np.maximum(references, 0), dispatch.shape),
+        axis=-1)
+    deviation = np.abs(dispatch - np.where(references >= 0, gathered, 0.))
+    if steps == 0:
+        return deviation.sum(axis=-1), np.zeros(deviation.shape[:-1], int)
+    return deviation.max(axis=-1), deviation.argmax(axis=-1)
+
+
+def _columns(table):
+    # Arrow Tables name their columns column_names
+    names = getattr(table, "column_names", None)
+    return list(table.columns) if names is None else list(names)
+
+
+def dispatch_array(results, bus=MARKET_BUS):
+    '''
+    Array of the flows to the markets of a results table with the shape
+    (len(PRODUCTS), steps). Markets missing in the table have no flow.
+
+    :param results: Results of post_process_results as pandas or Polars
+        DataFrame or Arrow Table, with the columns "b_el_out, s_da" etc.
+    :param bus: Label of the bus of the markets
+    '''
+    columns = _columns(results)
+    steps = len(results)
+    dispatch = np.zeros((len(PRODUCTS), steps))
+    for i, product in enumerate(PRODUCTS):
+        name = f"{bus}, {SINK_LABELS[product]}"
+        if name in columns:
+            dispatch[i] = np.asarray(results[name], dtype=float)
+    return dispatch
+
+
+def check_compliance(results, market_data, tolerance=TOLERANCE,
+                     bus=MARKET_BUS):
+    '''
+    Checks if the dispatch of one or more results complies with the market
+    products.
+
+    Returns a dataframe with a row per results table, the largest violation
+    of each product and a column "compliant". A dispatch is compliant if
+    no violation is larger than tolerance times its largest flow (at least
+    one), which leaves room for the feasibility tolerance of the solvers.
+
+    :param results: Results table (pandas, Polars or Arrow) or a dictionary
+        of name: results table of the same horizon, e.g. of a batch of
+        scenarios
+    :param market_data: Market data with a "future_peak" column (pandas,
+        Polars or Arrow), or a numpy mask of the peak time steps
+    :param tolerance: Relative tolerance of the violations
+    :param bus: Label of the bus of the markets
+    '''
+    import pandas as pd
+
+    tables = results if isinstance(results, dict) else {0: results}
+    dispatch = np.stack([dispatch_array(t, bus) for t in tables.values()])
+
+    if isinstance(market_data, np.ndarray):
+        peak = market_data
+    else:
+        peak = peak_steps(market_data[Products.FUTURE_PEAK.value])
+    violations, _ = product_violations(dispatch, peak)
+
+    scale = np.maximum(np.abs(dispatch).max(axis=(1, 2), initial=0.), 1.)
+    report = pd.DataFrame(violations, index=list(tables),
+                          columns=[p.value for p in PRODUCTS])
+    report["compliant"] = (violations <= tolerance * scale[:, None]).all(
+        axis=1)
+    return report
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,442 @@
+'''
+Created on 19.10.2026
+
+Exact decomposition of long horizons into windows (e.g. weeks or months),
+solved in parallel worker processes.
+
+The windows of a horizon are only coupled by a few decisions:
+
+* The volume of the future base, the same in every time step
+* The volume of the future peak, the same in every peak time step
+* The content of each storage at the boundaries between the windows
+
+These are the variables of a small master problem. Each window is a model of
+its own, built once in a worker process, with the coupled flows and storage
+contents fixed to the values of the master by coupling constraints. The
+duals of the coupling constraints give one Benders cut per window and
+iteration, the master with all the cuts gives a lower bound of the
+objective and the next values of the coupled decisions, and the sum of the
+window objectives gives an upper bound. The bounds meet at the optimum of
+the monolithic model, so the iterations stop at a relative gap. The same
+master couples price scenarios that share the futures volumes, see
+stochastic.py.
+
+The coupling constraints have slack variables with a penalty in the
+objective, so that every window stays feasible for any values of the
+master. With a penalty above the value of the coupled decisions the slacks
+are zero at the optimum. The windows are solved with HiGHS (highspy), which
+keeps each window loaded and starts from its last basis.
+'''
+
+import logging
+import multiprocessing
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Penalty of the slack of the coupling constraints, per unit of the flows
+# or storage contents
+PENALTY = 1e4
+
+
+def split_horizon(timeindex, freq="W"):
+    '''
+    Splits a time index into windows of calendar periods.
+    Returns a list of (start, stop) positions of the windows.
+
+    :param timeindex: pandas DatetimeIndex of the horizon
+    :param freq: pandas period frequency of the windows, e.g. "W" for
+        weeks or "M" for months
+    '''
+    import numpy as np
+
+    periods = timeindex.tz_localize(None).to_period(freq) \
+        if timeindex.tz is not None else timeindex.to_period(freq)
+    codes = np.asarray(periods.asi8)
+    starts = np.flatnonzero(np.diff(codes)) + 1
+    bounds = [0] + starts.tolist() + [len(timeindex)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _Window:
+    '''
+    Model of a window with the coupling constraints, loaded in HiGHS
+    '''
+
+    def __init__(self, number, count, create_energy_system, args, penalty,
+                 cmdline_options):
+        import highspy
+        import os
+        import tempfile
+        import pyomo.environ as po
+        from oemof.solph.components import GenericStorage
+        from .electricity_market_constraints import (
+            build_model_and_constraints, futures_variables)
+
+        self.number = number
+        energy_system = create_energy_system(*args)
+        storages = [n for n in energy_system.nodes
+                    if isinstance(n, GenericStorage)]
+        # Initial contents and balances of the storages are coupled
+        states = {n: (n.initial_storage_level, n.balanced) for n in storages}
+        if count > 1:
+            for n in storages:
+                if number > 0:
+                    n.initial_storage_level = None
+                n.balanced = False
+
+        model = build_model_and_constraints(energy_system)
+        steps = len(energy_system.timeindex)
+
+        # Coupled variables: (name, variable, lower bound, upper bound)
+        coupled = [(name, var, 0., None)
+                   for name, var in futures_variables(model).items()]
+
+        for n in (storages if count > 1 else []):
+            block = model.GenericStorageBlock
+            capacity = n.nominal_storage_capacity
+            initial, balanced = states[n]
+            if number > 0:
+                coupled.append((f"{n.label}, {number}", block.init_content[n],
+                                0., capacity))
+            elif balanced and initial is None:
+                coupled.append((f"{n.label}, 0", block.init_content[n],
+                                0., capacity))
+            if number < count - 1:
+                coupled.append((f"{n.label}, {number + 1}",
+                                block.storage_content[n, steps - 1],
+                                0., capacity))
+            elif balanced:
+                # The end of the horizon equals its beginning
+                level = None if initial is None else initial * capacity
+                coupled.append((f"{n.label}, 0",
+                                block.storage_content[n, steps - 1],
+                                0. if level is None else level,
+                                capacity if level is None else level))
+
+        index = range(len(coupled))
+        model.coupling_up = po.Var(index, within=po.NonNegativeReals)
+        model.coupling_down = po.Var(index, within=po.NonNegativeReals)
+        model.coupling = po.Constraint(
+            index, rule=lambda m, i: coupled[i][1] + m.coupling_up[i]
+            - m.coupling_down[i] == 0)
+        model.objective.expr = model.objective.expr + penalty * sum(
+            model.coupling_up[i] + model.coupling_down[i] for i in index)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lp_file = os.path.join(tmp_dir, "window.lp")
+            _, smap_id = model.write(
+                lp_file, io_options={"symbolic_solver_labels": False})
+            self.symbol_map = model.solutions.symbol_map[smap_id]
+            self.highs = highspy.Highs()
+            self.highs.setOptionValue("output_flag", False)
+            for k, v in (cmdline_options or {}).items():
+                self.highs.setOptionValue(k, v)
+            self.highs.readModel(lp_file)
+
+        # Rows and columns of the components, rows are named by aliases
+        def positions(names):
+            found = {}
+            for i, name in enumerate(names):
+                ref = self.symbol_map.bySymbol.get(name) or \
+                    self.symbol_map.aliases.get(name)
+                if ref is not None:
+                    found[id(ref())] = i
+            return found
+
+        lp = self.highs.getLp()
+        rows = positions(lp.row_names_)
+        columns = positions(lp.col_names_)
+        self.rows = [rows[id(model.coupling[i])] for i in index]
+        self.slacks = [columns[id(v[i])] for i in index
+                       for v in (model.coupling_up, model.coupling_down)]
+        self.names = [c[0] for c in coupled]
+        self.bounds = [(c[2], c[3]) for c in coupled]
+        self.model = model
+
+    def solve(self, values):
+        '''
+        Solves the window with the coupled decisions fixed to values.
+        Returns the objective, the duals of the coupling constraints, the
+        total slack and the solve time.
+        '''
+        start = time.perf_counter()
+        for row, name in zip(self.rows, self.names):
+            self.highs.changeRowBounds(row, values[name], values[name])
+        self.highs.run()
+        status = self.highs.modelStatusToString(
+            self.highs.getModelStatus()).lower()
+        if status != "optimal":
+            raise AssertionError(
+                f"Window {self.number} not solved ({status})")
+        solution = self.highs.getSolution()
+        duals = [solution.row_dual[r] for r in self.rows]
+        slack = sum(solution.col_value[j] for j in self.slacks)
+        objective = self.highs.getInfo().objective_function_value
+        return objective, duals, slack, time.perf_counter() - start
+
+    def results(self, values, process_results):
+        '''
+        Solves the window, writes the solution to its model and returns the
+        processed results
+        '''
+        from oemof.solph import processing, views
+        from .scaling import solver_results
+        from .snapshot import load_values
+
+        objective, _, _, solve_time = self.solve(values)
+        names = self.highs.getLp().col_names_
+        load_values(self.symbol_map, dict(
+            zip(names, self.highs.getSolution().col_value)))
+        results = solver_results("optimal", objective, round(solve_time, 4),
+                                 len(names), None, None)
+        self.model.solver_results = results
+        self.model.es.results = results
+        # The coupling is not part of the energy system, processing.results
+        # only knows the components of the nodes
+        for name in ["coupling", "coupling_up", "coupling_down"]:
+            self.model.del_component(name)
+        if process_results is not None:
+            return process_results(self.model)
+        return views.convert_keys_to_strings(processing.results(self.model))
+
+
+def _worker(conn, windows, count, create_energy_system, penalty,
+            cmdline_options, process_results):
+    '''
+    Builds the models of some windows and solves them on request
+    '''
+    try:
+        models = {k: _Window(k, count, create_energy_system, args, penalty,
+                             cmdline_options) for k, args in windows}
+        conn.send(("ready", {k: (w.names, w.bounds)
+                             for k, w in models.items()}))
+        while True:
+            command, values = conn.recv()
+            if command == "solve":
+                conn.send(("solved", {k: w.solve(values)
+                                      for k, w in models.items()}))
+            elif command == "results":
+                conn.send(("results", {k: w.results(values, process_results)
+                                       for k, w in models.items()}))
+            else:
+                break
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def _receive(connections, expected):
+    '''
+    Merges the replies of all the workers
+    '''
+    merged = {}
+    for conn in connections:
+        message, data = conn.recv()
+        if message == "error":
+            raise RuntimeError(f"Worker of the decomposition failed:\n{data}")
+        if message != expected:
+            raise RuntimeError(f"Unexpected reply {message} of a worker")
+        merged.update(data)
+    return merged
+
+
+def _solve_master(names, bounds, cuts, windows):
+    '''
+    Solves the master problem: minimum of the sum of the window objectives
+    over the cuts. Returns the lower bound and the values of the coupled
+    decisions.
+    '''
+    import highspy
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    inf = highspy.kHighsInf
+    position = {name: i for i, name in enumerate(names)}
+    for name in names:
+        low, high = bounds[name]
+        h.addVar(low, inf if high is None else high)
+    theta = {}
+    for k in windows:
+        theta[k] = h.numVariables
+        h.addVar(-inf, inf)
+        h.changeColCost(theta[k], 1.)
+
+    for k, window_names, point, objective, duals in cuts:
+        # theta_k >= objective + dual * (y - point)
+        indices = [theta[k]] + [position[n] for n in window_names]
+        values = [1.] + [-d for d in duals]
+        rhs = objective - sum(d * point[n] for n, d in zip(window_names,
+                                                              duals))
+        h.addRow(rhs, inf, len(indices), indices, values)
+
+    h.run()
+    status = h.modelStatusToString(h.getModelStatus()).lower()
+    if status != "optimal":
+        raise AssertionError(f"Master problem not solved ({status})")
+    solution = h.getSolution().col_value
+    return h.getInfo().objective_function_value, \
+        {n: solution[position[n]] for n in names}
+
+
+def solve_decomposed(create_energy_system, windows, volume_bound,
+                     processes=None, tolerance=1e-5, max_iterations=200,
+                     penalty=PENALTY, cmdline_options=None,
+                     process_results=None, couple_storages=True,
+                     weights=None):
+    '''
+    Solves a long horizon as windows coupled by the futures volumes and the
+    storage contents at their boundaries, see the module description.
+
+    Returns a dictionary with:
+
+    * objective: Objective value of the best solution (upper bound)
+    * lower_bound, gap, converged
+    * coupling: Values of the coupled decisions of the best solution
+    * iterations: Dataframe with the lower and upper bound, the relative
+      gap and the times of the master and the windows of each iteration
+    * results: List of the results of the windows, in their order
+
+    :param create_energy_system: Function building the energy system of a
+        window from its arguments. It must be importable by the worker
+        processes, e.g. a module level function
+    :param windows: List of the arguments of create_energy_system for each
+        window, in the order of the horizon, e.g. slices of the time series
+    :param volume_bound: Upper bound of the futures volumes, e.g. the largest
+        power that can be sold
+    :param processes: Number of worker processes. None for one per CPU, at
+        most one per window
+    :param tolerance: Relative gap between the bounds at which the
+        iterations stop
+    :param max_iterations: Maximum number of iterations
+    :param penalty: Penalty of the slack of the coupling constraints. It
+        must be above the value of one unit of the coupled decisions
+    :param cmdline_options: HiGHS options of the windows
+    :param process_results: Function returning the results of a solved
+        window model, e.g. a dataframe of its flows. It must be importable
+        by the worker processes. Defaults to processing.results
+    :param couple_storages: If False, the storages of each window are
+        independent and only the futures volumes are coupled, e.g. for the
+        price scenarios of a stochastic model (see stochastic.py)
+    :param weights: Weights of the window objectives, e.g. the
+        probabilities of scenarios. None for a weight of one
+    '''
+    import os
+    import pandas as pd
+
+    count = len(windows)
+    weights = [1.] * count if weights is None else list(weights)
+    processes = max(min(processes or os.cpu_count(), count), 1)
+    size = -(-count // processes)
+    chunks = [list(enumerate(windows))[k:k + size]
+              for k in range(0, count, size)]
+
+    # Fresh interpreters, no solver state is shared with the caller
+    context = multiprocessing.get_context("spawn")
+    connections, workers = [], []
+    for chunk in chunks:
+        parent_conn, child_conn = context.Pipe()
+        worker = context.Process(
+            target=_worker,
+            args=(child_conn, chunk, count if couple_storages else 1,
+                  create_energy_system, penalty, cmdline_options,
+                  process_results),
+            daemon=True)
+        worker.start()
+        child_conn.close()
+        connections.append(parent_conn)
+        workers.append(worker)
+
+    try:
+        start = time.perf_counter()
+        coupled = _receive(connections, "ready")
+        logger.info(f"{count} windows built in {len(chunks)} processes in "
+                    f"{time.perf_counter() - start:.1f} s")
+
+        bounds = {}
+        for names, window_bounds in coupled.values():
+            for name, (low, high) in zip(names, window_bounds):
+                if name in ["future_base", "future_peak"]:
+                    high = volume_bound
+                if name in bounds:
+                    low = max(low, bounds[name][0])
+                    high = min(high, bounds[name][1])
+                bounds[name] = (low, high)
+        names = list(bounds)
+
+        # The first values sell no futures and keep the storages empty
+        values = {n: bounds[n][0] for n in names}
+        cuts, rows = [], []
+        best, best_values, best_slack = float("inf"), values, 0.
+        lower_bound, master_time = -float("inf"), 0.
+        converged = False
+
+        for iteration in range(1, max_iterations + 1):
+            start = time.perf_counter()
+            for conn in connections:
+                conn.send(("solve", values))
+            solved = _receive(connections, "solved")
+            window_time = time.perf_counter() - start
+
+            upper = sum(weights[k] * s[0] for k, s in solved.items())
+            slack = sum(s[2] for s in solved.values())
+            if upper < best:
+                best, best_values, best_slack = upper, values, slack
+            for k, (objective, duals, _, _) in solved.items():
+                cuts.append((k, coupled[k][0], values, weights[k] * objective,
+                             [weights[k] * d for d in duals]))
+
+            start = time.perf_counter()
+            lower_bound, values = _solve_master(names, bounds, cuts,
+                                                sorted(solved))
+            master_time = time.perf_counter() - start
+
+            gap = (best - lower_bound) / max(abs(best), 1.)
+            rows.append({
+                "iteration": iteration, "lower_bound": lower_bound,
+                "upper_bound": best, "gap": gap,
+                "master_time": round(master_time, 4),
+                "window_time": round(window_time, 4),
+                "max_window_time": round(
+                    max(s[3] for s in solved.values()), 4),
+                "slack": slack})
+            logger.info(
+                f"Iteration {iteration}: bounds {lower_bound:.4f} to "
+                f"{best:.4f}, gap {gap:.2e}, windows {window_time:.2f} s, "
+                f"master {master_time:.2f} s")
+            if gap <= tolerance:
+                converged = True
+                break
+
+        if not converged:
+            logger.warning(
+                f"Decomposition stopped after {max_iterations} iterations")
+
+        for conn in connections:
+            conn.send(("results", best_values))
+        results = _receive(connections, "results")
+        for conn in connections:
+            conn.send(("stop", None))
+    finally:
+        for conn in connections:
+            conn.close()
+        for worker in workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+
+    if best_slack > 1e-6:
+        logger.warning(
+            f"Coupling constraints violated by {best_slack:.3g}. "
+            "Increase the penalty or the volume bound")
+
+    return {"objective": best, "lower_bound": lower_bound,
+            "gap": rows[-1]["gap"], "converged": converged,
+            "coupling": best_values, "iterations": pd.DataFrame(rows),
+            "results": [results[k] for k in range(count)]}
+
+
+if __name__ == '__main__':
+    pass
@@ -2,96 +2,181 @@
 Created on 23 Mar 2022
 
 @author: Fernando Penaherrera @UOL/OFFIS
+
+The market products are added to the model as constraints on the flows to
+the market sinks (see products.py):
+
+* day_ahead: The flow of each time step equals the flow of the first time
+  step of its hour
+* future_base: The flow of each time step equals the first flow
+* future_peak: The flow of each peak time step equals the first peak flow.
+  The flows outside the peak hours are fixed to zero, so they are not part
+  of the LP at all
+
+The peak time steps are the ones with a future peak price. The same rules
+are checked on a given dispatch by compliance.check_compliance. The flows of
+the blocks of a product are equal, so the income of a whole block is put on
+its first flow as a single coefficient. With compact_costs the objective
+has one term per hour of the day ahead, one for the future base and one for
+the future peak, and only the non-zero terms of the other markets.
 '''
 
+from collections import UserList
+import numpy as np
 import pyomo.environ as po
 from oemof.solph import Model
+from oemof.solph.plumbing import sequence
+from .compliance import block_starts, peak_steps
+from .products import MARKET_BUS, Products, SINK_LABELS
 
 
-def build_model_and_constraints(energy_system):
+def market_costs(prices, factor=1.):
     '''
-    Build a pyomo Model and add constraints for the proper sinks
+    Variable costs of the flow to a market sink from its prices. A constant
+    price series is returned as a scalar, otherwise as an array.
 
-    :param energy_system: Energy System with the appropiate markets.
+    :param prices: Series or array of prices
+    :param factor: Factor from the prices to the variable costs, e.g. -1/1000
+        for the income in EUR/kWh of prices in EUR/MWh
     '''
-    # Build model
-    model = Model(energy_system)
+    costs = np.asarray(prices, dtype=float) * factor
+    if len(costs) > 0 and np.all(costs == costs[0]):
+        return float(costs[0])
+    return costs
 
-    # Before anything I need the shape of the future_peak in the shape of 1
-    # and 0
 
-    # electric bus
-    bus_el_out = [n for n in energy_system.nodes if n.label == "b_el_out"][0]
-    # check output
-    key = [k for k in bus_el_out.outputs.keys() if "s_fp" in str(k)][0]
-    future_base_flow_price = bus_el_out.outputs[key].variable_costs
+def _cost_values(costs, steps):
+    '''
+    Variable costs of a flow as an array of the length of the horizon
+    '''
+    # Scalar costs are emulated sequences (UserList) in oemof
+    if isinstance(costs, UserList):
+        return np.full(steps, costs[0], dtype=float)
+    return np.asarray(costs, dtype=float)[:steps]
 
-    # Add Market Constraints
 
-    # Constraint for the Day Ahead Market
-    # i = inflow
-    # o = outflow
-    flows = {}
-    for (i, o) in model.flows:
-        if str(i) == "b_el_out" and str(o) == "s_da":
-            flows[(i, o)] = model.flows[i, o]
-
-    for (i, o) in flows:
-        for t in model.TIMESTEPS:
-            if t % 4 != 0:
-                # ToDo: Change name to day_ahead
-                limit_name = "day_ahead_{}={}".format(t, t - t % 4)
-                setattr(model, limit_name, po.Constraint(
-                    rule=(model.flow[i, o, t] - model.flow[i, o, t - t % 4] == 0)))
-
-    # Constraint for the Future Peak
+def _market_flows(energy_system):
+    '''
+    Flows from the market bus to the market sinks as a dictionary of
+    product: (bus, sink, flow)
+    '''
+    products = {label: p for p, label in SINK_LABELS.items()}
+    bus = [n for n in energy_system.nodes if n.label == MARKET_BUS][0]
     flows = {}
+    for sink, flow in bus.outputs.items():
+        if str(sink) in products:
+            flows[products[str(sink)]] = (bus, sink, flow)
+    return flows
 
-    for (i, o) in model.flows:
-        if str(i) == "b_el_out" and str(o) == "s_fb":
-            flows[(i, o)] = model.flows[i, o]
 
-    for (i, o) in flows:
-        for t in model.TIMESTEPS:
-            if t != 0:
-                limit_name = "future_base_{}={}".format(t, 0)
-                setattr(model, limit_name, po.Constraint(
-                    rule=(model.flow[i, o, t] - model.flow[i, o, 0] == 0)))
+def futures_variables(model):
+    '''
+    Variables of the futures volumes of a model built by
+    build_model_and_constraints, as a dictionary of product value:
+    variable. These are the first flow of the future base and the first
+    peak flow of the future peak, the other flows of their blocks are equal
+    to them. A horizon without peak time steps has no future peak volume.
 
-    # Constraint for the Future Base
-    # what are the time steps for decision making?
-    # I rather look at the shape of the cost of the flow to see
-    # if the price is 0, then constraint is 0
-    # if price is not 0, then the price is equal
+    :param model: Built oemof.solph model
+    '''
+    markets = _market_flows(model.es)
+    steps = len(model.es.timeindex)
+    volumes = {}
+    for product in [Products.FUTURE_BASE, Products.FUTURE_PEAK]:
+        if product not in markets:
+            continue
+        bus, sink, flow = markets[product]
+        starts = block_starts(product, peak_steps(
+            _cost_values(flow.variable_costs, steps)), steps)
+        if (starts >= 0).any():
+            volumes[product.value] = model.flow[
+                bus, sink, int(starts[starts >= 0][0])]
+    return volumes
+
+
+def build_model_and_constraints(energy_system, compact_costs=True,
+                                mutable_costs=()):
+    '''
+    Build a pyomo Model and add constraints for the proper sinks
 
-    flows = {}
-    for (i, o) in model.flows:
-        if str(i) == "b_el_out" and str(o) == "s_fp":
-            flows[(i, o)] = model.flows[i, o]
-
-    times_future_base_constraint = [t for t in model.TIMESTEPS if abs(
-        future_base_flow_price[t]) > 0.001]  # a small tolerance there
-
-    for time_step in times_future_base_constraint[1:]:  # for each day
-        # range = 12*4 #time steps for the constraint, 13 hrs after 8 am, until
-        # 20:45
-        # the last bit of the 13h is not included
-        t0 = times_future_base_constraint[0]
-        for (i, o) in flows:
-            limit_name = "future_peak_{}={}".format(time_step, t0)
-            setattr(model, limit_name, po.Constraint(
-                rule=(model.flow[i, o, t0] - model.flow[i, o, time_step] == 0)))
-
-    times_fb_null = [
-        t for t in model.TIMESTEPS if t not in times_future_base_constraint]
-    for t in times_fb_null:
-        limit_name = "future_peak_null_{}".format(t)
-        setattr(
-            model,
-            limit_name,
-            po.Constraint(
-                rule=(
-                    model.flow[i, o, t] == 0)))
+    :param energy_system: Energy System with the appropiate markets.
+    :param compact_costs: If True, the income of each block of equal flows
+        is a single term of the objective, and zero costs are left out. The
+        objective value and the optimal flows are the same as with the cost
+        of every time step. Use False to keep one cost per flow and time
+        step, e.g. for the cost ranging of sensitivity.py
+    :param mutable_costs: Products whose objective coefficients are mutable
+        Params named "<product>_costs" (e.g. model.intra_day_costs), indexed
+        by the time step of the first flow of each block. The coefficients
+        are the variable costs times the objective weighting. They can be
+        changed in place, e.g. for a persistent solver. Only with
+        compact_costs
+    '''
+    markets = _market_flows(energy_system)
+    steps = len(energy_system.timeindex)
+    costs = {p: _cost_values(f.variable_costs, steps)
+             for p, (_, _, f) in markets.items()}
+
+    # The costs of the market flows are added below, so the model is built
+    # without them. The energy system keeps its costs
+    hidden = {}
+    if compact_costs:
+        for product, (_, _, flow) in markets.items():
+            hidden[product] = flow.variable_costs
+            flow.variable_costs = sequence(None)
+    try:
+        model = Model(energy_system)
+    finally:
+        for product, variable_costs in hidden.items():
+            markets[product][2].variable_costs = variable_costs
+
+    weights = np.array([model.objective_weighting[t]
+                        for t in model.TIMESTEPS])
+    income = 0
+
+    for product, (bus, sink, _) in markets.items():
+        flow = model.flow
+        starts = block_starts(product, peak_steps(costs[product]), steps)
+
+        if starts is not None:
+            # Flows of each block equal the flow of its first time step
+            name = product.value
+            linked = [t for t in model.TIMESTEPS
+                      if starts[t] >= 0 and starts[t] != t]
+            setattr(model, name, po.Constraint(
+                linked, rule=lambda m, t, b=bus, s=sink, t0=starts:
+                    m.flow[b, s, t] - m.flow[b, s, int(t0[t])] == 0))
+
+            # Flows outside the blocks can only be zero
+            for t in np.flatnonzero(starts < 0):
+                flow[bus, sink, int(t)].fix(0)
+
+        if not compact_costs:
+            continue
+
+        weighted = weights * costs[product]
+        if starts is not None:
+            # Income of each block on its first flow
+            inside = starts >= 0
+            block_costs = np.bincount(starts[inside], weights=weighted[inside],
+                                      minlength=steps)
+        else:
+            block_costs = weighted
+        if product in mutable_costs:
+            # Every block keeps its term, its costs may change later
+            firsts = np.unique(starts[starts >= 0]) if starts is not None \
+                else np.arange(steps)
+            param = po.Param(firsts.tolist(), mutable=True, initialize={
+                int(t): float(block_costs[t]) for t in firsts})
+            setattr(model, f"{product.value}_costs", param)
+            for t in firsts:
+                income += flow[bus, sink, int(t)] * param[int(t)]
+            continue
+        for t in np.flatnonzero(block_costs):
+            income += flow[bus, sink, int(t)] * float(block_costs[t])
+
+    if compact_costs:
+        model.objective.expr = model.objective.expr + income
 
     return model
 
@@ -0,0 +1,260 @@
+'''
+Created on 19.10.2026
+
+Dry run estimate of the size and the resources of a model before it is
+built.
+
+The number of columns, rows and non-zeros of the LP that the solver gets
+is counted from the energy system (nodes, flows and their fixed values),
+the horizon and the market products, without building the Pyomo model:
+
+* Columns: Flows that are not fixed, storage contents and free initial
+  storage contents, for every time step
+* Rows: Bus balances, transformer relations, storage balances and the
+  product constraints of build_model_and_constraints
+* Non-zeros: The free variables of each row, fixed ones are constants
+
+The counts are the ones of the LP file written by Pyomo, as read by the
+solver.
+
+Only the components used by the market models are counted (Bus, Source,
+Sink, Transformer and GenericStorage without investments or non-convex
+flows). Other components raise a ValueError.
+
+The memory of the build, the size of the LP file and the solve time are
+estimated from the counts with power laws (value = factor * non-zeros **
+exponent) fitted on calibration runs. calibrate fits them on the models of
+the current machine and stores them in a JSON file.
+'''
+
+import json
+import logging
+import os
+import time
+from .common import DATA_DIR
+from .fileio import atomic_write, file_lock
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_FILE = os.path.join(DATA_DIR, "estimator_calibration.json")
+
+# Power laws fitted on district models of 1 to 56 days solved with cbc.
+# The build memory is the peak of the Python allocations (tracemalloc)
+DEFAULT_CALIBRATION = {
+    "build_memory": {"factor": 699., "exponent": 0.948},
+    "build_time": {"factor": 1.48e-4, "exponent": 0.963},
+    "lp_bytes": {"factor": 26.1, "exponent": 1.025},
+    "solve_time": {"factor": 1.40e-4, "exponent": 0.858},
+}
+
+# Keys of the estimates, see DEFAULT_CALIBRATION
+ESTIMATES = list(DEFAULT_CALIBRATION)
+
+
+def _check_supported(node, flows):
+    from oemof.solph import Bus, Sink, Source, Transformer
+    from oemof.solph.components import GenericStorage
+
+    if not isinstance(node, (Bus, Sink, Source, Transformer,
+                             GenericStorage)):
+        raise ValueError(
+            f"Node {node.label} of type {type(node).__name__} is not "
+            "supported by the estimator")
+    if isinstance(node, GenericStorage) and (
+            node.investment is not None
+            or node.invest_relation_input_output is not None):
+        raise ValueError(
+            f"Storage {node.label} with investments is not supported by the "
+            "estimator")
+    for flow in flows:
+        if flow.investment is not None or flow.nonconvex is not None \
+                or flow.summed_max is not None or flow.summed_min is not None \
+                or flow.integer or flow.positive_gradient["ub"][0] is not None \
+                or flow.negative_gradient["ub"][0] is not None:
+            raise ValueError(
+                f"Flow of {node.label} has options that are not supported "
+                "by the estimator")
+
+
+def model_size(energy_system, market_products=True):
+    '''
+    Number of columns, rows and non-zeros of the LP of an energy system, as
+    built by build_model_and_constraints and written for the solver.
+    Returns a dictionary with the counts and the number of time steps.
+
+    :param energy_system: Energy system, not built into a model
+    :param market_products: If True, the product constraints of
+        build_model_and_constraints are counted
+    '''
+    import numpy as np
+    from oemof.solph import Bus, Transformer
+    from oemof.solph.components import GenericStorage
+    from .compliance import block_starts, peak_steps
+    from .electricity_market_constraints import _cost_values, _market_flows
+
+    steps = len(energy_system.timeindex)
+    flows = {}
+    for node in energy_system.nodes:
+        for target, flow in node.outputs.items():
+            flows[node, target] = flow
+    for node in energy_system.nodes:
+        _check_supported(node, [f for (i, o), f in flows.items()
+                                if node in (i, o)])
+
+    # Free time steps of each flow
+    free = {}
+    for key, flow in flows.items():
+        fixed = flow.nominal_value is not None and flow.fix[0] is not None
+        free[key] = np.zeros(steps, dtype=bool) if fixed \
+            else np.ones(steps, dtype=bool)
+
+    rows, nonzeros, columns = 0, 0, 0
+    markets = _market_flows(energy_system) if market_products else {}
+    for product, (bus, sink, flow) in markets.items():
+        starts = block_starts(product, peak_steps(
+            _cost_values(flow.variable_costs, steps)), steps)
+        if starts is None:
+            continue
+        # Flows outside the blocks are fixed to zero
+        free[bus, sink] = free[bus, sink] & (starts >= 0)
+        linked = (starts >= 0) & (starts != np.arange(steps))
+        rows += int(linked.sum())
+        nonzeros += int((free[bus, sink][linked].astype(int) +
+                         free[bus, sink][starts[linked]]).sum())
+
+    for node in energy_system.nodes:
+        if isinstance(node, Bus):
+            count = sum(free[i, node] for i in node.inputs) + \
+                sum(free[node, o] for o in node.outputs)
+            count = np.broadcast_to(count, steps)
+            rows += int((count > 0).sum())
+            nonzeros += int(count.sum())
+        elif isinstance(node, Transformer):
+            for i in node.inputs:
+                for o in node.outputs:
+                    count = free[i, node].astype(int) + free[node, o]
+                    rows += int((count > 0).sum())
+                    nonzeros += int(count.sum())
+        elif isinstance(node, GenericStorage):
+            i, o = list(node.inputs)[0], list(node.outputs)[0]
+            init_free = node.initial_storage_level is None
+            # Content of each time step, the one before and both flows
+            count = 1 + np.ones(steps, dtype=int) + free[i, node] + \
+                free[node, o]
+            count[0] -= 0 if init_free else 1
+            rows += steps + int(node.balanced)
+            nonzeros += int(count.sum()) + (1 + int(init_free)) * \
+                int(node.balanced)
+            columns += steps + int(init_free)
+
+    columns += int(sum(f.sum() for f in free.values()))
+    # The LP writer of Pyomo adds the column ONE_VAR_CONSTANT fixed to one
+    # by its own row
+    columns, rows, nonzeros = columns + 1, rows + 1, nonzeros + 1
+    return {"steps": steps, "columns": columns, "rows": rows,
+            "nonzeros": nonzeros}
+
+
+def _read_calibration(path):
+    if path is None or not os.path.exists(path):
+        return DEFAULT_CALIBRATION
+    with open(path, encoding="utf-8") as f:
+        return dict(DEFAULT_CALIBRATION, **json.load(f))
+
+
+def estimate_resources(energy_system, processes=1,
+                       calibration=CALIBRATION_FILE):
+    '''
+    Dry run estimate of a model: the exact size of its LP (see model_size)
+    and the estimated build memory in bytes, build time in seconds, LP file
+    size in bytes and solve time in seconds. With several processes the
+    memory is the one of all the processes building a model at once.
+
+    :param energy_system: Energy system, not built into a model
+    :param processes: Number of models built and solved at once
+    :param calibration: JSON file of calibrate. The defaults are used if
+        it does not exist
+    '''
+    size = model_size(energy_system)
+    laws = _read_calibration(calibration)
+    estimate = dict(size)
+    for key in ESTIMATES:
+        law = laws[key]
+        estimate[key] = law["factor"] * size["nonzeros"] ** law["exponent"]
+    estimate["build_memory"] *= processes
+    return estimate
+
+
+def measure_model(energy_system, solver="cbc", cmdline_options=None):
+    '''
+    Builds, writes and solves a model and measures the resources of
+    estimate_resources, for the calibration
+
+    :param energy_system: Energy system, not built into a model
+    :param solver: Name of the solver
+    :param cmdline_options: Options passed to the solver
+    '''
+    import tempfile
+    import tracemalloc
+    from .electricity_market_constraints import build_model_and_constraints
+
+    measured = model_size(energy_system)
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = build_model_and_constraints(energy_system)
+    measured["build_time"] = time.perf_counter() - start
+    measured["build_memory"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lp_file = os.path.join(tmp_dir, "model.lp")
+        model.write(lp_file, io_options={"symbolic_solver_labels": False})
+        measured["lp_bytes"] = os.path.getsize(lp_file)
+
+    start = time.perf_counter()
+    model.solve(solver=solver, solve_kwargs={'tee': False}, solver_io='lp',
+                cmdline_options=cmdline_options or {})
+    measured["solve_time"] = time.perf_counter() - start
+    return measured
+
+
+def calibrate(energy_systems, solver="cbc", cmdline_options=None,
+              path=CALIBRATION_FILE):
+    '''
+    Measures the models of a few energy systems of different sizes and fits
+    the power laws of estimate_resources. Returns the calibration and a
+    dataframe of the measurements. The calibration is stored in path.
+
+    :param energy_systems: Energy systems of at least two sizes, e.g. of
+        horizons of 1 to 28 days
+    :param solver: Name of the solver
+    :param cmdline_options: Options passed to the solver
+    :param path: JSON file of the calibration. None to not store it
+    '''
+    import numpy as np
+    import pandas as pd
+
+    table = pd.DataFrame([measure_model(es, solver, cmdline_options)
+                          for es in energy_systems])
+    if table["nonzeros"].nunique() < 2:
+        raise ValueError(
+            'Parameter "energy_systems" must have models of two sizes.')
+
+    calibration = {}
+    x = np.log(table["nonzeros"].values)
+    for key in ESTIMATES:
+        y = np.log(np.maximum(table[key].values, 1e-6))
+        exponent, intercept = np.polyfit(x, y, 1)
+        calibration[key] = {"factor": float(np.exp(intercept)),
+                            "exponent": float(exponent)}
+        logger.info(f"Calibration of {key}: {calibration[key]}")
+
+    if path is not None:
+        with file_lock(path):
+            with atomic_write(path, "w", encoding="utf-8") as f:
+                json.dump(calibration, f, indent=2)
+    return calibration, table
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,144 @@
+'''
+Created on 19.10.2026
+
+Helpers to write files safely when several processes share a directory.
+
+Files are first written to a temporary file in the target directory and then
+renamed to their final name. The rename is atomic, so readers see either the
+old or the new file but never a partially written one.
+
+Writers of the same file can additionally hold a lock on a companion
+".lock" file, so that a file written by several processes (e.g. the price
+csv of a year) is generated only once at a time.
+'''
+
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def _try_lock(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, timeout=None, poll=0.05):
+    '''
+    Context manager holding an exclusive lock on path + ".lock" between
+    processes. The lock file is left in place, removing it could let two
+    processes lock different files.
+
+    :param path: Path of the locked file
+    :param timeout: Seconds to wait for the lock. None waits forever
+    :param poll: Seconds between the attempts to get the lock
+    '''
+    lock_path = path + ".lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    with open(lock_path, "a+b") as f:
+        while not _try_lock(f):
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Lock on {path} not acquired")
+            time.sleep(poll)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def _create_temporary(path):
+    '''
+    Creates a new temporary file next to path and returns its descriptor and
+    path. The kernel applies the umask of the process to its mode, like for
+    a file opened with open().
+    '''
+    directory, name = os.path.split(os.path.abspath(path))
+    while True:
+        tmp_path = os.path.join(
+            directory, ".{}.{}.tmp".format(name, uuid.uuid4().hex[:8]))
+        try:
+            return os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY |
+                           getattr(os, "O_BINARY", 0), 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+@contextmanager
+def atomic_write(path, mode="wb", encoding=None, newline=None, lock=False,
+                 timeout=None):
+    '''
+    Context manager returning a file object whose content replaces the file
+    in path only if the block finishes without errors.
+
+    :param path: Path of the file to write
+    :param mode: Write mode. One of "wb" or "w"
+    :param encoding: Encoding for text mode
+    :param newline: Newline translation for text mode, "" for csv files
+    :param lock: If True, holds file_lock on path while writing
+    :param timeout: Seconds to wait for the lock. None waits forever
+    '''
+    if mode not in ["wb", "w"]:
+        raise ValueError('Parameter "mode" must be one "wb" or "w".')
+
+    if lock:
+        with file_lock(path, timeout=timeout):
+            with atomic_write(path, mode, encoding, newline) as f:
+                yield f
+        return
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = _create_temporary(path)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, newline=newline) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_csv(df, path, lock=False, timeout=None, **kwargs):
+    '''
+    Writes a dataframe to a csv file atomically
+
+    :param df: Dataframe to write
+    :param path: Path of the csv file
+    :param lock: If True, holds file_lock on path while writing
+    :param timeout: Seconds to wait for the lock. None waits forever
+    :param kwargs: Arguments of DataFrame.to_csv
+    '''
+    with atomic_write(path, "w", encoding="utf-8", newline="", lock=lock,
+                      timeout=timeout) as f:
+        df.to_csv(f, **kwargs)
+    return path
+
+
+if __name__ == '__main__':
+    pass
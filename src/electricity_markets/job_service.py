@@ -0,0 +1,407 @@
+'''
+Created on 19.10.2026
+
+Local service for optimization jobs.
+
+Several users can submit scenario specifications to one machine instead of
+running the scripts by hand. The service listens on a Unix socket (or a TCP
+port on localhost) and speaks newline delimited JSON. Each request is one
+JSON line, the service answers with one or more JSON event lines:
+
+* {"op": "submit", "spec": {...}, "wait": true}: Queues a scenario. The
+  answer is a "queued" event with the job id, or a "rejected" event if the
+  queue is full. With "wait" the progress of the job is streamed on the same
+  connection until it finishes.
+* {"op": "watch", "job": "..."}: Streams the events of a job
+* {"op": "status", "job": "..."}: State of a job, or of all the jobs
+* {"op": "cancel", "job": "..."}: Cancels a queued or running job
+
+Jobs run in their own worker process, at most "workers" at the same time.
+A running job is cancelled by terminating its process. The queue of waiting
+jobs is bounded, so that a burst of submissions is rejected instead of
+piling up in memory.
+
+The jobs are run by a target function, called as
+target(spec, cache=cache_dir, progress=progress). The default target
+snapshot.run_snapshot solves model snapshots, e.g. {"snapshot":
+"models/wind_2019", "solver": "highs"}. The scenarios of the examples are
+run with the target "examples.scenario_runner:run_scenario", from the
+repository root. The service needs no
+network access besides the local socket, the models are solved with the
+local solvers named in the specification.
+'''
+
+import asyncio
+import importlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Resolves to the package as it was imported, e.g. from an installation
+DEFAULT_TARGET = f"{__package__}.snapshot:run_snapshot"
+
+# Maximum number of jobs waiting for a worker
+MAX_QUEUED_JOBS = 32
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = (
+    "queued", "running", "done", "failed", "cancelled")
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+def _to_json(obj):
+    '''
+    Converts numpy and pandas values for json.dumps
+    '''
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def _encode(message):
+    return (json.dumps(message, default=_to_json) + "\n").encode()
+
+
+def _load_target(target):
+    '''
+    Imports a function given as "module:function"
+    '''
+    module, name = target.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _run_job(target, spec, cache_dir, conn):
+    '''
+    Entry point of the worker processes. Runs a job and sends the progress
+    and the result through the pipe.
+    '''
+    def progress(stage, seconds):
+        conn.send({"event": "progress", "stage": stage, "seconds": seconds})
+
+    try:
+        output = _load_target(target)(spec, cache=cache_dir, progress=progress)
+        conn.send({"event": "result",
+                   "kpis": output.get("kpis"),
+                   "timings": output.get("timings"),
+                   "key": output.get("key"),
+                   "cached": output.get("cached")})
+    except BaseException as e:
+        conn.send({"event": "error", "error": repr(e),
+                   "traceback": traceback.format_exc()})
+    finally:
+        conn.close()
+
+
+class Job(object):
+    '''
+    State and events of a submitted job
+    '''
+
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = spec
+        self.state = QUEUED
+        self.events = []
+        self.watchers = set()
+        self.process = None
+        self.submitted = time.time()
+
+    def publish(self, event):
+        event = dict(event, job=self.id, time=round(time.time(), 3))
+        self.events.append(event)
+        for queue in self.watchers:
+            queue.put_nowait(event)
+
+    def status(self):
+        return {"job": self.id, "state": self.state, "spec": self.spec,
+                "submitted": self.submitted, "events": len(self.events)}
+
+
+class JobService(object):
+    '''
+    Asynchronous job service with a bounded queue and worker processes.
+
+    :param workers: Maximum number of jobs running at the same time
+    :param max_queued: Maximum number of jobs waiting for a worker
+    :param target: Function running a job, given as "module:function"
+    :param cache_dir: Result cache directory passed to the target
+    '''
+
+    def __init__(self, workers=None, max_queued=MAX_QUEUED_JOBS,
+                 target=DEFAULT_TARGET, cache_dir=None):
+        self.workers = workers or max(os.cpu_count() // 2, 1)
+        self.target = target
+        self.cache_dir = cache_dir
+        self.jobs = {}
+        self.queue = asyncio.Queue(maxsize=max_queued)
+        self._ids = itertools.count(1)
+        # Fresh interpreters, so that no solver state is shared with the
+        # service and a cancelled job cannot leave a broken pool behind
+        self._context = multiprocessing.get_context("spawn")
+        self._dispatchers = []
+
+    # Jobs
+
+    def submit(self, spec):
+        '''
+        Queues a scenario specification. Raises asyncio.QueueFull if the
+        queue is full.
+
+        :param spec: Scenario specification dictionary
+        '''
+        job = Job(f"{next(self._ids):06d}", spec)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        job.publish({"event": QUEUED, "position": self.queue.qsize()})
+        logger.info(f"Job {job.id} queued")
+        return job
+
+    def cancel(self, job_id):
+        '''
+        Cancels a queued or running job. Returns False if the job was
+        already finished.
+
+        :param job_id: Id of the job
+        '''
+        job = self.jobs[job_id]
+        if job.state in FINAL_STATES:
+            return False
+        if job.state == RUNNING and job.process is not None:
+            job.process.terminate()
+        job.state = CANCELLED
+        job.publish({"event": CANCELLED})
+        logger.info(f"Job {job.id} cancelled")
+        return True
+
+    async def _execute(self, job):
+        '''
+        Runs a job in a worker process and publishes its events
+        '''
+        loop = asyncio.get_running_loop()
+        parent_conn, child_conn = self._context.Pipe(duplex=False)
+        job.process = self._context.Process(
+            target=_run_job,
+            args=(self.target, job.spec, self.cache_dir, child_conn),
+            daemon=True)
+        job.state = RUNNING
+        job.publish({"event": "started"})
+        job.process.start()
+        # Only the worker keeps the sending end, so that recv fails once
+        # the worker is gone
+        child_conn.close()
+
+        final = None
+        try:
+            while True:
+                try:
+                    message = await loop.run_in_executor(
+                        None, parent_conn.recv)
+                except (EOFError, OSError):
+                    break
+                if message["event"] in ("result", "error"):
+                    final = message
+                    break
+                job.publish(message)
+        finally:
+            parent_conn.close()
+            await loop.run_in_executor(None, job.process.join)
+
+        if job.state == CANCELLED:
+            return
+        if final is None:
+            final = {"event": "error",
+                     "error": f"Worker exited with code {job.process.exitcode}"}
+        job.state = DONE if final["event"] == "result" else FAILED
+        job.publish(final)
+        logger.info(f"Job {job.id} {job.state}")
+
+    async def _dispatch(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.state == QUEUED:
+                    await self._execute(job)
+            except Exception as e:
+                job.state = FAILED
+                job.publish({"event": "error", "error": repr(e)})
+            finally:
+                self.queue.task_done()
+
+    async def watch(self, job):
+        '''
+        Yields the past and new events of a job until it is finished
+
+        :param job: Job
+        '''
+        queue = asyncio.Queue()
+        job.watchers.add(queue)
+        try:
+            for event in list(job.events):
+                yield event
+            if job.state in FINAL_STATES:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("result", "error", CANCELLED):
+                    return
+        finally:
+            job.watchers.discard(queue)
+
+    # Connections
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    async for message in self._respond(request):
+                        writer.write(_encode(message))
+                        await writer.drain()
+                except (ValueError, KeyError, TypeError) as e:
+                    writer.write(_encode({"event": "invalid",
+                                          "error": repr(e)}))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request):
+        op = request["op"]
+        if op == "submit":
+            try:
+                job = self.submit(request["spec"])
+            except asyncio.QueueFull:
+                yield {"event": "rejected", "reason": "queue full",
+                       "queued": self.queue.qsize()}
+                return
+            if request.get("wait", False):
+                async for event in self.watch(job):
+                    yield event
+            else:
+                yield job.events[0]
+        elif op == "watch":
+            async for event in self.watch(self.jobs[request["job"]]):
+                yield event
+        elif op == "status":
+            if request.get("job") is None:
+                yield {"event": "status",
+                       "jobs": [j.status() for j in self.jobs.values()]}
+            else:
+                yield dict(self.jobs[request["job"]].status(),
+                           event="status")
+        elif op == "cancel":
+            yield {"event": "cancel", "job": request["job"],
+                   "cancelled": self.cancel(request["job"])}
+        else:
+            raise ValueError(
+                'Parameter "op" must be one "submit", "watch", "status" '
+                'or "cancel".')
+
+    async def serve(self, address):
+        '''
+        Serves requests on a Unix socket path or a (host, port) tuple until
+        cancelled
+
+        :param address: Path of a Unix socket or (host, port) tuple
+        '''
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+            server = await asyncio.start_unix_server(self._handle, address)
+        else:
+            server = await asyncio.start_server(self._handle, *address)
+
+        self._dispatchers = [asyncio.create_task(self._dispatch())
+                             for _ in range(self.workers)]
+        logger.info(f"Job service listening on {address} "
+                    f"with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for job in list(self.jobs.values()):
+                if job.state in (QUEUED, RUNNING):
+                    self.cancel(job.id)
+            for task in self._dispatchers:
+                task.cancel()
+
+
+def serve(address, workers=None, max_queued=MAX_QUEUED_JOBS,
+          target=DEFAULT_TARGET, cache_dir=None):
+    '''
+    Runs the job service until interrupted
+
+    :param address: Path of a Unix socket or (host, port) tuple
+    :param workers: Maximum number of jobs running at the same time
+    :param max_queued: Maximum number of jobs waiting for a worker
+    :param target: Function running a job, given as "module:function"
+    :param cache_dir: Result cache directory passed to the target
+    '''
+    async def run():
+        service = JobService(workers=workers, max_queued=max_queued,
+                             target=target, cache_dir=cache_dir)
+        await service.serve(address)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        logger.info("Job service stopped")
+
+
+def request(address, message):
+    '''
+    Sends a request to a running service and yields the answered events.
+    A blocking client without asyncio, e.g. for scripts and notebooks.
+
+    :param address: Path of a Unix socket or (host, port) tuple
+    :param message: Request dictionary, e.g. {"op": "status"}
+    '''
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    with sock:
+        sock.connect(address)
+        sock.sendall(_encode(message))
+        with sock.makefile("r", encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                yield event
+                if event["event"] in ("result", "error", CANCELLED,
+                                      "rejected", "invalid", "status",
+                                      "cancel"):
+                    return
+                if message["op"] == "submit" and \
+                        not message.get("wait", False):
+                    return
+
+
+def submit_job(address, spec, wait=True):
+    '''
+    Submits a scenario to a running service. Yields the events of the job,
+    up to its result if wait is True.
+
+    :param address: Path of a Unix socket or (host, port) tuple
+    :param spec: Scenario specification dictionary
+    :param wait: Stream the progress until the job is finished
+    '''
+    return request(address, {"op": "submit", "spec": spec, "wait": wait})
+
+
+if __name__ == '__main__':
+    pass
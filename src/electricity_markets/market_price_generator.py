@@ -8,16 +8,17 @@ Create market price time series from historical data
 Using price pattern generated from historical data from 2015-2019
 
 '''
-import pandas as pd
 from os.path import join
+from collections import namedtuple
+from functools import lru_cache
 import logging
 import os
 from .common import PROC_DATA_DIR, RAW_DATA_DIR
-from pandas.core.common import SettingWithCopyWarning
-import warnings
+from .fileio import write_csv
+from .products import is_future_peak
 
-warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
-logging.basicConfig(level=logging.INFO)
+# pandas is imported on first use, so that importing the generator stays cheap
+logger = logging.getLogger(__name__)
 
 
 def read_text_ranges(s):
@@ -36,129 +37,203 @@ def read_text_ranges(s):
     return s_l
 
 
-def create_price_pattern(year, market, mean_val=None):
-    '''
-    Creates a Price Pattern for the Day Ahead Price.
-    Uses existing profiles to compose a pattern for a whole year
+# Names of the markets, in the order of the columns of the market data
+MARKETS = ["day_ahead", "intra_day", "future_base", "future_peak"]
 
-    :param year: Desired year
-    :param market: Day Ahead or Intra Day. One of ["da", "id"]
-    :param mean_val: Mean value. Optional for the years 2015-2020, since data exists.
-    '''
+# Time steps of the daily profiles of each market
+STEPS_PER_DAY = {"da": 24, "id": 24 * 4}
 
-    if market not in ["da", "id"]:
-        raise ValueError('Parameter "market" must be one "da" or "id".')
+PROFILE_FILES = {"da": "day_ahead_price_profile.xlsx",
+                 "id": "intraday_price_profile.xlsx"}
 
-    START = f"{year}-01-01 00:00:00"
+TIME_ZONE = "Europe/Berlin"
 
-    if market == "da":
-        END = f"{year}-12-31 23:00:00"
-        dti = pd.date_range(start=START, end=END, freq="H", tz='Europe/Berlin')
 
-    if market == "id":
-        END = f"{year}-12-31 23:45:00"
-        dti = pd.date_range(
-            start=START,
-            end=END,
-            freq="15T",
-            tz='Europe/Berlin')
+@lru_cache(maxsize=None)
+def read_profile_table(path):
+    '''
+    Reads a table of daily price profiles as written in the raw data.
+    Returns a lookup of the profile row for each (month, day of the week)
+    and the profile values as an array with one row per profile.
 
-    periods = len(dti)
+    The table has the columns "month", "day" (a day of the week or a range
+    like "2-4", monday is 1) and one column per time step of the day.
+    Tables are cached, so each file is only read once per process.
 
-    df = pd.DataFrame()
+    :param path: Path of the excel file with the "Price" sheet
+    '''
+    import numpy as np
+    import pandas as pd
 
-    # Need some parameters of the Datetime object to search patterns
-    df["Date"] = dti
-    df["Month"] = dti.month
-    df["DayOfWeek"] = dti.dayofweek
+    table = pd.read_excel(path, "Price", engine='openpyxl', parse_dates=False)
+    values = table.drop(columns=["month", "day"]).to_numpy(dtype=float)
 
-    # Excel reader
-    if market == "da":
-        EXCEL_DATA = join(RAW_DATA_DIR, "day_ahead_price_profile.xlsx")
-    elif market == "id":
-        EXCEL_DATA = join(RAW_DATA_DIR, "intraday_price_profile.xlsx")
+    # lookup[month, day of week] = row. The first matching row is used
+    lookup = np.full((13, 8), -1, dtype=int)
+    for row in reversed(range(len(table))):
+        days = read_text_ranges(table.at[row, "day"])
+        lookup[int(table.at[row, "month"]), min(days):max(days) + 1] = row
 
-    da_data = pd.read_excel(
-        EXCEL_DATA,
-        "Price",
-        engine='openpyxl',
-        parse_dates=False)
+    lookup.setflags(write=False)
+    values.setflags(write=False)
+    return lookup, values
 
-    # Pass the text ranges as intervals
-    da_data["Day_Range_Min"] = [min(read_text_ranges(s))
-                                for s in da_data["day"]]
-    da_data["Day_Range_Max"] = [max(read_text_ranges(s))
-                                for s in da_data["day"]]
 
-    price = []
-    i = 0
+def default_profiles():
+    '''
+    Paths of the raw profile tables of the Day Ahead and Intra Day markets
+    '''
+    return {m: join(RAW_DATA_DIR, f) for m, f in PROFILE_FILES.items()}
 
-    # Loop for the different time stamps
-    while i < periods:
-        month = df.at[i, "Month"]
 
-        day_of_week = df.at[i, "DayOfWeek"] + 1  # Python puts monday at 0
+@lru_cache(maxsize=None)
+def year_calendar(year):
+    '''
+    Calendar information of a year shared by all the markets and zones
+
+    * index: Quarter hourly time stamps in local time
+    * day_months, day_weekdays: Month and day of the week (monday is 1) of
+      each daily block of the profiles. The profiles are laid out in blocks
+      of 24 hours starting on 01/01 00:00, as the price pattern always was.
+    * future_peak: Mask of the peak time steps of the future peak product
+    * utc_shift: Position of the price used for each time step. Time steps
+      with a utc offset different from 01/01 (summer time) take the
+      price of one hour later.
+
+    :param year: Year
+    '''
+    import numpy as np
+    import pandas as pd
+
+    index = pd.date_range(start=f"{year}-01-01 00:00:00",
+                          end=f"{year}-12-31 23:45:00",
+                          freq="15T", tz=TIME_ZONE, name="Date")
+    steps = STEPS_PER_DAY["id"]
+
+    # Daily blocks of the profiles
+    blocks = index[::steps]
+    day_months = blocks.month.values
+    day_weekdays = blocks.dayofweek.values + 1  # Python puts monday at 0
+
+    future_peak = is_future_peak(index.hour.values, index.dayofweek.values)
+
+    # utc offset of each time step
+    offset = index.tz_localize(None) - index.tz_convert(None)
+    positions = np.arange(len(index))
+    utc_shift = np.where(offset != offset[0], positions + 4, positions)
+    utc_shift = np.minimum(utc_shift, len(index) - 1)
+
+    calendar = {"index": index,
+                "day_months": day_months,
+                "day_weekdays": day_weekdays,
+                "future_peak": future_peak,
+                "utc_shift": utc_shift}
+    for v in calendar.values():
+        if isinstance(v, np.ndarray):
+            v.setflags(write=False)
+    return calendar
+
+
+def _normalized_pattern(calendar, market, profile_path):
+    '''
+    Price pattern of a whole year normalized to 100, in the resolution of
+    the market (hourly for "da", quarter hourly for "id").
+    '''
+    lookup, values = read_profile_table(profile_path)
+    rows = lookup[calendar["day_months"], calendar["day_weekdays"]]
+    if (rows < 0).any():
+        raise ValueError(f"Profile missing in {profile_path}")
+    return values[rows].ravel()
 
-        # Filter data to search the corresponding values
-        da_data_month = da_data[da_data["month"] == month]
-        da_data_day = da_data_month[da_data_month["Day_Range_Min"]
-                                    <= day_of_week]
-        da_data_day = da_data_day[da_data_day["Day_Range_Max"] >= day_of_week]
 
-        # Easier to transpose the table
-        partial_data = da_data_day.T
-        cols = partial_data.columns
-        partial_data = partial_data.drop(
-            ["month", "day", "Day_Range_Min", "Day_Range_Max"])
-        for v in partial_data[cols[0]]:
-            price.append(v)
+def create_price_pattern(year, market, mean_val=None, profile_path=None):
+    '''
+    Creates a Price Pattern for the Day Ahead Price.
+    Uses existing profiles to compose a pattern for a whole year
+
+    :param year: Desired year
+    :param market: Day Ahead or Intra Day. One of ["da", "id"]
+    :param mean_val: Mean value. Optional for the years 2015-2020, since data exists.
+    :param profile_path: Excel file with the profiles. The raw profiles
+        of the market are used if not given.
+    '''
+    import pandas as pd
 
-        # Since daily profiles are already in order just go to next day
+    if market not in ["da", "id"]:
+        raise ValueError('Parameter "market" must be one "da" or "id".')
 
-        if market == "da":
-            i += 24
-        elif market == "id":
-            i += 24 * 4
+    if profile_path is None:
+        profile_path = default_profiles()[market]
 
-    # Copy the price info to the dataframe
-    df["price"] = price
+    calendar = year_calendar(year)
+    price = _normalized_pattern(calendar, market, profile_path)
 
     if mean_val:
         # Override the previous one if mean value is given
         # The values of the profiles in the excel data are normalized to 100
-        df["price"] = df["price"] * mean_val / 100
+        price = price * mean_val / 100
 
     if year not in range(2015, 2021) and mean_val is None:
         raise ValueError(
             "For years outside of 2015-2020 a mean value is required. I.e.: 'mean_val=40'")
 
-    # Take only the necessary columns
-    res = df[["Date", "price"]]
+    index = calendar["index"]
+    if market == "da":
+        index = index[::4]
 
     # Reformat Dataframe to avoid conflicts with other markets
     if market == "da":
-        new_column_name = f"day_ahead"
+        new_column_name = "day_ahead"
     elif market == "id":
-        new_column_name = f"intra_day"
-    res.rename(columns={"price": new_column_name}, inplace=True)
-    res.set_index("Date", inplace=True)
+        new_column_name = "intra_day"
+
+    res = pd.DataFrame({new_column_name: price}, index=index)
 
-    logging.info(
+    logger.info(
         "{} Price pattern for the year {} created".format(
             market.upper(), year))
     return res
 
 
-def create_markets_info(
-        year,
-        mean_da=None,
-        mean_id=None,
-        fb=None,
-        fp=None,
-        save_csv=True):
+@lru_cache(maxsize=None)
+def historical_means():
     '''
-    Creates a dataframe with information on the IntraDay, Day Ahead, Future Base, and Future Peak
-    markets
+    Mean Day Ahead and Intra Day prices of the years in the raw data, as two
+    dictionaries of year: price. Read once per process, see clear_caches
+    '''
+    import pandas as pd
+
+    da_id_data = pd.read_excel(join(RAW_DATA_DIR, "market_parameter.xlsx"),
+                               "MarketParams",
+                               index_col="year",
+                               engine='openpyxl')
+    return da_id_data["dayahead"].to_dict(), da_id_data["intraday"].to_dict()
+
+
+@lru_cache(maxsize=None)
+def _future_prices(product):
+    import pandas as pd
+
+    prices = pd.read_csv(join(RAW_DATA_DIR, f"future_{product}_prices.csv"),
+                         encoding="utf-8-sig")
+    return prices.set_index("year")["price"].to_dict()
+
+
+def clear_caches():
+    '''
+    Forgets the profile tables, yearly means and future prices read from the
+    raw data, e.g. after profile_fitting wrote new files
+    '''
+    read_profile_table.cache_clear()
+    historical_means.cache_clear()
+    _future_prices.cache_clear()
+
+
+def market_parameters(year, mean_da=None, mean_id=None, fb=None, fp=None):
+    '''
+    Checks the parameters of the markets for a year and completes them with
+    the historical data.
+    Returns the mean Day Ahead and Intra Day prices and the future prices.
 
     For years 2015-2017: Uses DA and ID market data, FP and FB must be given
     For years 2018-2020: Uses DA, ID, FP, and FB market data. None must be given
@@ -193,95 +268,232 @@ def create_markets_info(
 
     # Get DA and ID info
     if year in range(2015, 2021):
-        DA_ID_MARKET_PARAMETER = join(RAW_DATA_DIR, "market_parameter.xlsx")
-        da_id_data = pd.read_excel(DA_ID_MARKET_PARAMETER, "MarketParams",
-                                   index_col="year",
-                                   engine='openpyxl'
-                                   )
-
-        mean_da = da_id_data.at[year, "dayahead"]
-        mean_id = da_id_data.at[year, "intraday"]
-
-    day_ahead = create_price_pattern(
-        year=year, market="da", mean_val=mean_da)
-    day_ahead = day_ahead.resample("15min").pad()
-    intra_day = create_price_pattern(
-        year=year, market="id", mean_val=mean_id)
-    markets_data = pd.concat([day_ahead, intra_day], axis=1)
-
-    # Need to copy the last 3 values to fill the table for Day Ahead
-    for i in range(1, 4):
-        markets_data["day_ahead"][-i] = markets_data["day_ahead"][-4]
-
-    if year in range(2018, 2025):
-        future_base = pd.read_csv(
-            join(
-                RAW_DATA_DIR,
-                "future_base_prices.csv")).set_index("year").loc[year]["price"]
-    else:
-        future_base = fb
+        means_da, means_id = historical_means()
+        mean_da = means_da[year]
+        mean_id = means_id[year]
 
-    markets_data["future_base"] = [future_base] * markets_data.shape[0]
+    if year in range(2018, 2026):
+        fb = _future_prices("base")[year]
+        fp = _future_prices("peak")[year]
 
-    if year in range(2018, 2025):
-        future_peak = pd.read_csv(
-            join(
-                RAW_DATA_DIR,
-                "future_peak_prices.csv")).set_index("year").loc[year]["price"]
-    else:
-        future_peak = fp
+    return mean_da, mean_id, fb, fp
 
-    future_peak_vals = [future_peak] * markets_data.shape[0]
 
-    day_of_the_week = markets_data.index.dayofweek
+def _market_arrays(calendar, means_da, means_id, fbs, fps, profiles):
+    '''
+    Prices of all the markets for several zones of the same year.
+    Returns an array of shape (zones, markets, time steps).
 
-    for i in range(markets_data.shape[0]):
-        # Make the future peaks value 0 outside 8h and 21h exclusive (up to
-        # 20h45)
+    The calendar, the masks and each set of profiles are computed once and
+    shared by all the zones.
+    '''
+    import numpy as np
 
-        if markets_data.index[i].hour not in range(8, 21):
-            future_peak_vals[i] = 0
+    n_zones = len(means_da)
+    n_steps = len(calendar["index"])
 
-        # Make weekend values == 0
-        if day_of_the_week[i] in [5, 6]:
-            future_peak_vals[i] = 0
+    # Normalized patterns, once per set of profiles
+    patterns = {}
+    for p in set(profiles):
+        da = _normalized_pattern(calendar, "da", p[0])
+        patterns[p] = (np.repeat(da, 4),
+                       _normalized_pattern(calendar, "id", p[1]))
 
-    markets_data["future_peak"] = future_peak_vals
+    prices = np.empty((n_zones, len(MARKETS), n_steps))
 
-    time_stamps = markets_data.index.tolist()
-    utc_offset = [t.tz._utcoffset for t in time_stamps]
+    shift = calendar["utc_shift"]
+    peak = calendar["future_peak"]
+    for z in range(n_zones):
+        da, id_ = patterns[profiles[z]]
+        # The profiles are normalized to 100
+        prices[z, 0] = (da * means_da[z] / 100)[shift]
+        prices[z, 1] = (id_ * means_id[z] / 100)[shift]
+        prices[z, 2] = fbs[z]
+        prices[z, 3] = np.where(peak, fps[z], 0)
+    return prices
 
-    # check those where the offset is different from the 01-Jan 00:00:00
-    diff = [False if utc == utc_offset[0] else True for utc in utc_offset]
 
-    # now a quick solution is to move the prices 1 hour up for the times with
-    # utc +2
-    da_utc = [markets_data["day_ahead"][i] if diff[i] ==
-              False else markets_data["day_ahead"][i + 4] for i in range(0, len(diff))]
-    id_utc = [markets_data["intra_day"][i] if diff[i] ==
-              False else markets_data["intra_day"][i + 4] for i in range(0, len(diff))]
+def _pandas_markets(calendar, mean_da, mean_id, fb, fp, profiles):
+    '''
+    Prices of all the markets of one zone as a pandas DataFrame
+    '''
+    import pandas as pd
+
+    prices = _market_arrays(
+        calendar, [mean_da], [mean_id], [fb], [fp], [profiles])[0]
+
+    markets_data = pd.DataFrame(
+        {m: prices[k] for k, m in enumerate(MARKETS)},
+        index=calendar["index"])
+
+    # Keep the integer type of future prices given as integers
+    for k, price in [(2, fb), (3, fp)]:
+        if isinstance(price, int):
+            markets_data[MARKETS[k]] = markets_data[MARKETS[k]].astype(int)
+    return markets_data
+
+
+def _polars_markets(calendar, mean_da, mean_id, fb, fp, profiles):
+    '''
+    Prices of all the markets of one zone as a Polars DataFrame, with the
+    same values as _market_arrays. The hourly Day Ahead prices are resampled
+    to 15 min, the prices are shifted in summer time and the future peak is
+    masked as Polars expressions, evaluated in parallel.
+    '''
+    import polars as pl
+    from .backends import time_series
+
+    # The profiles are normalized to 100. The prices are scaled in numpy,
+    # Polars divides by a scalar as a multiplication with its inverse
+    da = _normalized_pattern(calendar, "da", profiles[0]) * mean_da / 100
+    id_ = _normalized_pattern(calendar, "id", profiles[1]) * mean_id / 100
+    steps_per_hour = STEPS_PER_DAY["id"] // STEPS_PER_DAY["da"]
+    steps = pl.LazyFrame({"shift": calendar["utc_shift"],
+                          "peak": calendar["future_peak"]})
+
+    columns = [
+        # Hourly Day Ahead prices repeated in each quarter hour
+        pl.lit(pl.Series(da)).gather(pl.col("shift") // steps_per_hour),
+        pl.lit(pl.Series(id_)).gather(pl.col("shift")),
+        pl.repeat(float(fb), pl.len()),
+        pl.when(pl.col("peak")).then(float(fp)).otherwise(0.),
+    ]
+    prices = steps.select([c.alias(m) for c, m in zip(columns, MARKETS)])
+
+    # Keep the integer type of future prices given as integers
+    for m, price in [(MARKETS[2], fb), (MARKETS[3], fp)]:
+        if isinstance(price, int):
+            prices = prices.with_columns(pl.col(m).cast(pl.Int64))
+
+    prices = prices.collect()
+    return prices.insert_column(0, time_series(calendar["index"]))
 
-    markets_data["day_ahead"] = da_utc
-    markets_data["intra_day"] = id_utc
 
-    logging.info(f"Electricity market prices (DA,ID,FB,FP) for {year} created")
+def create_markets_info(
+        year,
+        mean_da=None,
+        mean_id=None,
+        fb=None,
+        fp=None,
+        save_csv=True,
+        output_dir=None,
+        backend="pandas"):
+    '''
+    Creates a dataframe with information on the IntraDay, Day Ahead, Future Base, and Future Peak
+    markets
+
+    For years 2015-2017: Uses DA and ID market data, FP and FB must be given
+    For years 2018-2020: Uses DA, ID, FP, and FB market data. None must be given
+    For years 2021-2025: Uses FB and FP market data. DA and ID must be given
+    For years 2025-: DA, ID, FP and FP market data must be giiven
+
+    :param year: Year for data
+    :param mean_da: Mean Day Ahead price. Required for years 2022 an onwards
+    :param mean_id: Mean Intraday price. Required for years 2022 an onwards
+    :param fb: Future Base Prices. Required for years outside of 2018-2025
+    :param fp: Future Peak Prices. Required for years outside of 2018-2025
+    :param save_csv: If True, writes the prices to EnergyMarketPrice_<year>.csv.
+        The file is written atomically while holding a lock, so parallel
+        processes never see a partial file. With False nothing is written and
+        the function has no side effects: the raw tables are cached read only
+        and every call returns a new dataframe, so any number of threads or
+        processes can call it at once
+    :param output_dir: Directory of the csv file. Defaults to PROC_DATA_DIR,
+        or the current directory if it does not exist
+    :param backend: Type of the returned table. One of "pandas", "polars"
+        or "arrow" (see backends.py). Polars and Arrow tables have the time
+        stamps in a "Date" column and the same prices as the pandas path
+    '''
+    from .backends import check_backend
+
+    check_backend(backend)
+    mean_da, mean_id, fb, fp = market_parameters(
+        year, mean_da, mean_id, fb, fp)
+
+    calendar = year_calendar(year)
+    profiles = tuple(default_profiles()[m] for m in ["da", "id"])
+
+    if backend == "pandas":
+        markets_data = _pandas_markets(
+            calendar, mean_da, mean_id, fb, fp, profiles)
+    else:
+        markets_data = _polars_markets(
+            calendar, mean_da, mean_id, fb, fp, profiles)
+
+    logger.info(f"Electricity market prices (DA,ID,FB,FP) for {year} created")
 
     # Write the dataframe to a csv
     if save_csv:
-        if os.path.isdir(PROC_DATA_DIR):
-            markets_data.to_csv(
-                join(
-                    PROC_DATA_DIR,
-                    "EnergyMarketPrice_{}.csv".format(year)))
-
+        if output_dir is None:
+            output_dir = PROC_DATA_DIR if os.path.isdir(PROC_DATA_DIR) \
+                else os.getcwd()
+        path = join(output_dir, "EnergyMarketPrice_{}.csv".format(year))
+        if backend == "pandas":
+            write_csv(markets_data, path, lock=True)
         else:
-            markets_data.to_csv(
-                join(
-                    os.getcwd(),
-                    "EnergyMarketPrice_{}.csv".format(year)))
+            from .backends import write_csv as write_table_csv
+            write_table_csv(markets_data, path, lock=True)
+
+    if backend != "pandas":
+        from .backends import from_polars
+        markets_data = from_polars(markets_data, backend)
     return markets_data
 
 
+ZonePrices = namedtuple("ZonePrices", ["values", "zones", "markets", "index"])
+
+
+def create_zones_markets_info(year, zones, profiles=None):
+    '''
+    Creates the prices of all the markets for several bidding zones at once.
+
+    Returns a ZonePrices tuple with the prices as an array of shape
+    (zones, markets, time steps), the names of the zones and markets and
+    the time index. The calendar, the future peak mask and the patterns of
+    each set of profiles are computed once for all the zones.
+
+    :param year: Year for data
+    :param zones: Dataframe with one row per zone (the index is the zone
+        name) and the columns "mean_da", "mean_id", "fb" and "fp" as in
+        create_markets_info. Missing columns or NaN values are completed
+        with the historical data like in create_markets_info. An optional
+        column "profile" names the set of profiles of the zone.
+    :param profiles: Dictionary of profile sets. Each set is a dictionary
+        with the paths of the "da" and "id" excel profiles. The set
+        "default" with the raw profiles is always available.
+    '''
+    import pandas as pd
+
+    zones = pd.DataFrame(zones)
+    profile_sets = {"default": default_profiles()}
+    profile_sets.update(profiles or {})
+
+    def value(row, column):
+        v = row.get(column)
+        return None if v is None or pd.isna(v) else v
+
+    params = []
+    profile_paths = []
+    for name, row in zones.iterrows():
+        params.append(market_parameters(
+            year, *[value(row, c) for c in ["mean_da", "mean_id", "fb", "fp"]]))
+        profile = value(row, "profile") or "default"
+        if profile not in profile_sets:
+            raise ValueError(f"Profile set {profile} of zone {name} not found")
+        profile_paths.append(
+            tuple(profile_sets[profile][m] for m in ["da", "id"]))
+
+    calendar = year_calendar(year)
+    means_da, means_id, fbs, fps = zip(*params)
+    prices = _market_arrays(
+        calendar, means_da, means_id, fbs, fps, profile_paths)
+
+    logger.info(
+        f"Electricity market prices for {len(zones)} zones in {year} created")
+    return ZonePrices(prices, list(zones.index), list(MARKETS),
+                      calendar["index"])
+
+
 if __name__ == '__main__':
     for i in range(2018, 2021):
         create_markets_info(i, save_csv=True)
@@ -0,0 +1,268 @@
+'''
+Created on 19.10.2026
+
+Assembly of the market models as sparse matrices, without Pyomo.
+
+The LP of an energy system and its market products is written straight
+into a sparse CSR matrix, cost and bound vectors with NumPy and SciPy. The
+columns are the flows and storage contents of all time steps, in blocks of
+one flow or storage per horizon, so every constraint type is added for all
+time steps at once:
+
+* Bus balances: Inflows minus outflows are zero
+* Transformer relations: Inflow times the conversion factor of the output
+  equals the outflow times the conversion factor of the input
+* Storage balances, as in oemof.solph.components.GenericStorage
+* Product constraints of build_model_and_constraints: The flows of each
+  block equal the flow of its first time step, the future peak flows
+  outside the peak hours are fixed to zero
+
+The bounds and costs follow oemof.solph.Model, so the optimum is the same
+as the one of the Pyomo model. The LP is solved in-process with HiGHS
+through scipy.optimize.linprog and the solution is returned as the flows
+dataframe of post_process_results.
+
+Only the components of the market models are supported, see
+estimator.model_size.
+'''
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ways of building and solving a model: the Pyomo model of oemof.solph or
+# the matrices of this module
+ENGINES = ["pyomo", "matrix"]
+
+
+def check_engine(engine):
+    '''
+    Checks the name of an engine
+
+    :param engine: One of ENGINES
+    '''
+    if engine not in ENGINES:
+        raise ValueError(
+            'Parameter "engine" must be one "pyomo" or "matrix".')
+
+
+def _values(attribute, steps):
+    # Sequences of oemof as arrays of the length of the horizon
+    from .electricity_market_constraints import _cost_values
+
+    return _cost_values(attribute, steps)
+
+
+def _weights(energy_system, steps):
+    '''
+    Time increment of each time step, like oemof.solph.Model
+    '''
+    import numpy as np
+    from oemof.solph.plumbing import sequence
+
+    increment = sequence(energy_system.timeincrement)
+    if increment[0] is None:
+        return np.full(steps, energy_system.timeindex.freq.nanos / 3.6e12)
+    return _values(increment, steps)
+
+
+def assemble(energy_system, market_products=True):
+    '''
+    Sparse LP of an energy system: minimize costs @ x subject to
+    matrix @ x = rhs and lower <= x <= upper.
+
+    Returns a dictionary with the matrix (scipy CSR), rhs, costs, lower and
+    upper bounds, and the column offsets of the flows and storages.
+
+    :param energy_system: Energy system, not built into a model
+    :param market_products: If True, the product constraints of
+        build_model_and_constraints are added
+    '''
+    import numpy as np
+    from scipy import sparse
+    from oemof.solph import Bus, Transformer
+    from oemof.solph.components import GenericStorage
+    from .compliance import block_starts, peak_steps
+    from .electricity_market_constraints import _market_flows
+    from .estimator import _check_supported
+
+    steps = len(energy_system.timeindex)
+    t = np.arange(steps)
+    weights = _weights(energy_system, steps)
+
+    flows = {}
+    for node in energy_system.nodes:
+        for target, flow in node.outputs.items():
+            flows[node, target] = flow
+    for node in energy_system.nodes:
+        _check_supported(node, [f for (i, o), f in flows.items()
+                                if node in (i, o)])
+    storages = [n for n in energy_system.nodes
+                if isinstance(n, GenericStorage)]
+
+    # Columns: flows, then the contents and the initial content of each
+    # storage
+    flow_offset = {key: k * steps for k, key in enumerate(flows)}
+    offset = len(flows) * steps
+    storage_offset = {}
+    for n in storages:
+        storage_offset[n] = offset
+        offset += steps + 1
+    n_columns = offset
+
+    lower = np.zeros(n_columns)
+    upper = np.full(n_columns, np.inf)
+    costs = np.zeros(n_columns)
+    for key, flow in flows.items():
+        columns = slice(flow_offset[key], flow_offset[key] + steps)
+        if flow.nominal_value is not None:
+            if flow.fix[0] is not None:
+                fixed = _values(flow.fix, steps) * flow.nominal_value
+                lower[columns] = upper[columns] = fixed
+            else:
+                upper[columns] = _values(flow.max, steps) * \
+                    flow.nominal_value
+                lower[columns] = _values(flow.min, steps) * \
+                    flow.nominal_value
+        elif hasattr(flow, "bidirectional"):
+            lower[columns] = -np.inf
+        if flow.variable_costs[0] is not None:
+            costs[columns] = _values(flow.variable_costs, steps) * weights
+
+    rows, cols, vals = [], [], []
+    rhs = []
+    n_rows = 0
+
+    def add(row_index, column_index, values):
+        rows.append(row_index)
+        cols.append(column_index)
+        vals.append(np.broadcast_to(values, np.shape(row_index)))
+
+    for node in energy_system.nodes:
+        if isinstance(node, Bus):
+            for i in node.inputs:
+                add(n_rows + t, flow_offset[i, node] + t, 1.)
+            for o in node.outputs:
+                add(n_rows + t, flow_offset[node, o] + t, -1.)
+            rhs.append(np.zeros(steps))
+            n_rows += steps
+        elif isinstance(node, Transformer):
+            factors = {n: _values(f, steps)
+                       for n, f in node.conversion_factors.items()}
+            for i in node.inputs:
+                for o in node.outputs:
+                    add(n_rows + t, flow_offset[i, node] + t, factors[o])
+                    add(n_rows + t, flow_offset[node, o] + t, -factors[i])
+                    rhs.append(np.zeros(steps))
+                    n_rows += steps
+        elif isinstance(node, GenericStorage):
+            i, o = list(node.inputs)[0], list(node.outputs)[0]
+            capacity = node.nominal_storage_capacity
+            content = storage_offset[node] + t
+            initial = storage_offset[node] + steps
+            lower[content] = capacity * _values(node.min_storage_level, steps)
+            upper[content] = capacity * _values(node.max_storage_level, steps)
+            lower[initial], upper[initial] = 0., capacity
+            if node.initial_storage_level is not None:
+                lower[initial] = upper[initial] = \
+                    node.initial_storage_level * capacity
+
+            # content[t] - content[t-1] * (1 - loss) ** dt - inflow * eta_in
+            # * dt + outflow / eta_out * dt = - fixed losses * dt
+            retained = (1 - _values(node.loss_rate, steps)) ** weights
+            previous = np.concatenate([[initial], content[:-1]])
+            add(n_rows + t, content, 1.)
+            add(n_rows + t, previous, -retained)
+            add(n_rows + t, flow_offset[i, node] + t,
+                -_values(node.inflow_conversion_factor, steps) * weights)
+            add(n_rows + t, flow_offset[node, o] + t,
+                weights / _values(node.outflow_conversion_factor, steps))
+            rhs.append(-(_values(node.fixed_losses_relative, steps) *
+                         capacity + _values(node.fixed_losses_absolute,
+                                            steps)) * weights)
+            n_rows += steps
+            if node.balanced:
+                add(np.array([n_rows]), np.array([content[-1]]), 1.)
+                add(np.array([n_rows]), np.array([initial]), -1.)
+                rhs.append(np.zeros(1))
+                n_rows += 1
+
+    markets = _market_flows(energy_system) if market_products else {}
+    for product, (bus, sink, flow) in markets.items():
+        starts = block_starts(product, peak_steps(
+            _values(flow.variable_costs, steps)), steps)
+        if starts is None:
+            continue
+        first = flow_offset[bus, sink]
+        # Flows outside the blocks are fixed to zero
+        outside = first + t[starts < 0]
+        lower[outside] = upper[outside] = 0.
+        linked = t[(starts >= 0) & (starts != t)]
+        row_index = n_rows + np.arange(len(linked))
+        add(row_index, first + linked, 1.)
+        add(row_index, first + starts[linked], -1.)
+        rhs.append(np.zeros(len(linked)))
+        n_rows += len(linked)
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, n_columns))
+    return {"matrix": matrix, "rhs": np.concatenate(rhs), "costs": costs,
+            "lower": lower, "upper": upper, "flows": flow_offset,
+            "storages": storage_offset, "steps": steps}
+
+
+def solve_matrix_model(energy_system, options=None):
+    '''
+    Assembles the LP of an energy system as sparse matrices and solves it
+    in-process with HiGHS (scipy.optimize.linprog).
+
+    Returns a dictionary with the status, the objective value, the flows
+    as a dataframe with the columns of post_process_results (e.g.
+    "b_el_out, s_da"), the storage contents, the size of the LP and the
+    assembly and solve times.
+
+    :param energy_system: Energy system, not built into a model
+    :param options: Options of scipy.optimize.linprog for the method
+        "highs", e.g. {"presolve": False}
+    '''
+    import numpy as np
+    import pandas as pd
+    from scipy.optimize import linprog
+
+    start = time.perf_counter()
+    lp = assemble(energy_system)
+    assembly_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solution = linprog(lp["costs"], A_eq=lp["matrix"], b_eq=lp["rhs"],
+                       bounds=np.column_stack([lp["lower"], lp["upper"]]),
+                       method="highs", options=options or {})
+    solve_time = time.perf_counter() - start
+    if solution.status != 0:
+        raise AssertionError(
+            f"Solver did not converge ({solution.message}). "
+            "Stopping simulation")
+
+    steps, x = lp["steps"], solution.x
+    index = energy_system.timeindex
+    flows = pd.DataFrame(
+        {f"{i.label}, {o.label}": x[k:k + steps]
+         for (i, o), k in lp["flows"].items()}, index=index)
+    contents = pd.DataFrame(
+        {n.label: x[k:k + steps] for n, k in lp["storages"].items()},
+        index=index)
+
+    logger.info(f"Matrix model assembled in {assembly_time:.2f} s and "
+                f"solved in {solve_time:.2f} s")
+    return {"status": "optimal", "objective": solution.fun,
+            "results": flows, "storage_content": contents,
+            "columns": lp["matrix"].shape[1], "rows": lp["matrix"].shape[0],
+            "nonzeros": lp["matrix"].nnz,
+            "assembly_time": round(assembly_time, 4),
+            "solve_time": round(solve_time, 4)}
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,83 @@
+'''
+Created on 19.10.2026
+
+Built market models that are solved several times.
+
+The energy system and the model are built only once. Between the solves
+only bounds and mutable Params of the model are changed in place. With a
+persistent solver of pyomo.contrib.appsi (e.g. "appsi_highs", needs
+highspy) the model stays loaded in the solver and only these changes are
+passed on, so each solve starts from the basis of the last one. Other
+solvers (e.g. "cbc") write the model again for every solve.
+'''
+
+import pandas as pd
+from .products import MARKET_BUS, SINK_LABELS
+
+# Persistent solvers of pyomo.contrib.appsi
+PERSISTENT_SOLVERS = {"appsi_highs": "Highs", "appsi_gurobi": "Gurobi",
+                      "appsi_cplex": "Cplex"}
+
+
+class PersistentModel(object):
+    '''
+    Built oemof.solph model that is solved several times.
+
+    :param model: Built model, see build_model_and_constraints
+    :param nodes: Nodes of the energy system of the model
+    :param index: Time stamps of the time steps of the model
+    :param solver: Name of the solver. Persistent solvers (see
+        PERSISTENT_SOLVERS) keep the model loaded between the solves
+    :param cmdline_options: Options passed to a non persistent solver
+    '''
+
+    def __init__(self, model, nodes, index, solver="appsi_highs",
+                 cmdline_options=None):
+        self.model = model
+        self.nodes = {str(n): n for n in nodes}
+        self.index = index
+        self.timesteps = list(model.TIMESTEPS)
+        self.solver = solver
+        self.cmdline_options = cmdline_options
+
+        self._opt = None
+        if solver in PERSISTENT_SOLVERS:
+            from pyomo.contrib.appsi import solvers
+            self._opt = getattr(solvers, PERSISTENT_SOLVERS[solver])()
+            self._opt.config.load_solution = False
+
+    def solve(self):
+        '''
+        Solves the model with the current bounds and Params.
+        Returns the termination status.
+        '''
+        if self._opt is not None:
+            results = self._opt.solve(self.model)
+            status = results.termination_condition.name
+            if status == "optimal":
+                results.solution_loader.load_vars()
+            return status
+
+        self.model.solve(solver=self.solver,
+                         solve_kwargs={'tee': False},
+                         solver_io='lp',
+                         cmdline_options=self.cmdline_options or
+                         {'ratio': 0.1})
+        return str(self.model.solver_results.Solver[0].Termination_condition)
+
+    def market_results(self):
+        '''
+        Energy sold to the markets as a dataframe with the columns of
+        post_process_results, e.g. "b_el_out, s_da"
+        '''
+        bus = self.nodes[MARKET_BUS]
+        flow = self.model.flow
+        return pd.DataFrame(
+            {f"{MARKET_BUS}, {s}": [flow[bus, self.nodes[s], t].value
+                                    for t in self.timesteps]
+             for s in SINK_LABELS.values()},
+            index=self.index)
+
+
+if __name__ == '__main__':
+    pass
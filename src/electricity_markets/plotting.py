@@ -0,0 +1,202 @@
+'''
+Created on 19.10.2026
+
+Plots of the market results for long horizons.
+
+A full year in 15 min resolution has 35040 points per series, far more than
+the pixels of a figure. The series are downsampled to the pixel width of the
+figure before plotting, keeping their shape:
+
+* minmax: Minimum and maximum of every pixel column (envelope). Keeps all
+  the peaks, which is what a plot of a dispatch mostly has to show.
+* lttb: Largest Triangle Three Buckets. Keeps the visual shape with one
+  point per bucket.
+
+The figures are drawn on a non interactive Agg canvas, without pyplot and
+without switching the matplotlib backend, and closed after saving, so that no memory is kept between scenarios.
+Several figures can be rendered in parallel worker processes.
+
+matplotlib and numpy are only imported when plotting.
+'''
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .fileio import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Line styles of the four market sinks, as in the examples
+STYLES = ['b', 'r:', 'y-.', 'g-.']
+
+
+def downsample_minmax(x, y, n_out):
+    '''
+    Downsamples a series to the minimum and maximum of n_out // 2 buckets.
+    The points are returned in their original order.
+
+    :param x: Array of x values
+    :param y: Array of y values
+    :param n_out: Maximum number of points returned
+    '''
+    import numpy as np
+
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    n_buckets = max(n_out // 2, 1)
+    if len(y) <= n_out:
+        return x, y
+
+    # Pad the series to full buckets with the last value
+    size = int(np.ceil(len(y) / n_buckets))
+    padded = np.full(size * n_buckets, y[-1])
+    padded[:len(y)] = y
+    buckets = padded.reshape(n_buckets, size)
+
+    offsets = np.arange(n_buckets) * size
+    idx = np.concatenate([offsets + buckets.argmin(axis=1),
+                          offsets + buckets.argmax(axis=1)])
+    idx = np.unique(np.minimum(idx, len(y) - 1))
+    return x[idx], y[idx]
+
+
+def lttb(x, y, n_out):
+    '''
+    Downsamples a series with the Largest Triangle Three Buckets algorithm.
+    The first and last points are always kept.
+
+    :param x: Array of x values. Datetimes are supported
+    :param y: Array of y values
+    :param n_out: Number of points returned
+    '''
+    import numpy as np
+
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    if len(y) <= n_out or n_out < 3:
+        return x, y
+
+    # Work on numeric x values, e.g. for datetimes
+    xn = x.astype("int64").astype(float) if x.dtype.kind == "M" \
+        else x.astype(float)
+
+    edges = np.linspace(1, len(y) - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, len(y) - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket
+        next_stop = edges[i + 2] if i + 2 < len(edges) else len(y)
+        avg_x = xn[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+
+        # Point of the bucket with the largest triangle
+        area = np.abs((xn[a] - avg_x) * (y[start:stop] - y[a])
+                      - (xn[a] - xn[start:stop]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+
+    return x[idx], y[idx]
+
+
+METHODS = {"minmax": downsample_minmax, "lttb": lttb}
+
+
+def downsample_frame(df, n_out, method="minmax"):
+    '''
+    Downsamples every column of a dataframe.
+    Returns a dictionary of column: (x, y) arrays.
+
+    :param df: Dataframe with the series to plot
+    :param n_out: Maximum number of points per series
+    :param method: One of "minmax" or "lttb"
+    '''
+    if method not in METHODS:
+        raise ValueError('Parameter "method" must be one "minmax" or "lttb".')
+
+    x = df.index.values
+    return {c: METHODS[method](x, df[c].values, n_out) for c in df.columns}
+
+
+def _render(series, path, title, width_px, height_px, dpi, styles):
+    '''
+    Draws downsampled series on an Agg canvas and saves the figure. The
+    backend of the process is left as it is, e.g. of an interactive session.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    for k, (name, (x, y)) in enumerate(series.items()):
+        ax.plot(x, y, styles[k % len(styles)], label=name)
+    ax.set_title(title)
+    ax.legend()
+    # Other processes never see a partially written image
+    with atomic_write(path, "wb") as f:
+        fig.savefig(f, format=os.path.splitext(path)[1][1:] or None)
+    # Release the figure right away instead of waiting for the collector
+    fig.clear()
+    del fig
+    return path
+
+
+def plot_market_results(results, path, title, width_px=1600, height_px=1200,
+                        dpi=100, method="minmax", styles=STYLES):
+    '''
+    Plots the series of a results dataframe, downsampled to the width of
+    the figure, and saves the figure to path.
+
+    :param results: Dataframe with the series to plot
+    :param path: Path of the image file
+    :param title: Title of the figure
+    :param width_px: Width of the figure in pixels
+    :param height_px: Height of the figure in pixels
+    :param dpi: Resolution of the figure
+    :param method: Downsampling method. One of "minmax" or "lttb"
+    :param styles: Line styles of the series
+    '''
+    series = downsample_frame(results, width_px, method=method)
+    return _render(series, path, title, width_px, height_px, dpi, styles)
+
+
+def _render_job(job):
+    return _render(**job)
+
+
+def render_plots(jobs, processes=None, width_px=1600, height_px=1200,
+                 dpi=100, method="minmax", styles=STYLES):
+    '''
+    Renders several plots in parallel worker processes.
+
+    The series are downsampled before being sent to the workers, so only a
+    few thousand points per series are passed between processes.
+
+    :param jobs: List of (results dataframe, path, title) tuples
+    :param processes: Number of worker processes. None for one per CPU,
+        1 to render in the current process
+    :param width_px: Width of the figures in pixels
+    :param height_px: Height of the figures in pixels
+    :param dpi: Resolution of the figures
+    :param method: Downsampling method. One of "minmax" or "lttb"
+    :param styles: Line styles of the series
+    '''
+    tasks = [{"series": downsample_frame(results, width_px, method=method),
+              "path": path, "title": title, "width_px": width_px,
+              "height_px": height_px, "dpi": dpi, "styles": styles}
+             for results, path, title in jobs]
+
+    if processes == 1 or len(tasks) <= 1:
+        paths = [_render_job(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            paths = list(executor.map(_render_job, tasks))
+
+    for path in paths:
+        logger.info(f"Plot saved to {path}")
+    return paths
+
+
+if __name__ == '__main__':
+    pass
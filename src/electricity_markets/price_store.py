@@ -0,0 +1,290 @@
+'''
+Created on 19.10.2026
+
+On disk store of market prices, partitioned by year and market.
+
+Each partition is a binary numpy file that is read as a memory mapped array,
+so reading a year of prices does not parse any text and only touches the
+pages that are used. A manifest lists the current file of every partition.
+
+Layout of a store in the directory "prices":
+
+* prices/manifest.json: Current files of each year and market
+* prices/2019/index.v1.npy: Time stamps in UTC nanoseconds
+* prices/2019/day_ahead.v1.npy: Prices of a market, one file per market
+
+New years are appended as new partitions. Revised prices of a market (e.g.
+overrides of the future prices) are written as a new version of that
+partition only. Existing files are never rewritten, readers with an open
+memory map keep their version. Writers hold a lock on the manifest while
+they allocate the file versions and update it, so several processes can
+append to the same store.
+'''
+
+import json
+import logging
+import os
+import time
+from .fileio import atomic_write, file_lock
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+
+def _parameters(kwargs):
+    '''
+    Parameters of create_markets_info as they are kept in the manifest
+    '''
+    return json.loads(json.dumps(kwargs, sort_keys=True, default=float))
+
+
+class PriceStore(object):
+    '''
+    Partitioned store of market prices.
+
+    :param root: Directory of the store
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    # Manifest
+
+    def manifest(self):
+        '''
+        Returns the manifest of the store
+        '''
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.isfile(path):
+            return {"years": {}}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _manifest_lock(self):
+        # Held while the manifest is read, new versions are allocated and
+        # the manifest is written back
+        return file_lock(os.path.join(self.root, MANIFEST))
+
+    def _write_manifest(self, manifest):
+        with atomic_write(os.path.join(self.root, MANIFEST), "w",
+                          encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+    def years(self):
+        '''
+        Years available in the store
+        '''
+        return sorted(int(y) for y in self.manifest()["years"])
+
+    def __contains__(self, year):
+        return str(year) in self.manifest()["years"]
+
+    def _write_array(self, year, name, values):
+        '''
+        Writes an array as a new version of a partition file.
+        Returns the path relative to the store root. Only called while
+        holding the manifest lock.
+        '''
+        import numpy as np
+
+        directory = os.path.join(self.root, str(year))
+        os.makedirs(directory, exist_ok=True)
+        version = 1
+        while os.path.exists(os.path.join(directory,
+                                          f"{name}.v{version}.npy")):
+            version += 1
+
+        relative = os.path.join(str(year), f"{name}.v{version}.npy")
+        with atomic_write(os.path.join(self.root, relative), "wb") as f:
+            np.save(f, values, allow_pickle=False)
+        return relative
+
+    # Writing
+
+    def append(self, markets_data, year=None, overwrite=False,
+               parameters=None):
+        '''
+        Adds the prices of a year as new partitions
+
+        :param markets_data: Dataframe from create_markets_info
+        :param year: Year of the prices. Taken from the first time stamp
+            if not given
+        :param overwrite: If True an existing year is replaced by new
+            partition versions. Otherwise an existing year raises an error.
+        :param parameters: Parameters of create_markets_info the prices were
+            created with, checked by get_or_create
+        '''
+        import numpy as np
+
+        index = markets_data.index
+        if year is None:
+            year = int(index[0].year)
+
+        with self._manifest_lock():
+            manifest = self.manifest()
+            if str(year) in manifest["years"] and not overwrite:
+                raise ValueError(f"Year {year} already in the price store")
+
+            entry = {
+                "tz": str(index.tz) if index.tz is not None else None,
+                "rows": len(index),
+                "index": self._write_array(
+                    year, "index", np.asarray(index.asi8, dtype="int64")),
+                "markets": {},
+            }
+            if parameters is not None:
+                entry["parameters"] = _parameters(parameters)
+            for market in markets_data.columns:
+                values = np.asarray(
+                    markets_data[market].values, dtype="float64")
+                entry["markets"][market] = self._write_array(
+                    year, market, values)
+
+            manifest["years"][str(year)] = entry
+            self._write_manifest(manifest)
+        logger.info(f"Prices of {year} added to price store {self.root}")
+
+    def override(self, year, market, values):
+        '''
+        Writes revised prices of one market as a new partition version.
+        The other partitions of the year are not touched.
+
+        :param year: Year of the prices
+        :param market: Market column, e.g. "future_base"
+        :param values: Scalar or array with the new prices
+        '''
+        import numpy as np
+
+        with self._manifest_lock():
+            manifest = self.manifest()
+            entry = manifest["years"].get(str(year))
+            if entry is None:
+                raise KeyError(f"Year {year} not in the price store")
+
+            values = np.broadcast_to(
+                np.asarray(values, dtype="float64"), (entry["rows"],))
+            entry["markets"][market] = self._write_array(
+                year, market, np.ascontiguousarray(values))
+            self._write_manifest(manifest)
+        logger.info(f"Prices of {market} in {year} overridden")
+
+    # Reading
+
+    def read_arrays(self, year, markets=None):
+        '''
+        Returns the time stamps (UTC nanoseconds) and a dictionary of
+        read only memory mapped price arrays of a year.
+
+        :param year: Year of the prices
+        :param markets: List of markets. All markets if None
+        '''
+        import numpy as np
+
+        entry = self.manifest()["years"].get(str(year))
+        if entry is None:
+            raise KeyError(f"Year {year} not in the price store")
+
+        if markets is None:
+            markets = list(entry["markets"])
+
+        def load(relative):
+            return np.load(os.path.join(self.root, relative),
+                           mmap_mode="r", allow_pickle=False)
+
+        index = load(entry["index"])
+        arrays = {m: load(entry["markets"][m]) for m in markets}
+        return index, arrays, entry["tz"]
+
+    def read(self, year, markets=None):
+        '''
+        Returns the prices of a year as a dataframe like the one of
+        create_markets_info. Each column is a block of its own backed by a
+        memory map, the frame is not consolidated into a copy.
+
+        :param year: Year of the prices
+        :param markets: List of markets. All markets if None
+        '''
+        import pandas as pd
+
+        index, arrays, tz = self.read_arrays(year, markets)
+        dti = pd.DatetimeIndex(pd.to_datetime(index))
+        if tz is not None:
+            dti = dti.tz_localize("UTC").tz_convert(tz)
+        # Without copy the arrays are kept as blocks of their own and not
+        # consolidated, also not later by reductions over the frame
+        return pd.DataFrame(arrays, index=dti, copy=False)
+
+    def read_years(self, years, markets=None):
+        '''
+        Returns the prices of several years as one dataframe
+
+        :param years: List of years
+        :param markets: List of markets. All markets if None
+        '''
+        import pandas as pd
+
+        return pd.concat([self.read(y, markets) for y in years])
+
+    def get_or_create(self, year, **kwargs):
+        '''
+        Returns the prices of a year from the store. Prices not yet in the
+        store are created with create_markets_info and appended.
+
+        Prices created with other parameters than kwargs raise an error.
+        Prices appended without parameters are only returned for empty
+        kwargs.
+
+        :param year: Year of the prices
+        :param kwargs: Parameters of create_markets_info, e.g. mean_da
+        '''
+        entry = self.manifest()["years"].get(str(year))
+        if entry is None:
+            from .market_price_generator import create_markets_info
+            start = time.perf_counter()
+            markets_data = create_markets_info(
+                year=year, save_csv=False, **kwargs)
+            try:
+                self.append(markets_data, year=year, parameters=kwargs)
+            except ValueError:
+                # Appended by another process in the meantime
+                return self.get_or_create(year, **kwargs)
+            logger.info("Prices of {} created in {:.1f} s".format(
+                year, time.perf_counter() - start))
+        else:
+            stored = entry.get("parameters")
+            if (stored is not None or kwargs) and \
+                    stored != _parameters(kwargs):
+                raise ValueError(
+                    f"Prices of {year} in the price store were created with "
+                    f"the parameters {stored}, not {_parameters(kwargs)}")
+        return self.read(year)
+
+    def vacuum(self):
+        '''
+        Removes the partition files not referenced by the manifest anymore.
+        Only safe when no reader holds an old version open.
+        '''
+        manifest = self.manifest()
+        used = set()
+        for entry in manifest["years"].values():
+            used.add(os.path.normpath(entry["index"]))
+            used.update(os.path.normpath(p)
+                        for p in entry["markets"].values())
+
+        removed = 0
+        for year_dir in os.listdir(self.root):
+            directory = os.path.join(self.root, year_dir)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                relative = os.path.normpath(os.path.join(year_dir, name))
+                if name.endswith(".npy") and relative not in used:
+                    os.remove(os.path.join(self.root, relative))
+                    removed += 1
+        return removed
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,74 @@
+'''
+Created on 19.10.2026
+
+Definitions of the electricity market products.
+
+Every market is modelled as a sink on the "b_el_out" bus. The products
+differ in how the sold energy may change over time:
+
+* Day Ahead: Hourly blocks. The power is constant within each hour.
+* Intra Day: Quarter hourly. The power can change in every time step.
+* Future Base: The power is constant over the whole horizon.
+* Future Peak: The power is constant in the peak hours (8h to 20h45 on
+  weekdays) and zero outside of them.
+
+This module has no dependencies, so the product definitions can be used
+without importing pandas, pyomo or oemof.
+'''
+
+from enum import Enum
+
+# Label of the bus connecting the energy system to the markets
+MARKET_BUS = "b_el_out"
+
+# Time steps per hour of the market models (15 min resolution)
+STEPS_PER_HOUR = 4
+
+# Hours of the day (8h to 20h45) and days of the week (monday to friday)
+# for the future peak product
+FUTURE_PEAK_HOURS = range(8, 21)
+FUTURE_PEAK_WEEKDAYS = range(0, 5)
+
+# Prices below this share of the largest price are taken as zero, e.g.
+# outside the peak hours. Relative, so that prices in EUR/MWh and variable
+# costs in EUR/kWh give the same peak hours
+PRICE_TOLERANCE = 0.001
+
+
+class Products(Enum):
+    '''
+    Market products. The value is the column name in the market data
+    '''
+    DAY_AHEAD = "day_ahead"
+    INTRA_DAY = "intra_day"
+    FUTURE_BASE = "future_base"
+    FUTURE_PEAK = "future_peak"
+
+
+# Labels of the sinks representing each market
+SINK_LABELS = {Products.DAY_AHEAD: "s_da",
+               Products.INTRA_DAY: "s_id",
+               Products.FUTURE_BASE: "s_fb",
+               Products.FUTURE_PEAK: "s_fp"}
+
+# Number of time steps with a constant power for the block products
+BLOCK_STEPS = {Products.DAY_AHEAD: STEPS_PER_HOUR,
+               Products.INTRA_DAY: 1}
+
+
+def is_future_peak(hour, day_of_week):
+    '''
+    Checks if a time is in the peak hours of the future peak product.
+    Works with single values as well as with numpy arrays or pandas indexes.
+
+    :param hour: Hour of the day
+    :param day_of_week: Day of the week. Monday is 0
+    '''
+    return ((hour >= FUTURE_PEAK_HOURS.start)
+            & (hour < FUTURE_PEAK_HOURS.stop)
+            & (day_of_week >= FUTURE_PEAK_WEEKDAYS.start)
+            & (day_of_week < FUTURE_PEAK_WEEKDAYS.stop))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,236 @@
+'''
+Created on 19.10.2026
+
+Fitting of the price profiles from historical price series.
+
+The generator composes the prices of a year from typical daily profiles of
+each month and group of days of the week (monday, tuesday to thursday,
+friday, saturday and sunday), normalized to a yearly mean of 100, and the
+yearly mean prices. This module computes these profiles and means from
+historical Day Ahead and Intra Day prices and writes them in the format read
+by the generator:
+
+* day_ahead_price_profile.xlsx: Sheet "Price" with the columns "month",
+  "day" and one column per hour
+* intraday_price_profile.xlsx: Same with one column per quarter hour
+* market_parameter.xlsx: Sheet "MarketParams" with the yearly means
+  ("year", "dayahead", "intraday")
+
+The price series are read in chunks. Each chunk is reduced to sums and
+counts per year, month, group of days and time slot, so the memory used
+does not depend on the number of years. Every price is normalized with the
+mean of its year, so that years with different price levels weigh the same
+in the profiles.
+'''
+
+import datetime
+import logging
+import os
+from .fileio import atomic_write
+from .market_price_generator import (PROFILE_FILES, STEPS_PER_DAY,
+                                     TIME_ZONE, clear_caches)
+
+logger = logging.getLogger(__name__)
+
+# Groups of days of the week (monday is 1) of the profiles
+DAY_GROUPS = [[1], [2, 3, 4], [5], [6], [7]]
+
+# Columns of the price csv files, as written by create_markets_info
+PRICE_COLUMNS = {"da": "day_ahead", "id": "intra_day"}
+
+PARAMETER_FILE = "market_parameter.xlsx"
+
+# Rows read at once from the csv files
+CHUNK_SIZE = 500000
+
+
+def day_group_label(days):
+    '''
+    Label of a group of days as written in the profile tables, e.g. 5 or "2-4"
+    '''
+    if len(days) == 1:
+        return days[0]
+    return f"{days[0]}-{days[-1]}"
+
+
+def _chunk_sums(dates, prices, market, day_groups):
+    '''
+    Sums and counts of the prices of a chunk per
+    (year, month, day group, slot)
+    '''
+    import numpy as np
+    import pandas as pd
+
+    group_of_day = np.full(8, -1)
+    for k, days in enumerate(day_groups):
+        group_of_day[days] = k
+
+    if market == "da":
+        slot = dates.dt.hour.values
+    else:
+        slot = dates.dt.hour.values * 4 + dates.dt.minute.values // 15
+
+    keys = pd.DataFrame({
+        "year": dates.dt.year.values,
+        "month": dates.dt.month.values,
+        "group": group_of_day[dates.dt.dayofweek.values + 1],
+        "slot": slot,
+        "price": prices.values})
+    keys = keys[keys["group"] >= 0]
+    return keys.groupby(["year", "month", "group", "slot"])["price"].agg(
+        ["sum", "count"])
+
+
+def accumulate_price_csv(paths, columns=PRICE_COLUMNS, time_column="Date",
+                         tz=TIME_ZONE, day_groups=DAY_GROUPS,
+                         chunksize=CHUNK_SIZE):
+    '''
+    Reads price csv files in chunks and returns, for each market, a dataframe
+    with the sum and count of the prices per year, month, day group and slot.
+
+    :param paths: List of csv files. The files can hold any number of years
+        and the years can be split over several files
+    :param columns: Dictionary of market ("da", "id"): price column
+    :param time_column: Column with the time stamps. Time stamps with a utc
+        offset are converted to tz, time stamps without are taken as UTC
+    :param tz: Time zone of the profiles
+    :param day_groups: Groups of days of the week of the profiles
+    :param chunksize: Number of rows read at once
+    '''
+    import pandas as pd
+
+    totals = {m: None for m in columns}
+    for path in paths:
+        reader = pd.read_csv(path, usecols=[time_column, *columns.values()],
+                             chunksize=chunksize)
+        for chunk in reader:
+            dates = pd.to_datetime(
+                chunk[time_column], utc=True).dt.tz_convert(tz)
+            for market, column in columns.items():
+                sums = _chunk_sums(dates, chunk[column], market, day_groups)
+                totals[market] = sums if totals[market] is None \
+                    else totals[market].add(sums, fill_value=0)
+        logger.info(f"Prices read from {path}")
+
+    for market, sums in totals.items():
+        if sums is None:
+            raise ValueError(f"No prices found for market {market}")
+    return totals
+
+
+def yearly_means(totals):
+    '''
+    Mean price of each year and market as a dataframe with the columns of
+    the "MarketParams" sheet
+
+    :param totals: Result of accumulate_price_csv
+    '''
+    import pandas as pd
+
+    means = {}
+    for market, sums in totals.items():
+        by_year = sums.groupby(level="year").sum()
+        means[market] = by_year["sum"] / by_year["count"]
+
+    means = pd.DataFrame(means)
+    means.index.name = "year"
+    return means.rename(columns={"da": "dayahead", "id": "intraday"})
+
+
+def normalized_profile(sums, market, day_groups=DAY_GROUPS):
+    '''
+    Daily profiles of each month and day group, normalized with the mean of
+    each year to 100. Returns a dataframe in the format of the "Price" sheet.
+
+    :param sums: Sums and counts of one market from accumulate_price_csv
+    :param market: One of "da" or "id"
+    :param day_groups: Groups of days of the week of the profiles
+    '''
+    import numpy as np
+    import pandas as pd
+
+    by_year = sums.groupby(level="year").sum()
+    means = by_year["sum"] / by_year["count"]
+
+    # Sum of price / mean of the year over all the years
+    years = sums.index.get_level_values("year")
+    normalized = sums["sum"] / means.reindex(years).values
+    grouped = pd.DataFrame({"sum": normalized, "count": sums["count"]})
+    grouped = grouped.groupby(level=["month", "group", "slot"]).sum()
+    profile = (grouped["sum"] / grouped["count"] * 100).unstack("slot")
+
+    steps = STEPS_PER_DAY[market]
+    full = pd.MultiIndex.from_product(
+        [range(1, 13), range(len(day_groups))], names=["month", "group"])
+    profile = profile.reindex(index=full, columns=range(steps))
+    missing = profile.isna().any(axis=1)
+    if missing.any():
+        raise ValueError(
+            "No prices for the months and day groups {}".format(
+                [(m, day_group_label(day_groups[g]))
+                 for m, g in profile.index[missing.values]]))
+
+    minutes = 24 * 60 // steps
+    profile.columns = [datetime.time(s * minutes // 60, s * minutes % 60)
+                       for s in range(steps)]
+    labels = [day_group_label(day_groups[g])
+              for g in profile.index.get_level_values("group")]
+    table = profile.reset_index(drop=True)
+    table.insert(0, "day", np.array(labels, dtype=object))
+    table.insert(0, "month", profile.index.get_level_values("month"))
+    return table
+
+
+def _write_excel(frames, path, index=False):
+    '''
+    Writes dataframes to the sheets of an excel file atomically
+    '''
+    import pandas as pd
+
+    with atomic_write(path, "wb") as f:
+        with pd.ExcelWriter(f, engine="openpyxl") as writer:
+            for sheet, df in frames.items():
+                df.to_excel(writer, sheet_name=sheet, index=index)
+
+
+def fit_profiles(paths, output_dir, columns=PRICE_COLUMNS,
+                 time_column="Date", tz=TIME_ZONE, day_groups=DAY_GROUPS,
+                 chunksize=CHUNK_SIZE):
+    '''
+    Fits the price profiles and yearly means from historical price series
+    and writes the profile and parameter files of the generator.
+    Returns the paths of the written files.
+
+    :param paths: List of csv files with 15 min (or hourly) prices
+    :param output_dir: Directory of the written files. Use RAW_DATA_DIR
+        to replace the profiles of the generator
+    :param columns: Dictionary of market ("da", "id"): price column
+    :param time_column: Column with the time stamps
+    :param tz: Time zone of the profiles
+    :param day_groups: Groups of days of the week of the profiles
+    :param chunksize: Number of rows read at once
+    '''
+    totals = accumulate_price_csv(paths, columns=columns,
+                                  time_column=time_column, tz=tz,
+                                  day_groups=day_groups, chunksize=chunksize)
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = {}
+    for market, sums in totals.items():
+        path = os.path.join(output_dir, PROFILE_FILES[market])
+        _write_excel({"Price": normalized_profile(sums, market, day_groups)},
+                     path)
+        written[market] = path
+
+    path = os.path.join(output_dir, PARAMETER_FILE)
+    _write_excel({"MarketParams": yearly_means(totals).reset_index()}, path)
+    written["parameters"] = path
+
+    # Profiles and means are cached in the generator
+    clear_caches()
+    logger.info(f"Price profiles written to {output_dir}")
+    return written
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,208 @@
+'''
+Created on 19.10.2026
+
+Content addressed cache for the results of scenario runs.
+
+The key of a result is a hash of all the inputs of the run. A run with the
+same inputs finds its result in the cache and can skip building and solving
+the model. The cache lives in a local directory, can be shared by several
+worker processes and is kept below a maximum size by removing the least
+recently used entries.
+'''
+
+import hashlib
+import logging
+import os
+import pickle
+from enum import Enum
+from . import __version__
+from .fileio import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Version of the cached results, part of every key. Bump it with every
+# change of the models or their results (objective, constraints, products,
+# peak hours), the library version alone is not bumped for them
+CACHE_SCHEMA = 3
+
+# Default maximum size of the cache in bytes
+MAX_CACHE_SIZE = 2 * 1024 ** 3
+
+
+def _update_hash(h, obj):
+    '''
+    Feeds an object into a hash in a canonical way. Supports the plain
+    python types, enums, numpy arrays and pandas objects.
+
+    :param h: hashlib hash object
+    :param obj: Object to hash
+    '''
+    if obj is None:
+        h.update(b"N;")
+    elif isinstance(obj, Enum):
+        _update_hash(h, f"{type(obj).__name__}.{obj.name}")
+    elif isinstance(obj, (bool, int, float, str, bytes)):
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, dict):
+        h.update(f"dict{len(obj)}:".encode())
+        for k in sorted(obj, key=str):
+            _update_hash(h, str(k))
+            _update_hash(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"list{len(obj)}:".encode())
+        for v in obj:
+            _update_hash(h, v)
+    elif hasattr(obj, "asi8"):
+        # pandas datetime index. Hash the integer time stamps and the zone
+        _update_hash(h, str(getattr(obj, "tz", None)))
+        _update_hash(h, obj.asi8)
+    elif hasattr(obj, "index") and hasattr(obj, "to_numpy"):
+        # pandas Series and DataFrame
+        if hasattr(obj, "columns"):
+            _update_hash(h, [str(c) for c in obj.columns])
+        _update_hash(h, obj.index)
+        _update_hash(h, obj.to_numpy())
+    elif hasattr(obj, "to_numpy"):
+        # other pandas indexes
+        _update_hash(h, obj.to_numpy())
+    elif hasattr(obj, "dtype") and hasattr(obj, "tobytes"):
+        # numpy arrays and scalars
+        if obj.dtype.kind == "O":
+            _update_hash(h, obj.tolist())
+        else:
+            h.update(f"{obj.dtype.str}{obj.shape}:".encode())
+            h.update(obj.tobytes(order="C"))
+    else:
+        raise TypeError(f"Cannot hash objects of type {type(obj)}")
+
+
+def hash_inputs(*args, **kwargs):
+    '''
+    Returns a hex digest of all the given inputs, the library version and
+    CACHE_SCHEMA
+
+    :param args: Inputs to hash
+    :param kwargs: Named inputs to hash
+    '''
+    h = hashlib.sha256()
+    _update_hash(h, __version__)
+    _update_hash(h, CACHE_SCHEMA)
+    _update_hash(h, list(args))
+    _update_hash(h, kwargs)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    '''
+    On disk cache of pickled results, keyed by the hash of their inputs.
+
+    Entries are written atomically, so several processes can read and write
+    the same cache directory. The modification time of an entry is updated
+    on every hit and the oldest entries are removed once the cache is
+    larger than max_size.
+
+    :param cache_dir: Directory of the cache
+    :param max_size: Maximum size of the cache in bytes
+    '''
+
+    def __init__(self, cache_dir, max_size=MAX_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        '''
+        Path of the cache entry for a key
+
+        :param key: Hash of the inputs
+        '''
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached result for a key, or default if there is none
+
+        :param key: Hash of the inputs
+        :param default: Value returned on a cache miss
+        '''
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return default
+
+        logger.info(f"Cache hit for {key[:12]}")
+        return value
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def put(self, key, value):
+        '''
+        Stores a result in the cache and evicts old entries if needed
+
+        :param key: Hash of the inputs
+        :param value: Picklable result
+        '''
+        with atomic_write(self.path(key), "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.evict()
+
+    def entries(self):
+        '''
+        Lists the cache entries as (modification time, size, path),
+        the least recently used first
+        '''
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        '''
+        Total size of the cache entries in bytes
+        '''
+        return sum(e[1] for e in self.entries())
+
+    def evict(self):
+        '''
+        Removes the least recently used entries until the cache is smaller
+        than max_size
+        '''
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                logger.info(f"Evicted {os.path.basename(path)} from cache")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        '''
+        Removes all the entries of the cache
+        '''
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,383 @@
+'''
+Created on 19.10.2026
+
+Automatic scaling of the market models before solving.
+
+The models mix coefficients of very different magnitudes, e.g. prices in
+EUR/kWh (market prices / 1000) next to flows of hundreds of kW, or prices in
+EUR/MWh with flows in MW. Badly conditioned coefficient ranges slow the
+solvers down and can make them stop with a non optimal status.
+
+The scaling works between building and solving the oemof model:
+
+1. The linear coefficients, right hand sides, bounds and costs are read
+   from the built model into arrays.
+2. Rows (constraints) and columns (variables) get geometric scaling factors,
+   rounded to powers of 2 so that no precision is lost. The bounds and costs
+   of a column and the right hand sides of a row count like coefficients,
+   e.g. a column with an upper bound of 1e-6 (a PV flow at night) is scaled
+   up. The objective is scaled to costs around 1.
+3. The scaled problem is written as an LP file and solved with cbc or HiGHS.
+4. The solution is unscaled and written to the variables of the model, so
+   the model is processed as usual, e.g. with processing.results.
+
+The range of the coefficients, right hand sides, bounds and costs before and
+after the scaling is reported, each on its own and all together. The
+factors narrow the range of all the values together, at the price of a
+wider range of the matrix alone.
+The scaled problem is built from arrays instead of transforming a copy of
+the pyomo model, which would take longer than the solve itself.
+Duals and reduced costs are not returned.
+'''
+
+import logging
+import math
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Passes of the geometric scaling of rows and columns
+SCALING_PASSES = 4
+
+
+def coefficient_matrix(model):
+    '''
+    Reads the linear coefficients of the active constraints and of the
+    objective of a model into arrays. Fixed variables are taken as
+    constants.
+
+    Returns a dictionary with the variables, the row, column and value
+    arrays of the matrix, the lower and upper bounds of the rows and
+    columns (infinite if unbounded), the costs and the constant of the
+    objective.
+
+    :param model: Built pyomo or oemof.solph model
+    '''
+    import numpy as np
+    import pyomo.environ as po
+    from pyomo.repn import generate_standard_repn
+
+    columns = {}
+    variables = []
+    rows, cols, vals = [], [], []
+    row_lower, row_upper = [], []
+
+    def column(var):
+        k = columns.get(id(var))
+        if k is None:
+            k = columns[id(var)] = len(variables)
+            variables.append(var)
+        return k
+
+    for con in model.component_data_objects(po.Constraint, active=True):
+        repn = generate_standard_repn(con.body, compute_values=True)
+        if not repn.is_linear():
+            raise ValueError(f"Constraint {con.name} is not linear")
+        row = len(row_lower)
+        for var, coef in zip(repn.linear_vars, repn.linear_coefs):
+            if coef != 0:
+                rows.append(row)
+                cols.append(column(var))
+                vals.append(coef)
+        lower, upper = po.value(con.lower), po.value(con.upper)
+        row_lower.append(-np.inf if lower is None else lower - repn.constant)
+        row_upper.append(np.inf if upper is None else upper - repn.constant)
+
+    objective = next(model.component_data_objects(po.Objective, active=True))
+    repn = generate_standard_repn(objective.expr, compute_values=True)
+    costs = {column(v): c for v, c in zip(repn.linear_vars,
+                                          repn.linear_coefs)}
+    cost = np.zeros(len(variables))
+    cost[list(costs)] = list(costs.values())
+
+    def bound(value, default):
+        return default if value is None else value
+
+    return {
+        "variables": variables,
+        "objective": objective,
+        "sense": objective.sense,
+        "rows": np.asarray(rows, dtype=int),
+        "cols": np.asarray(cols, dtype=int),
+        "vals": np.asarray(vals, dtype=float),
+        "row_lower": np.asarray(row_lower, dtype=float),
+        "row_upper": np.asarray(row_upper, dtype=float),
+        "col_lower": np.array([bound(v.lb, -np.inf) for v in variables],
+                              dtype=float),
+        "col_upper": np.array([bound(v.ub, np.inf) for v in variables],
+                              dtype=float),
+        "cost": cost,
+        "constant": float(repn.constant),
+    }
+
+
+def _abs_range(*arrays):
+    import numpy as np
+
+    values = np.abs(np.concatenate([np.ravel(a) for a in arrays]))
+    values = values[np.isfinite(values) & (values > 0)]
+    if len(values) == 0:
+        return {"min": None, "max": None, "orders": 0.}
+    low, high = float(values.min()), float(values.max())
+    return {"min": low, "max": high, "orders": round(math.log10(high / low), 2)}
+
+
+def scaled_arrays(matrix, row_scale, col_scale, obj_scale):
+    '''
+    Coefficients, bounds and costs of the scaled problem.
+    A row is multiplied by its factor, a variable x by its factor d, so
+    that the scaled variable is d * x.
+
+    :param matrix: Result of coefficient_matrix
+    :param row_scale: Factors of the rows
+    :param col_scale: Factors of the columns
+    :param obj_scale: Factor of the objective
+    '''
+    r, d = row_scale, col_scale
+    scaled = dict(matrix)
+    scaled["vals"] = matrix["vals"] * r[matrix["rows"]] / d[matrix["cols"]]
+    scaled["row_lower"] = matrix["row_lower"] * r
+    scaled["row_upper"] = matrix["row_upper"] * r
+    scaled["col_lower"] = matrix["col_lower"] * d
+    scaled["col_upper"] = matrix["col_upper"] * d
+    scaled["cost"] = matrix["cost"] / d * obj_scale
+    return scaled
+
+
+def coefficient_ranges(matrix):
+    '''
+    Ranges of the absolute values of the matrix coefficients, right hand
+    sides, bounds and costs, and of all of them together. Each range is
+    given as min, max and orders of magnitude between them.
+
+    :param matrix: Result of coefficient_matrix or scaled_arrays
+    '''
+    return {"matrix": _abs_range(matrix["vals"]),
+            "rhs": _abs_range(matrix["row_lower"], matrix["row_upper"]),
+            "bounds": _abs_range(matrix["col_lower"], matrix["col_upper"]),
+            "objective": _abs_range(matrix["cost"]),
+            "total": _abs_range(matrix["vals"], matrix["row_lower"],
+                                matrix["row_upper"], matrix["col_lower"],
+                                matrix["col_upper"], matrix["cost"])}
+
+
+def scaling_factors(matrix, passes=SCALING_PASSES):
+    '''
+    Geometric scaling factors of the rows and columns and scaling factor of
+    the objective, all rounded to powers of 2.
+
+    A column factor is the geometric mean of the largest and smallest of
+    its scaled coefficients, the inverse of its bounds and its scaled cost,
+    so that all of them move towards 1. A row factor does the same with the
+    coefficients and the right hand sides of the row.
+
+    :param matrix: Result of coefficient_matrix
+    :param passes: Number of alternating column and row passes
+    '''
+    import numpy as np
+
+    rows, cols = matrix["rows"], matrix["cols"]
+    values = np.abs(matrix["vals"])
+    n_rows, n_cols = len(matrix["row_lower"]), len(matrix["variables"])
+    r, d, obj = np.ones(n_rows), np.ones(n_cols), 1.
+
+    def nonzero(a):
+        # Absolute values, NaN where zero or infinite
+        a = np.abs(a)
+        return np.where(np.isfinite(a) & (a > 0), a, np.nan)
+
+    col_lower, col_upper = nonzero(matrix["col_lower"]), \
+        nonzero(matrix["col_upper"])
+    row_lower, row_upper = nonzero(matrix["row_lower"]), \
+        nonzero(matrix["row_upper"])
+    cost = nonzero(matrix["cost"])
+
+    def geometric(index, v, n, extra):
+        high, low = np.zeros(n), np.full(n, np.inf)
+        np.maximum.at(high, index, v)
+        np.minimum.at(low, index, v)
+        for e in extra:
+            high = np.fmax(high, e)
+            low = np.fmin(low, e)
+        scale = np.sqrt(high * low)
+        scale[~np.isfinite(scale) | (scale == 0)] = 1.
+        return scale
+
+    def objective_scale(d):
+        scaled = np.abs(matrix["cost"] / d)
+        scaled = scaled[scaled > 0]
+        if len(scaled) == 0:
+            return 1.
+        return 1. / np.sqrt(scaled.max() * scaled.min())
+
+    for _ in range(passes):
+        # Scaled coefficient r * a / d, bound d * x and cost obj * c / d
+        d = geometric(cols, values * r[rows], n_cols,
+                      [1. / col_lower, 1. / col_upper, obj * cost])
+        r = 1. / geometric(rows, values / d[cols], n_rows,
+                           [row_lower, row_upper])
+        obj = objective_scale(d)
+
+    r = np.exp2(np.round(np.log2(r)))
+    d = np.exp2(np.round(np.log2(d)))
+    obj = float(np.exp2(np.round(np.log2(objective_scale(d)))))
+    return r, d, obj
+
+
+def write_lp(matrix, path):
+    '''
+    Writes the problem of a coefficient matrix as an LP file, with the
+    columns named x0, x1, ... and the rows r0, r1, ...
+    Rows with a lower and an upper bound are written as two rows.
+
+    :param matrix: Result of coefficient_matrix or scaled_arrays
+    :param path: Path of the LP file
+    '''
+    import numpy as np
+    import pyomo.environ as po
+
+    def number(v):
+        return repr(float(v))
+
+    order = np.argsort(matrix["rows"], kind="stable")
+    rows = matrix["rows"][order]
+    starts = np.searchsorted(rows, np.arange(len(matrix["row_lower"]) + 1))
+    cols, vals = matrix["cols"][order], matrix["vals"][order]
+
+    with open(path, "w") as f:
+        f.write("minimize\n" if matrix["sense"] == po.minimize
+                else "maximize\n")
+        terms = [f"{number(c)} x{j}" for j, c in enumerate(matrix["cost"])
+                 if c != 0]
+        f.write("obj: " + (" + ".join(terms) if terms else "0 x0") + "\n")
+        f.write("subject to\n")
+        for i, (lower, upper) in enumerate(zip(matrix["row_lower"],
+                                               matrix["row_upper"])):
+            k0, k1 = starts[i], starts[i + 1]
+            if k0 == k1:
+                continue
+            expr = " + ".join(f"{number(vals[k])} x{cols[k]}"
+                              for k in range(k0, k1))
+            if lower == upper:
+                f.write(f"r{i}: {expr} = {number(lower)}\n")
+                continue
+            if np.isfinite(lower):
+                f.write(f"r{i}_l: {expr} >= {number(lower)}\n")
+            if np.isfinite(upper):
+                f.write(f"r{i}_u: {expr} <= {number(upper)}\n")
+        f.write("bounds\n")
+        for j, (lower, upper) in enumerate(zip(matrix["col_lower"],
+                                               matrix["col_upper"])):
+            low = number(lower) if np.isfinite(lower) else "-inf"
+            up = number(upper) if np.isfinite(upper) else "+inf"
+            f.write(f"{low} <= x{j} <= {up}\n")
+        f.write("end\n")
+
+
+def solver_results(status, objective, solve_time, n_variables,
+                   n_constraints, n_nonzeros):
+    '''
+    Pyomo results object of a solve done outside of pyomo, as used by
+    solve_model and processing.meta_results
+
+    :param status: Status of the solver, e.g. "optimal" or "feasible"
+    :param objective: Objective value
+    :param solve_time: Solve time in seconds
+    :param n_variables: Number of variables
+    :param n_constraints: Number of constraints
+    :param n_nonzeros: Number of nonzero coefficients
+    '''
+    from pyomo.opt import SolverResults, SolverStatus, TerminationCondition
+
+    results = SolverResults()
+    optimal = status == "optimal"
+    results.solver.status = SolverStatus.ok if optimal \
+        else SolverStatus.warning
+    if optimal:
+        results.solver.termination_condition = TerminationCondition.optimal
+    elif status == "feasible":
+        # Stopped on a limit with a feasible solution
+        results.solver.termination_condition = TerminationCondition.feasible
+    else:
+        results.solver.termination_condition = TerminationCondition.other
+    results.solver.time = solve_time
+    results.problem.number_of_variables = n_variables
+    results.problem.number_of_constraints = n_constraints
+    results.problem.number_of_nonzeros = n_nonzeros
+    if objective is not None:
+        results.problem.lower_bound = objective
+        results.problem.upper_bound = objective
+    return results
+
+
+def solve_scaled(model, solver="cbc", cmdline_options=None,
+                 passes=SCALING_PASSES):
+    '''
+    Scales a built model, solves the scaled problem and writes the unscaled
+    solution to the variables of the model, like oemof.solph.Model.solve
+    does. The solver results are set as model.solver_results and
+    model.es.results. Returns a report with the coefficient ranges before
+    and after the scaling and the scaling and solve times.
+
+    :param model: Built oemof.solph model
+    :param solver: One of "cbc" or "highs"
+    :param cmdline_options: Options passed to the solver
+    :param passes: Number of passes of the geometric scaling
+    '''
+    # Reuse the solver calls of the model snapshots
+    from .snapshot import solve_cbc, solve_highs
+
+    if solver not in ["cbc", "highs"]:
+        raise ValueError('Parameter "solver" must be one "cbc" or "highs".')
+
+    start = time.perf_counter()
+    matrix = coefficient_matrix(model)
+    r, d, obj = scaling_factors(matrix, passes=passes)
+    scaled = scaled_arrays(matrix, r, d, obj)
+    report = {"before": coefficient_ranges(matrix),
+              "after": coefficient_ranges(scaled),
+              "objective_scale": obj,
+              "scaling_time": round(time.perf_counter() - start, 4)}
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lp_file = os.path.join(tmp_dir, "scaled.lp")
+        write_lp(scaled, lp_file)
+        if solver == "cbc":
+            status, _, values = solve_cbc(
+                lp_file, tmp_dir, cmdline_options or {})
+        else:
+            status, _, values = solve_highs(lp_file, cmdline_options or {})
+    report["solve_time"] = round(time.perf_counter() - start, 4)
+
+    objective = None
+    if status in ["optimal", "feasible"]:
+        for j, var in enumerate(matrix["variables"]):
+            # cbc leaves columns with zero value out of the solution
+            var.set_value(values.get(f"x{j}", 0.) / d[j],
+                          skip_validation=True)
+        objective = matrix["constant"] + float(
+            sum(c * v.value for c, v in zip(matrix["cost"],
+                                            matrix["variables"]) if c != 0))
+    else:
+        logger.warning(f"Scaled model not solved: {status}")
+
+    results = solver_results(status, objective, report["solve_time"],
+                             len(matrix["variables"]),
+                             len(matrix["row_lower"]), len(matrix["vals"]))
+    model.solver_results = results
+    model.es.results = results
+
+    logger.info(
+        "Coefficient ranges in orders of magnitude before and after "
+        "scaling: " + ", ".join(
+            "{} {} -> {}".format(k, report["before"][k]["orders"],
+                                 report["after"][k]["orders"])
+            for k in report["before"]))
+    return report
+
+
+if __name__ == '__main__':
+    pass
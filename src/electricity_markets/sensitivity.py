@@ -0,0 +1,282 @@
+'''
+Created on 19.10.2026
+
+Sensitivity of the market allocation to the market prices from one solve.
+
+Instead of solving the models again with inflated prices, the sensitivity
+is read from the duals, reduced costs and cost ranging of a single LP solve:
+
+* Income sensitivity: Change of the income per change of the price of a
+  market, i.e. the energy sold to it (valid inside the price ranges).
+* Price ranges: For the flow to a market in each time step, the range of
+  its price in which the optimal allocation (basis) does not change. The
+  ranges hold for the change of one price at a time.
+* Reduced costs: Price change needed before a market that gets no energy
+  in a time step would be used.
+* Duals of the product constraints (day ahead blocks, constant future
+  base and future peak flows): Value of relaxing each constraint.
+
+Cost ranging needs HiGHS (highspy). With cbc only the duals and reduced
+costs are available and the ranges are left empty.
+'''
+
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Market sinks on the bus b_el_out and their market data columns
+MARKET_SINKS = {"s_da": "day_ahead", "s_id": "intra_day",
+                "s_fb": "future_base", "s_fp": "future_peak"}
+
+# Prefixes of the names of the product constraints
+PRODUCT_CONSTRAINTS = ["day_ahead", "future_base", "future_peak"]
+
+
+def _product(name):
+    for prefix in PRODUCT_CONSTRAINTS:
+        if name.startswith(prefix):
+            return prefix
+    return None
+
+
+def _solve_highs(model, cmdline_options):
+    '''
+    Solves the model with HiGHS and returns the columns and rows with their
+    pyomo components, the solution and the cost ranging.
+    '''
+    import highspy
+    import numpy as np
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lp_file = os.path.join(tmp_dir, "model.lp")
+        _, smap_id = model.write(
+            lp_file, io_options={"symbolic_solver_labels": False})
+        symbol_map = model.solutions.symbol_map[smap_id]
+
+        h = highspy.Highs()
+        h.setOptionValue("output_flag", False)
+        for k, v in (cmdline_options or {}).items():
+            h.setOptionValue(k, v)
+        h.readModel(lp_file)
+        h.run()
+
+    status = h.modelStatusToString(h.getModelStatus()).lower()
+    lp = h.getLp()
+    solution = h.getSolution()
+    ranging_status, ranging = h.getRanging()
+
+    def component(name):
+        ref = symbol_map.bySymbol.get(name) or symbol_map.aliases.get(name)
+        return ref() if ref is not None else None
+
+    rows = [component(n) for n in lp.row_names_]
+
+    result = {
+        "status": status,
+        "objective": h.getInfo().objective_function_value,
+        "columns": [component(n) for n in lp.col_names_],
+        "rows": rows,
+        "col_value": np.asarray(solution.col_value),
+        "col_dual": np.asarray(solution.col_dual),
+        "row_dual": np.asarray(solution.row_dual),
+        "col_cost": np.asarray(lp.col_cost_),
+        "n_nonzeros": len(lp.a_matrix_.index_),
+    }
+    if str(ranging_status).endswith("kOk"):
+        result["cost_low"] = np.asarray(ranging.col_cost_dn.value_)
+        result["cost_high"] = np.asarray(ranging.col_cost_up.value_)
+    return result
+
+
+def _solve_pyomo(model, solver, cmdline_options):
+    '''
+    Solves the model through pyomo with the dual and reduced cost suffixes
+    '''
+    import numpy as np
+    import pyomo.environ as po
+    from pyomo.repn import generate_standard_repn
+
+    # oemof keeps None as placeholder of the suffixes
+    for name in ["dual", "rc"]:
+        if getattr(model, name, None) is None and hasattr(model, name):
+            delattr(model, name)
+    model.receive_duals()
+    model.solve(solver=solver, solve_kwargs={'tee': False},
+                solver_io='lp', cmdline_options=cmdline_options or {})
+
+    columns = [v for v in model.component_data_objects(po.Var)
+               if not v.fixed]
+    rows = list(model.component_data_objects(po.Constraint, active=True))
+    objective = next(model.component_data_objects(po.Objective, active=True))
+    repn = generate_standard_repn(objective.expr, compute_values=True)
+    costs = {id(v): c for v, c in zip(repn.linear_vars, repn.linear_coefs)}
+
+    termination = model.solver_results.Solver[0].Termination_condition
+    return {
+        "status": str(termination),
+        "objective": po.value(objective),
+        "columns": columns,
+        "rows": rows,
+        "col_value": np.array([v.value or 0. for v in columns]),
+        "col_dual": np.array([model.rc.get(v, np.nan) for v in columns]),
+        "row_dual": np.array([model.dual.get(c, np.nan) for c in rows]),
+        "col_cost": np.array([costs.get(id(v), 0.) for v in columns]),
+    }
+
+
+def solve_with_sensitivity(model, solver="highs", cmdline_options=None):
+    '''
+    Solves a built model once and returns the sensitivity data of its
+    flows and constraints. The solution is written to the model, so it can
+    be processed as usual, e.g. with processing.results.
+
+    Returns a dictionary with:
+
+    * status, objective, solve_time
+    * flows: Dataframe indexed by (source, target, timestep) with the
+      value, the objective coefficient, the reduced cost and the range of
+      the objective coefficient of every flow (the coefficient is the
+      variable cost times the objective weighting of the time step)
+    * constraints: Dataframe with the name, the product ("day_ahead",
+      "future_base", "future_peak" or None) and the dual of every constraint
+
+    :param model: Built oemof.solph model, e.g. from build_model_and_constraints
+    :param solver: "highs" for duals and cost ranging, or a pyomo solver
+        name (e.g. "cbc") for duals and reduced costs only
+    :param cmdline_options: Options passed to the solver
+    '''
+    import numpy as np
+    import pandas as pd
+    from .scaling import solver_results
+
+    start = time.perf_counter()
+    if solver == "highs":
+        data = _solve_highs(model, cmdline_options)
+    else:
+        data = _solve_pyomo(model, solver, cmdline_options)
+    solve_time = round(time.perf_counter() - start, 4)
+
+    if data["status"] != "optimal":
+        raise AssertionError(
+            f"Solver did not converge ({data['status']}). Stopping simulation")
+
+    if solver == "highs":
+        # Write the solution to the model like Model.solve does
+        for var, value in zip(data["columns"], data["col_value"]):
+            if var is not None:
+                var.set_value(float(value), skip_validation=True)
+        results = solver_results(
+            data["status"], data["objective"], solve_time,
+            len(data["columns"]), len(data["rows"]), data["n_nonzeros"])
+        model.solver_results = results
+        model.es.results = results
+
+    flow_ids = {id(v): k for k, v in model.flow.items()}
+    keys, positions = [], []
+    for j, var in enumerate(data["columns"]):
+        key = flow_ids.get(id(var)) if var is not None else None
+        if key is not None:
+            keys.append((str(key[0]), str(key[1]), key[2]))
+            positions.append(j)
+
+    flows = pd.DataFrame({
+        "value": data["col_value"][positions],
+        "cost": data["col_cost"][positions],
+        "reduced_cost": data["col_dual"][positions],
+        "cost_low": data.get("cost_low", np.full(
+            len(data["columns"]), np.nan))[positions],
+        "cost_high": data.get("cost_high", np.full(
+            len(data["columns"]), np.nan))[positions],
+    }, index=pd.MultiIndex.from_tuples(
+        keys, names=["source", "target", "timestep"])).sort_index()
+
+    names = [c.parent_component().name if c is not None else None
+             for c in data["rows"]]
+    constraints = pd.DataFrame({
+        "name": [c.name if c is not None else None for c in data["rows"]],
+        "product": [_product(n) if n is not None else None for n in names],
+        "dual": data["row_dual"],
+    })
+
+    logger.info(f"Model solved with sensitivity data in {solve_time:.1f} s")
+    return {"status": data["status"], "objective": data["objective"],
+            "solve_time": solve_time, "flows": flows,
+            "constraints": constraints}
+
+
+def market_sensitivity(sensitivity, model, market_data, price_factor=1.,
+                       bus="b_el_out", sinks=MARKET_SINKS):
+    '''
+    Price sensitivity of the flows to the market sinks.
+
+    Returns a dictionary with:
+
+    * steps: Dataframe per market and time step with the energy sold, the
+      price, the price range in which the allocation does not change and
+      the reduced cost as a price change
+    * markets: Dataframe per market with the energy, the income, the
+      income sensitivity (income change per unit of price change) and the
+      smallest price increase and decrease over all the time steps that
+      changes the allocation
+    * products: Dataframe per product constraint with the number of
+      constraints, the number of binding ones and the largest dual
+
+    :param sensitivity: Result of solve_with_sensitivity
+    :param model: The solved model
+    :param market_data: Market prices of the model
+    :param price_factor: Market price per unit of variable cost, e.g.
+        1000 if prices are in EUR/MWh and the costs in EUR/kWh
+    :param bus: Label of the bus of the markets
+    :param sinks: Dictionary of sink label: market data column
+    '''
+    import numpy as np
+    import pandas as pd
+
+    flows = sensitivity["flows"]
+    weights = np.array([model.objective_weighting[t]
+                        for t in model.TIMESTEPS])
+
+    steps = []
+    for sink, column in sinks.items():
+        if (bus, sink) not in flows.index.droplevel("timestep"):
+            continue
+        f = flows.loc[(bus, sink)].sort_index()
+        w = weights[f.index.values]
+        price = market_data[column].values[f.index.values]
+        # cost = weight * variable costs = -weight * price / price_factor
+        df = pd.DataFrame({
+            "market": column,
+            "timestep": f.index.values,
+            "power": f["value"].values,
+            "energy": f["value"].values * w,
+            "price": price,
+            "price_low": -f["cost_high"].values / w * price_factor,
+            "price_high": -f["cost_low"].values / w * price_factor,
+            "reduced_price": -f["reduced_cost"].values / w * price_factor,
+        })
+        steps.append(df)
+    steps = pd.concat(steps, ignore_index=True)
+
+    markets = steps.groupby("market", sort=False).apply(
+        lambda df: pd.Series({
+            "energy": df["energy"].sum(),
+            "income": (df["energy"] * df["price"]).sum() / price_factor,
+            "income_sensitivity": df["energy"].sum() / price_factor,
+            "price_increase": (df["price_high"] - df["price"]).min(),
+            "price_decrease": (df["price"] - df["price_low"]).min(),
+        }))
+
+    constraints = sensitivity["constraints"]
+    products = constraints.dropna(subset=["product"]).groupby("product").agg(
+        constraints=("dual", "size"),
+        binding=("dual", lambda d: int((d.abs() > 1e-9).sum())),
+        max_dual=("dual", lambda d: d.abs().max()))
+
+    return {"steps": steps, "markets": markets, "products": products}
+
+
+if __name__ == '__main__':
+    pass
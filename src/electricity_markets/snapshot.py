@@ -0,0 +1,337 @@
+'''
+Created on 19.10.2026
+
+Snapshots of built models with their market constraints.
+
+Building the pyomo model of an energy system with the market constraints is
+one of the largest fixed costs of a run. A snapshot stores the built model
+as a compressed LP file together with an index map, which links the columns
+of the LP file to the flows and time steps of the energy system. A snapshot
+can be solved later, on another machine or in another job stage, without
+creating the energy system or building the model again.
+
+Files of a snapshot with the path "models/wind_2019":
+
+* models/wind_2019.lp.gz: Compressed LP file
+* models/wind_2019.json: Index map and meta data
+
+run_snapshot solves a snapshot as a job of the job service or the work
+queue, with a result cache keyed by the snapshot files and the solver
+options. It is their default target, as it needs nothing but the package.
+
+solve_cbc, solve_highs and load_values solve LP files outside of pyomo and
+write the values back to a model. They are shared by the scaled and
+budgeted solves and by the scenario pipeline.
+'''
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from .fileio import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def _index_map(model, symbol_map):
+    '''
+    Links the LP columns to the flows and time steps of the model.
+    Other columns and the rows are kept with their pyomo names.
+
+    :param model: Built oemof.solph model
+    :param symbol_map: Pyomo symbol map of the written LP file
+    '''
+    columns = {}
+    fixed = {}
+    for (i, o, t), var in model.flow.items():
+        key = [str(i), str(o), t]
+        symbol = symbol_map.byObject.get(id(var))
+        if symbol is not None:
+            columns[symbol] = key
+        elif var.fixed:
+            fixed["{},{},{}".format(*key)] = var.value
+
+    # Any other variable, e.g. storage contents, with its pyomo name
+    others = {}
+    for symbol, ref in symbol_map.bySymbol.items():
+        obj = ref()
+        if symbol in columns or obj is None:
+            continue
+        others[symbol] = obj.name
+
+    return {"columns": columns, "fixed": fixed, "others": others}
+
+
+def dump_model(model, path):
+    '''
+    Writes a snapshot of a built model to path.lp.gz and path.json
+
+    :param model: Built oemof.solph model, e.g. from build_model_and_constraints
+    :param path: Path of the snapshot without extension
+    '''
+    start = time.perf_counter()
+    lp_path, map_path = path + ".lp.gz", path + ".json"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_lp = os.path.join(tmp_dir, "model.lp")
+        _, smap_id = model.write(
+            tmp_lp, io_options={"symbolic_solver_labels": False})
+        symbol_map = model.solutions.symbol_map[smap_id]
+
+        with atomic_write(lp_path, "wb") as f, \
+                gzip.GzipFile(fileobj=f, mode="wb") as gz, \
+                open(tmp_lp, "rb") as lp:
+            shutil.copyfileobj(lp, gz)
+
+    timeindex = model.es.timeindex
+    meta = {
+        # Time stamps as integer nanoseconds (UTC for time zone aware indexes)
+        "timeindex": timeindex.asi8.tolist(),
+        "tz": str(timeindex.tz) if timeindex.tz is not None else None,
+        "index_map": _index_map(model, symbol_map),
+    }
+
+    with atomic_write(map_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    logger.info("Model snapshot written to {} in {:.1f} s".format(
+        lp_path, time.perf_counter() - start))
+    return lp_path, map_path
+
+
+def load_snapshot(path):
+    '''
+    Reads the meta data and index map of a snapshot
+
+    :param path: Path of the snapshot without extension
+    '''
+    with open(path + ".json", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["lp_path"] = path + ".lp.gz"
+    return meta
+
+
+def solve_cbc(lp_file, tmp_dir, cmdline_options, timeout=None):
+    '''
+    Solves an LP file with the cbc command line.
+    Returns the status, the objective value and the column values.
+    The status is "feasible" if cbc stopped on a limit with a feasible
+    solution.
+
+    Options with an empty value are passed as flags (e.g. "dualSimplex"),
+    like pyomo does. With a timeout, cbc is killed after that many seconds
+    and subprocess.TimeoutExpired is raised.
+    '''
+    sol_file = os.path.join(tmp_dir, "model.sol")
+    cmd = ["cbc", lp_file]
+    flags = []
+    for k, v in cmdline_options.items():
+        if str(v).strip() == "":
+            flags.append("-" + k)
+        else:
+            cmd += ["-" + k, str(v)]
+    cmd += flags + ["-solve", "-solution", sol_file]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+    values = {}
+    feasible = True
+    with open(sol_file) as f:
+        header = f.readline()
+        for line in f:
+            parts = line.split()
+            # Infeasible entries are marked with "**"
+            if parts[0] == "**":
+                parts = parts[1:]
+                feasible = False
+            values[parts[1]] = float(parts[2])
+
+    status = header.split(" - ")[0].strip().lower()
+    if status.startswith("stopped") and feasible:
+        status = "feasible"
+    objective = float(header.split("objective value")[-1])
+    return status, objective, values
+
+
+def solve_highs(lp_file, cmdline_options, start=None):
+    '''
+    Solves an LP file with HiGHS. Needs the highspy package.
+    Returns the status, the objective value and the column values.
+    The status is "feasible" if HiGHS stopped on a limit with a feasible
+    solution.
+
+    A start is a dictionary of column name: value passed to HiGHS as the
+    starting solution. Missing columns start at zero.
+    '''
+    import highspy
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    for k, v in cmdline_options.items():
+        h.setOptionValue(k, v)
+    h.readModel(lp_file)
+    names = h.getLp().col_names_
+    if start is not None:
+        solution = highspy.HighsSolution()
+        solution.col_value = [start.get(n, 0.) for n in names]
+        solution.value_valid = True
+        h.setSolution(solution)
+    h.run()
+
+    values = dict(zip(names, h.getSolution().col_value))
+    status = h.modelStatusToString(h.getModelStatus()).lower()
+    info = h.getInfo()
+    # Solution status 2 is a feasible primal solution
+    if status != "optimal" and info.primal_solution_status == 2:
+        status = "feasible"
+    objective = info.objective_function_value
+    return status, objective, values
+
+
+def load_values(symbol_map, values):
+    '''
+    Writes the column values of a solution to the variables of the model of
+    a symbol map, like Model.solve does
+    '''
+    for symbol, ref in symbol_map.bySymbol.items():
+        var = ref()
+        if var is not None and var.is_variable_type():
+            # cbc leaves columns with zero value out of the solution
+            var.set_value(values.get(symbol, 0.), skip_validation=True)
+
+
+def count_variables(symbol_map):
+    '''
+    Number of variables (columns) of an LP file written with a symbol map.
+    The symbol map also holds the names of the constraint rows
+    '''
+    count = 0
+    for ref in symbol_map.bySymbol.values():
+        obj = ref()
+        if obj is not None and obj.is_variable_type():
+            count += 1
+    return count
+
+
+def solve_snapshot(path, solver="cbc", cmdline_options=None):
+    '''
+    Solves a snapshot without building the model again.
+
+    Returns the flows as a dataframe with the same columns as
+    post_process_results, e.g. "b_el_out, s_da", and a dictionary with the
+    status, objective value and solve time.
+
+    :param path: Path of the snapshot without extension
+    :param solver: One of "cbc" or "highs"
+    :param cmdline_options: Options passed to the solver
+    '''
+    import pandas as pd
+
+    if solver not in ["cbc", "highs"]:
+        raise ValueError('Parameter "solver" must be one "cbc" or "highs".')
+
+    if cmdline_options is None:
+        cmdline_options = {"ratio": 0.1} if solver == "cbc" else {}
+
+    meta = load_snapshot(path)
+    start = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lp_file = os.path.join(tmp_dir, "model.lp")
+        with gzip.open(meta["lp_path"], "rb") as gz, open(lp_file, "wb") as f:
+            shutil.copyfileobj(gz, f)
+
+        if solver == "cbc":
+            status, objective, values = solve_cbc(
+                lp_file, tmp_dir, cmdline_options)
+        else:
+            status, objective, values = solve_highs(lp_file, cmdline_options)
+
+    solve_time = time.perf_counter() - start
+    if status != "optimal":
+        raise AssertionError(
+            f"Solver did not converge ({status}). Stopping simulation")
+
+    flows = {}
+    index_map = meta["index_map"]
+    for symbol, (i, o, t) in index_map["columns"].items():
+        # cbc leaves columns with zero value out of the solution
+        flows.setdefault(f"{i}, {o}", {})[t] = values.get(symbol, 0.)
+    for key, value in index_map["fixed"].items():
+        i, o, t = key.rsplit(",", 2)
+        flows.setdefault(f"{i}, {o}", {})[int(t)] = value
+
+    timeindex = pd.to_datetime(meta["timeindex"])
+    if meta["tz"] is not None:
+        timeindex = timeindex.tz_localize("UTC").tz_convert(meta["tz"])
+    results = pd.DataFrame(
+        {k: pd.Series(v).sort_index().values for k, v in flows.items()},
+        index=timeindex)
+
+    info = {"status": status, "objective": objective,
+            "solve_time": round(solve_time, 4)}
+    logger.info(f"Snapshot {path} solved in {solve_time:.1f} s")
+    return results, info
+
+
+def run_snapshot(spec, cache=None, progress=None):
+    '''
+    Solves a snapshot given by a job specification, e.g.
+    {"snapshot": "models/wind_2019", "solver": "highs"}, reading the result
+    from the cache if possible. The specification can also have
+    "cmdline_options".
+
+    Returns a dictionary with the results dataframe, the KPIs (status,
+    objective value and solve time), the timings of each stage, the input
+    hash and whether the result came from the cache.
+
+    :param spec: Job specification dictionary
+    :param cache: ResultCache, path of a cache directory or None for no cache
+    :param progress: Optional function called as progress(stage, seconds)
+        after each stage
+    '''
+    from .result_cache import ResultCache, hash_inputs
+
+    if isinstance(cache, str):
+        cache = ResultCache(cache)
+
+    timings = {}
+
+    def stage(name, start):
+        timings[name] = round(time.perf_counter() - start, 4)
+        if progress is not None:
+            progress(name, timings[name])
+
+    start = time.perf_counter()
+    path = spec["snapshot"]
+    files = []
+    for extension in [".lp.gz", ".json"]:
+        with open(path + extension, "rb") as f:
+            files.append(f.read())
+    key = hash_inputs(files, solver=spec.get("solver", "cbc"),
+                      cmdline_options=spec.get("cmdline_options"))
+    stage("data", start)
+
+    if cache is not None:
+        start = time.perf_counter()
+        cached = cache.get(key)
+        stage("cache", start)
+        if cached is not None:
+            return dict(cached, timings=timings, key=key, cached=True)
+
+    start = time.perf_counter()
+    results, info = solve_snapshot(path, spec.get("solver", "cbc"),
+                                   spec.get("cmdline_options"))
+    stage("solve", start)
+
+    output = {"results": results, "kpis": info}
+    if cache is not None:
+        cache.put(key, output)
+    return dict(output, timings=timings, key=key, cached=False)
+
+
+if __name__ == '__main__':
+    pass
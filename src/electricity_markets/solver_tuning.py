@@ -0,0 +1,329 @@
+'''
+Created on 19.10.2026
+
+Tuning of the solver options and solves with a time and gap budget.
+
+The best solver options depend on the size and structure of the model, not
+on its data. A model class (e.g. "district" or "power_plant") is tuned once
+on a sample horizon: a small set of candidate options (presolve, simplex or
+interior point method, threads, gap) is benchmarked on the same LP file,
+each with a time limit, and the fastest one that reaches the optimum is
+stored per model class and solver in a JSON file. Later runs read the
+options with tuned_options.
+
+solve_with_budget solves a model with a time limit and a relative gap and
+keeps the best feasible solution found within the budget. Its status is
+"optimal" or "feasible" instead of an error, so that large batches are not
+held up by a few slow models. With a warm start, the values of the model
+variables (e.g. of a dispatch heuristic, see warm_start) are passed to
+HiGHS as its starting solution. They are kept as the feasible solution if
+the solver stops on the time limit without one and they satisfy the
+constraints and bounds of the model.
+
+The models of this library are linear programs. For them the gap only
+matters once integer variables are added, while the time limit always
+applies. cbc does not stop the simplex of a linear program on its time
+limit and keeps no solution when its process is stopped, so solves with a
+time limit need HiGHS. The benchmark of the options still stops cbc
+candidates on the time limit, without a solution.
+'''
+
+import datetime
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from .common import DATA_DIR
+from .fileio import atomic_write, file_lock
+
+logger = logging.getLogger(__name__)
+
+TUNING_FILE = os.path.join(DATA_DIR, "solver_tuning.json")
+
+# Candidate options of each solver, the first one is the default
+CANDIDATES = {
+    "cbc": [
+        {"ratio": 0.1},
+        {"ratio": 0.1, "dualSimplex": ""},
+        {"ratio": 0.1, "primalSimplex": ""},
+        {"ratio": 0.1, "presolve": "off"},
+        {"ratio": 0.1, "threads": 2},
+        {"ratio": 0.1, "barrier": ""},
+    ],
+    "highs": [
+        {},
+        {"solver": "simplex"},
+        {"solver": "simplex", "simplex_strategy": 4},
+        {"solver": "ipm"},
+        {"presolve": "off"},
+    ],
+}
+
+# Status of a solver stopped on its time limit without a feasible solution
+TIME_LIMIT = "time limit reached"
+
+# Largest relative violation of the constraints by a kept warm start
+START_TOLERANCE = 1e-6
+
+# Names of the time limit and relative gap options of each solver
+BUDGET_OPTIONS = {"cbc": {"time_limit": "sec", "gap": "ratio"},
+                  "highs": {"time_limit": "time_limit", "gap": "mip_rel_gap"}}
+
+
+def budget_options(solver, cmdline_options=None, time_limit=None, gap=None):
+    '''
+    Adds a time limit and a relative gap to the options of a solver
+
+    :param solver: One of "cbc" or "highs"
+    :param cmdline_options: Options passed to the solver
+    :param time_limit: Time limit in seconds. None for no limit
+    :param gap: Relative gap at which the solver stops. None for the
+        default of the options
+    '''
+    if solver not in BUDGET_OPTIONS:
+        raise ValueError('Parameter "solver" must be one "cbc" or "highs".')
+
+    options = dict(cmdline_options or {})
+    names = BUDGET_OPTIONS[solver]
+    if time_limit is not None:
+        options[names["time_limit"]] = time_limit
+    if gap is not None:
+        options[names["gap"]] = gap
+    return options
+
+
+def check_time_limit(solver, time_limit):
+    '''
+    Checks that a solver can stop on a time limit and keep its best solution
+
+    :param solver: One of "cbc" or "highs"
+    :param time_limit: Time limit in seconds. None for no limit
+    '''
+    if time_limit is not None and solver != "highs":
+        raise ValueError(
+            'Parameter "time_limit" needs the solver "highs". cbc does not '
+            'stop linear programs on a time limit.')
+
+
+def _write_lp(model, tmp_dir):
+    lp_file = os.path.join(tmp_dir, "model.lp")
+    _, smap_id = model.write(
+        lp_file, io_options={"symbolic_solver_labels": False})
+    return lp_file, model.solutions.symbol_map[smap_id]
+
+
+def _start_values(symbol_map):
+    # Current values of the variables by their column names
+    values = {}
+    for symbol, ref in symbol_map.bySymbol.items():
+        var = ref()
+        if var is not None and var.is_variable_type() \
+                and var.value is not None:
+            values[symbol] = var.value
+    return values
+
+
+def _solve_lp(lp_file, tmp_dir, solver, options, time_limit=None,
+              start=None):
+    '''
+    Solves an LP file. A time limit of cbc also stops the process, returning
+    the status "time limit reached" without a solution. A start of column
+    values is only passed to HiGHS, cbc reads starts of integer columns
+    only.
+    '''
+    from .snapshot import solve_cbc, solve_highs
+
+    if solver == "highs":
+        return solve_highs(lp_file, options, start=start)
+    try:
+        # Some slack for cbc to stop on its own limit first
+        timeout = None if time_limit is None else 1.5 * time_limit + 1
+        return solve_cbc(lp_file, tmp_dir, options, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return TIME_LIMIT, None, {}
+
+
+def solve_with_budget(model, solver="cbc", cmdline_options=None,
+                      time_limit=None, gap=None, warm_start=False):
+    '''
+    Solves a built model within a time and gap budget and writes the best
+    solution found to the model, like oemof.solph.Model.solve does. The
+    solver results are set as model.solver_results and model.es.results.
+
+    Returns the status: "optimal", "feasible" if the solver stopped on the
+    budget with a feasible solution, or the status of the solver if no
+    feasible solution was found. In that case the model keeps no solution.
+    With a warm start, a solver stopped on the time limit keeps the start
+    as the "feasible" solution if it is within the constraints and bounds
+    of the model (see warm_start.start_violation). Any other status raises
+    an AssertionError.
+
+    :param model: Built oemof.solph model
+    :param solver: One of "cbc" or "highs"
+    :param cmdline_options: Options passed to the solver
+    :param time_limit: Time limit in seconds. None for no limit. Only for
+        the solver "highs", see check_time_limit
+    :param gap: Relative gap at which the solver stops
+    :param warm_start: If True, the current values of the variables are a
+        feasible start, e.g. of warm_start.set_start. HiGHS starts from them
+        and they are kept as the "feasible" solution if the solver stops on
+        the time limit without a solution
+    '''
+    import pyomo.environ as po
+    from .scaling import solver_results
+    from .snapshot import count_variables, load_values
+    from .warm_start import start_violation
+
+    check_time_limit(solver, time_limit)
+    options = budget_options(solver, cmdline_options, time_limit, gap)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lp_file, symbol_map = _write_lp(model, tmp_dir)
+        start_values = _start_values(symbol_map) if warm_start else None
+        start = time.perf_counter()
+        status, objective, values = _solve_lp(
+            lp_file, tmp_dir, solver, options, time_limit, start_values)
+        solve_time = round(time.perf_counter() - start, 4)
+
+    if status in ["optimal", "feasible"]:
+        load_values(symbol_map, values)
+    elif warm_start:
+        if status != TIME_LIMIT:
+            raise AssertionError(
+                f"Solver did not converge ({status}). Stopping simulation")
+        violation = start_violation(model)
+        if violation > START_TOLERANCE:
+            raise AssertionError(
+                f"Solver stopped on the time limit and the warm start "
+                f"violates the model by {violation:.3g}. Stopping simulation")
+        logger.warning("Solver stopped on the time limit, the warm start is "
+                       "kept")
+        status, objective = "feasible", po.value(model.objective)
+    else:
+        objective = None
+    if status != "optimal":
+        logger.warning(f"Model solved within the budget as {status}")
+
+    results = solver_results(status, objective, solve_time,
+                             count_variables(symbol_map), None, None)
+    model.solver_results = results
+    model.es.results = results
+    return status
+
+
+def benchmark_options(model, solver="cbc", candidates=None, time_limit=60.,
+                      repeats=1):
+    '''
+    Solves a built model with each of the candidate options and returns a
+    dataframe with the options, status, objective value and the best solve
+    time of each candidate, fastest first. The model is written only once.
+
+    :param model: Built oemof.solph model, e.g. of a sample horizon
+    :param solver: One of "cbc" or "highs"
+    :param candidates: List of option dictionaries. Defaults to CANDIDATES
+    :param time_limit: Time limit of each solve in seconds. Candidates
+        that reach it are reported with their status
+    :param repeats: Number of solves of each candidate
+    '''
+    import pandas as pd
+    from .snapshot import count_variables
+
+    if solver not in CANDIDATES:
+        raise ValueError('Parameter "solver" must be one "cbc" or "highs".')
+    if candidates is None:
+        candidates = CANDIDATES[solver]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lp_file, symbol_map = _write_lp(model, tmp_dir)
+        for options in candidates:
+            limited = budget_options(solver, options, time_limit=time_limit)
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                status, objective, _ = _solve_lp(
+                    lp_file, tmp_dir, solver, limited, time_limit)
+                times.append(time.perf_counter() - start)
+                if status != "optimal":
+                    break
+            rows.append({"options": options, "status": status,
+                         "objective": objective,
+                         "solve_time": round(min(times), 4)})
+            logger.info(f"{solver} {options}: {status} in {min(times):.2f} s")
+
+    table = pd.DataFrame(rows)
+    table["variables"] = count_variables(symbol_map)
+    return table.sort_values("solve_time", kind="stable",
+                             ignore_index=True)
+
+
+def _read_tuning(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def tune_solver(model, model_class, solver="cbc", candidates=None,
+                time_limit=60., repeats=1, path=TUNING_FILE):
+    '''
+    Benchmarks the candidate options on a built model and stores the
+    fastest options that reach the optimum for the model class and solver.
+    Returns the options and the benchmark of all the candidates.
+
+    A candidate only counts if it reaches the same objective as the
+    fastest optimal candidate, within a relative tolerance of 1e-6.
+
+    :param model: Built oemof.solph model of a sample horizon
+    :param model_class: Name of the model class, e.g. "district"
+    :param solver: One of "cbc" or "highs"
+    :param candidates: List of option dictionaries. Defaults to CANDIDATES
+    :param time_limit: Time limit of each solve in seconds
+    :param repeats: Number of solves of each candidate
+    :param path: JSON file with the tuned options
+    '''
+    table = benchmark_options(model, solver, candidates, time_limit, repeats)
+    optimal = table[table["status"] == "optimal"]
+    if optimal.empty:
+        raise AssertionError(
+            f"No candidate options solved the {model_class} model")
+
+    reference = optimal["objective"].min()
+    tolerance = 1e-6 * max(abs(reference), 1.)
+    optimal = optimal[(optimal["objective"] - reference).abs() <= tolerance]
+    best = optimal.iloc[0]
+
+    entry = {"options": best["options"],
+             "solve_time": best["solve_time"],
+             "variables": int(best["variables"]),
+             "tuned": datetime.date.today().isoformat()}
+
+    # Read and write under the same lock, other classes may be tuned at once
+    with file_lock(path):
+        tuning = _read_tuning(path)
+        tuning.setdefault(model_class, {})[solver] = entry
+        with atomic_write(path, "w", encoding="utf-8") as f:
+            json.dump(tuning, f, indent=2)
+
+    logger.info(
+        f"Options of {solver} for {model_class} tuned: {best['options']}")
+    return best["options"], table
+
+
+def tuned_options(model_class, solver="cbc", path=TUNING_FILE):
+    '''
+    Options stored by tune_solver for a model class and solver,
+    or None if the class was not tuned
+
+    :param model_class: Name of the model class, e.g. "district"
+    :param solver: Name of the solver
+    :param path: JSON file with the tuned options
+    '''
+    entry = _read_tuning(path).get(model_class, {}).get(solver)
+    return dict(entry["options"]) if entry is not None else None
+
+
+if __name__ == '__main__':
+    pass
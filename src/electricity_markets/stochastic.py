@@ -0,0 +1,192 @@
+'''
+Created on 19.10.2026
+
+Two-stage stochastic market models over price scenarios.
+
+The volumes of the future base and the future peak are committed before
+the day ahead and intraday prices are known (first stage). Every price
+scenario has its own energy system and model, built as usual with
+build_model_and_constraints, so the flows to the day ahead and intraday
+markets, the grid and the storages are the recourse of the scenario
+(second stage). The objective is the expected objective of the scenarios.
+
+Two ways of solving:
+
+* Extensive form: The scenario models are blocks of one pyomo model. Their
+  futures volumes equal shared first stage variables (non-anticipativity)
+  and the whole model is solved at once.
+* Scenario decomposition: The scenarios are solved in parallel worker
+  processes and coupled by a master problem of the futures volumes, with
+  the Benders cuts of decomposition.solve_decomposed (L-shaped method).
+  Only the master grows with the number of scenarios.
+'''
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Decisions of the first stage, shared by all the scenarios
+FIRST_STAGE = ["future_base", "future_peak"]
+
+
+def price_scenarios(market_data, n, spread=0.1, seed=None,
+                    columns=("day_ahead", "intra_day")):
+    '''
+    Price scenarios from a market dataframe with random factors on the
+    prices of the second stage markets. Day ahead prices get one factor
+    per hour, the other columns one per time step. The futures prices are
+    the same in every scenario.
+
+    Returns a list of n market dataframes.
+
+    :param market_data: Market dataframe, e.g. of get_market_dataframe
+    :param n: Number of scenarios
+    :param spread: Standard deviation of the factors
+    :param seed: Seed of the random factors
+    :param columns: Columns of the market data that change
+    '''
+    import numpy as np
+    from .compliance import block_starts
+    from .products import Products
+
+    rng = np.random.default_rng(seed)
+    steps = len(market_data)
+    hours = block_starts(Products.DAY_AHEAD, None, steps)
+    scenarios = []
+    for _ in range(n):
+        scenario = market_data.copy()
+        for column in columns:
+            factors = rng.normal(1., spread, steps)
+            if column == Products.DAY_AHEAD.value:
+                factors = factors[hours]
+            scenario[column] = market_data[column].values * factors
+        scenarios.append(scenario)
+    return scenarios
+
+
+def _probabilities(probabilities, n):
+    if probabilities is None:
+        return [1. / n] * n
+    if len(probabilities) != n or abs(sum(probabilities) - 1.) > 1e-9:
+        raise ValueError(
+            'Parameter "probabilities" must have one value per scenario '
+            'and sum to one.')
+    return list(probabilities)
+
+
+def build_extensive_form(energy_systems, probabilities=None):
+    '''
+    Builds the extensive form of a two-stage model: one pyomo model with a
+    block per scenario (named scenario_0, scenario_1 ...), the shared first
+    stage variables first_stage["future_base"] and first_stage["future_peak"]
+    and the expected objective. The scenario models are kept in
+    model.scenario_models.
+
+    :param energy_systems: Energy systems of the scenarios, with the same
+        time index and nodes
+    :param probabilities: Probabilities of the scenarios. None for equal
+        probabilities
+    '''
+    import pyomo.environ as po
+    from .electricity_market_constraints import (
+        build_model_and_constraints, futures_variables)
+
+    probabilities = _probabilities(probabilities, len(energy_systems))
+    models = [build_model_and_constraints(es) for es in energy_systems]
+    volumes = [futures_variables(m) for m in models]
+    names = [n for n in FIRST_STAGE if n in volumes[0]]
+
+    ef = po.ConcreteModel()
+    ef.first_stage = po.Var(names, within=po.NonNegativeReals)
+    for s, model in enumerate(models):
+        model.objective.deactivate()
+        ef.add_component(f"scenario_{s}", model)
+
+    pairs = [(s, n) for s in range(len(models)) for n in names]
+    ef.nonanticipativity = po.Constraint(
+        pairs, rule=lambda m, s, n: volumes[s][n] - m.first_stage[n] == 0)
+    ef.objective = po.Objective(expr=sum(
+        p * m.objective.expr for p, m in zip(probabilities, models)))
+    ef.scenario_models = models
+    return ef
+
+
+def solve_extensive_form(model, solver="cbc", cmdline_options=None):
+    '''
+    Solves an extensive form of build_extensive_form. The solver results
+    are set as solver_results of each scenario model and as results of its
+    energy system, so that they can be processed as usual.
+
+    Returns a dictionary with the status, the expected objective, the
+    solve time and the first stage volumes.
+
+    :param model: Model of build_extensive_form
+    :param solver: Name of the solver
+    :param cmdline_options: Options passed to the solver
+    '''
+    import pyomo.environ as po
+
+    opt = po.SolverFactory(solver)
+    for k, v in (cmdline_options or {}).items():
+        opt.options[k] = v
+
+    start = time.perf_counter()
+    results = opt.solve(model, tee=False)
+    solve_time = round(time.perf_counter() - start, 4)
+    status = str(results.Solver[0].Termination_condition)
+    if status != "optimal":
+        raise AssertionError(
+            f"Solver did not converge ({status}). Stopping simulation")
+
+    for scenario in model.scenario_models:
+        scenario.solver_results = results
+        scenario.es.results = results
+
+    first_stage = {n: model.first_stage[n].value for n in model.first_stage}
+    logger.info(f"Extensive form of {len(model.scenario_models)} scenarios "
+                f"solved in {solve_time:.1f} s")
+    return {"status": status, "objective": po.value(model.objective),
+            "solve_time": solve_time, "first_stage": first_stage}
+
+
+def solve_scenarios_decomposed(create_energy_system, scenarios,
+                               volume_bound, probabilities=None,
+                               processes=None, tolerance=1e-5,
+                               process_results=None, **kwargs):
+    '''
+    Solves a two-stage model by scenario decomposition: the scenarios are
+    solved in parallel processes and only the futures volumes are coupled
+    by the master of decomposition.solve_decomposed.
+
+    Returns the report of solve_decomposed with the first stage volumes
+    in "first_stage" and the results of the scenarios in their order.
+
+    :param create_energy_system: Function building the energy system of a
+        scenario from its arguments, importable by the worker processes
+    :param scenarios: List of the arguments of create_energy_system for
+        each scenario
+    :param volume_bound: Upper bound of the futures volumes
+    :param probabilities: Probabilities of the scenarios. None for equal
+        probabilities
+    :param processes: Number of worker processes. None for one per CPU
+    :param tolerance: Relative gap between the bounds of the expected
+        objective
+    :param process_results: Function returning the results of a solved
+        scenario model, see solve_decomposed
+    :param kwargs: Other arguments of solve_decomposed
+    '''
+    from .decomposition import solve_decomposed
+
+    probabilities = _probabilities(probabilities, len(scenarios))
+    report = solve_decomposed(
+        create_energy_system, scenarios, volume_bound, processes=processes,
+        tolerance=tolerance, process_results=process_results,
+        couple_storages=False, weights=probabilities, **kwargs)
+    report["first_stage"] = {n: report["coupling"][n] for n in FIRST_STAGE
+                             if n in report["coupling"]}
+    return report
+
+
+if __name__ == '__main__':
+    pass
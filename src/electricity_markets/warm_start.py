@@ -0,0 +1,210 @@
+'''
+Created on 19.10.2026
+
+Feasible starting points of the market models from greedy rules.
+
+A dispatch heuristic gives the flows of every time step without solving
+the model, e.g. by dispatching the storages and CHPs by the rank of the
+prices. The energy that reaches the market bus is then allocated to the
+markets with allocate_surplus:
+
+* The block products (future base, future peak, day ahead) are taken in
+  the order of their mean revenue within the blocks. A block gets the
+  smallest surplus of its time steps if its mean revenue beats the one of
+  the intra day market over the block, so the flow is constant within the
+  block and never exceeds the surplus.
+* The rest is sold on the intra day market. Where its revenue is below a
+  reserve price (e.g. zero for PV or the costs of a power plant), energy
+  that can be curtailed is not sold.
+
+The dispatch is written to the variables of a built model with set_start
+and passed to the solver with solver_tuning.solve_with_budget(...,
+warm_start=True). HiGHS starts from it. If the solver stops on the time
+limit without a feasible solution, the start is kept as the solution, but
+only if start_violation finds it within the constraints and bounds of the
+built model.
+
+For the linear programs of this library a start does not shorten the
+simplex of HiGHS, which has to find a basis for it first, and cbc only
+reads starts of integer variables. The start is a feasible dispatch that
+is available in milliseconds and bounds the objective, while the solver
+still runs to the optimum.
+'''
+
+import logging
+import numpy as np
+from .compliance import block_starts, peak_steps
+from .products import Products
+
+logger = logging.getLogger(__name__)
+
+
+def market_revenues(energy_system):
+    '''
+    Revenues per unit of energy of each market of an energy system (the
+    negative variable costs of the flows to the market sinks) as a
+    dictionary of product: array, and the mask of the peak time steps
+
+    :param energy_system: Energy system with the market sinks
+    '''
+    from .electricity_market_constraints import _cost_values, _market_flows
+
+    steps = len(energy_system.timeindex)
+    revenues = {}
+    for product, (_, _, flow) in _market_flows(energy_system).items():
+        revenues[product] = -_cost_values(flow.variable_costs, steps)
+    peak = peak_steps(revenues.get(Products.FUTURE_PEAK, np.zeros(steps)))
+    return revenues, peak
+
+
+def allocate_surplus(surplus, revenues, peak, curtailable=0.,
+                     reserve_price=0.):
+    '''
+    Greedy allocation of the energy at the market bus to the markets,
+    respecting the blocks of the products.
+
+    Returns a dictionary of product: flow array and the curtailed energy of
+    each time step. Without an intra day market, all the energy left by the
+    block products is curtailed.
+
+    :param surplus: Energy at the market bus of each time step
+    :param revenues: Revenues of the products, see market_revenues
+    :param peak: Mask of the peak time steps
+    :param curtailable: Part of the surplus of each time step that can be
+        left unsold, e.g. the PV production
+    :param reserve_price: Revenue below which curtailable energy is not sold
+        on the intra day market
+    '''
+    remaining = np.clip(np.asarray(surplus, dtype=float), 0., None)
+    steps = len(remaining)
+    free = revenues.get(Products.INTRA_DAY)
+    reference = np.maximum(np.full(steps, reserve_price, dtype=float)
+                           if free is None else free, reserve_price)
+
+    # Products with the best revenue within their blocks first
+    blocks = {}
+    for product in revenues:
+        if product != Products.INTRA_DAY:
+            starts = block_starts(product, peak, steps)
+            blocks[product] = starts, revenues[product][starts >= 0].mean() \
+                if (starts >= 0).any() else -np.inf
+
+    flows = {}
+    for product in sorted(blocks, key=lambda p: -blocks[p][1]):
+        starts = blocks[product][0]
+        inside = starts >= 0
+        volume = np.full(steps, np.inf)
+        np.minimum.at(volume, starts[inside], remaining[inside])
+        gain = np.zeros(steps)
+        np.add.at(gain, starts[inside],
+                  (revenues[product] - reference)[inside])
+        volume = np.where((gain > 0) & np.isfinite(volume), volume, 0.)
+        flows[product] = np.where(inside, volume[np.maximum(starts, 0)], 0.)
+        remaining = np.clip(remaining - flows[product], 0., None)
+
+    if free is None:
+        return flows, remaining
+    # Curtail where the intra day revenue is below the reserve price
+    curtailed = np.where(free < reserve_price,
+                         np.minimum(remaining, curtailable), 0.)
+    flows[Products.INTRA_DAY] = remaining - curtailed
+    return flows, curtailed
+
+
+def evaluate_start(energy_system, flows, contents=None):
+    '''
+    Objective value of a dispatch and its largest violation of the
+    constraints and bounds of the model, without building it (see
+    matrix_model.assemble). The initial storage contents are their fixed
+    level, or zero.
+
+    :param energy_system: Energy system, not built into a model
+    :param flows: Dataframe of the flows with the columns of
+        post_process_results, e.g. "b_el_out, s_da"
+    :param contents: Dataframe of the storage contents by storage label
+    '''
+    from .matrix_model import assemble
+
+    lp = assemble(energy_system)
+    steps = lp["steps"]
+    x = np.where(np.isfinite(lp["lower"]), lp["lower"], 0.)
+    for (i, o), k in lp["flows"].items():
+        column = f"{i.label}, {o.label}"
+        if column in flows:
+            x[k:k + steps] = flows[column].values
+    for n, k in lp["storages"].items():
+        if contents is not None and n.label in contents:
+            x[k:k + steps] = contents[n.label].values
+
+    residual = np.abs(lp["matrix"] @ x - lp["rhs"])
+    bounds = np.maximum(lp["lower"] - x, x - lp["upper"])
+    return {"objective": float(lp["costs"] @ x),
+            "violation": float(max(residual.max(initial=0.),
+                                   bounds.max(initial=0.), 0.))}
+
+
+def start_violation(model):
+    '''
+    Largest violation of the active constraints and variable bounds of a
+    built model by the current values of its variables, relative to the
+    size of the bound (at least 1). Infinite if a variable has no value.
+
+    :param model: Built oemof.solph model, e.g. with the values of set_start
+    '''
+    import pyomo.environ as po
+
+    def excess(value, lower, upper):
+        if value is None:
+            return np.inf
+        violation = 0.
+        if lower is not None:
+            violation = max(violation, (lower - value) / max(abs(lower), 1.))
+        if upper is not None:
+            violation = max(violation, (value - upper) / max(abs(upper), 1.))
+        return violation
+
+    largest = 0.
+    for var in model.component_data_objects(po.Var):
+        largest = max(largest, excess(var.value, var.lb, var.ub))
+    for con in model.component_data_objects(po.Constraint, active=True):
+        largest = max(largest, excess(po.value(con.body, exception=False),
+                                      po.value(con.lower),
+                                      po.value(con.upper)))
+    return largest
+
+
+def set_start(model, flows, contents=None):
+    '''
+    Writes a dispatch to the variables of a built model as the start of
+    solver_tuning.solve_with_budget. Fixed variables keep their values.
+
+    :param model: Built oemof.solph model
+    :param flows: Dataframe of the flows with the columns of
+        post_process_results, e.g. "b_el_out, s_da"
+    :param contents: Dataframe of the storage contents by storage label
+    '''
+    nodes = {str(n): n for n in model.es.nodes}
+    timesteps = list(model.TIMESTEPS)
+
+    def write(variables, values):
+        for t, value in zip(timesteps, values):
+            if not variables[t].fixed:
+                variables[t].set_value(float(value), skip_validation=True)
+
+    for column in flows:
+        i, o = column.split(", ")
+        write({t: model.flow[nodes[i], nodes[o], t] for t in timesteps},
+              flows[column].values)
+
+    if contents is not None and hasattr(model, "GenericStorageBlock"):
+        block = model.GenericStorageBlock
+        for label in contents:
+            storage = nodes[label]
+            write({t: block.storage_content[storage, t] for t in timesteps},
+                  contents[label].values)
+            if not block.init_content[storage].fixed:
+                block.init_content[storage].set_value(0.)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,534 @@
+'''
+Created on 19.10.2026
+
+Work queue for batches of scenarios on several machines.
+
+The scenario specifications of a batch are stored in an SQLite file on a
+shared filesystem. Any number of worker processes, on any machine that
+sees the file, claim the tasks, run them and write the results to a
+partitioned result store next to it:
+
+* Leases: A claimed task is leased to its worker for a number of seconds.
+  The worker extends the lease with a heartbeat while the task runs.
+* Crashed workers: Their leases run out and the tasks are claimed again by
+  other workers. A task is failed after max_attempts claims or errors.
+* Stragglers: Once no task is waiting, a task running much longer than the
+  finished tasks of its batch gets one backup run on another worker. The
+  first run to finish completes the task, the result of the other one is
+  dropped.
+* Resume: Submitting a batch again only adds the tasks that are not in the
+  queue yet, so an interrupted batch continues where it stopped.
+  reset_failed queues the failed tasks again.
+
+Every change of a task is one transaction, started with BEGIN IMMEDIATE,
+so no two workers claim the same task. The filesystem of the queue needs
+working file locks, as SQLite requires (e.g. a local disk, or NFS with
+locking enabled).
+
+The tasks are run by a target function, by default snapshot.run_snapshot,
+called as target(spec, cache=cache_dir, progress=None) like by the job
+service.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from .fileio import atomic_write
+from .job_service import DEFAULT_TARGET, _load_target, _to_json
+
+logger = logging.getLogger(__name__)
+
+# Seconds a task stays leased without a heartbeat
+LEASE_SECONDS = 120.
+
+# Claims and errors before a task fails
+MAX_ATTEMPTS = 3
+
+# A running task is a straggler once it runs this many times longer than
+# the median of the finished tasks of its batch
+STRAGGLER_FACTOR = 3.
+
+# Task states
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+STATES = [PENDING, LEASED, DONE, FAILED]
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    key TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    backup INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT,
+    UNIQUE (batch, key)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (batch, state);
+'''
+
+
+def spec_key(spec):
+    '''
+    Key of a scenario specification within its batch
+
+    :param spec: Scenario specification dictionary
+    '''
+    text = json.dumps(spec, sort_keys=True, default=_to_json)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def worker_name():
+    '''
+    Name of the current process as a worker: host and process id
+    '''
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue(object):
+    '''
+    Queue of scenario tasks in an SQLite file, shared by the workers of
+    all machines.
+
+    :param path: Path of the SQLite file, e.g. on a shared filesystem
+    :param lease: Seconds a task stays leased without a heartbeat
+    :param max_attempts: Claims and errors before a task fails
+    :param timeout: Seconds to wait for the lock of the file
+    '''
+
+    def __init__(self, path, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 timeout=60.):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Transactions are started explicitly
+        return sqlite3.connect(self.path, timeout=self.timeout,
+                               isolation_level=None)
+
+    def _transaction(self, function, *args):
+        '''
+        Runs function(connection, *args) in one write transaction
+        '''
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = function(conn, *args)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return value
+        finally:
+            conn.close()
+
+    # Batches
+
+    def submit(self, specs, batch="default"):
+        '''
+        Adds the scenarios of a batch. Scenarios already in the batch are
+        skipped, so a batch can be submitted again to resume it.
+        Returns the number of added tasks.
+
+        :param specs: List of scenario specification dictionaries
+        :param batch: Name of the batch
+        '''
+        rows = [(batch, spec_key(s), json.dumps(s, default=_to_json),
+                 PENDING) for s in specs]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (batch, key, spec, state) "
+                "VALUES (?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+        added = self._transaction(insert)
+        logger.info(f"{added} of {len(specs)} tasks added to batch {batch}")
+        return added
+
+    def reset_failed(self, batch="default"):
+        '''
+        Queues the failed tasks of a batch again.
+        Returns the number of tasks.
+
+        :param batch: Name of the batch
+        '''
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = ?, attempts = 0, backup = 0, "
+            "error = NULL WHERE batch = ? AND state = ?",
+            (PENDING, batch, FAILED)).rowcount)
+
+    def counts(self, batch=None):
+        '''
+        Number of tasks in each state, of one batch or of all batches
+
+        :param batch: Name of the batch. None for all batches
+        '''
+        query = "SELECT state, COUNT(*) FROM tasks"
+        args = ()
+        if batch is not None:
+            query += " WHERE batch = ?"
+            args = (batch,)
+        conn = self._connect()
+        try:
+            found = dict(conn.execute(query + " GROUP BY state", args))
+        finally:
+            conn.close()
+        return {state: found.get(state, 0) for state in STATES}
+
+    def finished(self, batch=None):
+        '''
+        True if no task of the batch is pending or leased
+
+        :param batch: Name of the batch. None for all batches
+        '''
+        counts = self.counts(batch)
+        return counts[PENDING] + counts[LEASED] == 0
+
+    def tasks(self, batch=None):
+        '''
+        Tasks as a dataframe with their state, attempts, worker, times,
+        result summary and error
+
+        :param batch: Name of the batch. None for all batches
+        '''
+        import pandas as pd
+
+        query = "SELECT * FROM tasks"
+        args = ()
+        if batch is not None:
+            query += " WHERE batch = ?"
+            args = (batch,)
+        conn = self._connect()
+        try:
+            table = pd.read_sql_query(query + " ORDER BY id", conn,
+                                      params=args)
+        finally:
+            conn.close()
+        for column in ["spec", "result"]:
+            table[column] = [None if v is None else json.loads(v)
+                             for v in table[column]]
+        return table
+
+    # Workers
+
+    def _straggler(self, conn, batch, now, factor):
+        '''
+        Leased task without a backup that runs longer than factor times
+        the median run time of the finished tasks of its batch
+        '''
+        durations = [r[0] for r in conn.execute(
+            "SELECT finished - started FROM tasks WHERE batch = ? AND "
+            "state = ? ORDER BY finished - started", (batch, DONE))]
+        if not durations:
+            return None
+        median = durations[len(durations) // 2]
+        return conn.execute(
+            "SELECT * FROM tasks WHERE batch = ? AND state = ? AND "
+            "backup = 0 AND started < ? ORDER BY started LIMIT 1",
+            (batch, LEASED, now - factor * max(median, 1.))).fetchone()
+
+    def claim(self, worker=None, batch=None,
+              straggler_factor=STRAGGLER_FACTOR):
+        '''
+        Leases the next task to a worker. Tasks whose lease ran out are
+        claimed again, or failed after max_attempts claims. Without waiting
+        tasks, a straggler gets a backup run.
+
+        Returns the task as a dictionary (id, batch, key, spec, attempts,
+        backup) or None if there is nothing to run.
+
+        :param worker: Name of the worker. Defaults to worker_name()
+        :param batch: Name of the batch. None for all batches
+        :param straggler_factor: See STRAGGLER_FACTOR. None for no backups
+        '''
+        worker = worker or worker_name()
+
+        def lease(conn):
+            conn.row_factory = sqlite3.Row
+            now = time.time()
+            scope = "" if batch is None else " AND batch = :batch"
+            args = {"now": now, "batch": batch, "max": self.max_attempts,
+                    "pending": PENDING, "leased": LEASED, "failed": FAILED}
+            conn.execute(
+                "UPDATE tasks SET state = :failed, error = 'Lease expired "
+                "after ' || attempts || ' attempts' WHERE state = :leased "
+                "AND lease_until < :now AND attempts >= :max" + scope, args)
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE (state = :pending OR (state = "
+                ":leased AND lease_until < :now))" + scope +
+                " ORDER BY id LIMIT 1", args).fetchone()
+            backup = False
+            if row is None and straggler_factor is not None:
+                batches = [batch] if batch is not None else [
+                    r[0] for r in conn.execute(
+                        "SELECT DISTINCT batch FROM tasks WHERE state = ?",
+                        (LEASED,))]
+                for name in batches:
+                    row = self._straggler(conn, name, now, straggler_factor)
+                    if row is not None:
+                        backup = True
+                        break
+            if row is None:
+                return None
+
+            if backup:
+                # The first run keeps its start time and lease
+                conn.execute("UPDATE tasks SET backup = 1 WHERE id = ?",
+                             (row["id"],))
+            else:
+                conn.execute(
+                    "UPDATE tasks SET state = ?, worker = ?, "
+                    "lease_until = ?, started = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (LEASED, worker, now + self.lease, now, row["id"]))
+            return {"id": row["id"], "batch": row["batch"],
+                    "key": row["key"], "spec": json.loads(row["spec"]),
+                    "attempts": row["attempts"] + int(not backup),
+                    "backup": backup}
+
+        task = self._transaction(lease)
+        if task is not None:
+            logger.info(f"Task {task['id']} of batch {task['batch']} "
+                        f"leased to {worker}"
+                        f"{' as backup' if task['backup'] else ''}")
+        return task
+
+    def heartbeat(self, task_id):
+        '''
+        Extends the lease of a running task. Returns False if the task is
+        no longer leased, e.g. because a backup run finished it.
+
+        :param task_id: Id of the task
+        '''
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND state = ?",
+            (time.time() + self.lease, task_id, LEASED)).rowcount) > 0
+
+    def complete(self, task_id, worker=None, result=None):
+        '''
+        Marks a task as done, also if its lease ran out meanwhile. Returns
+        False if another run finished it first.
+
+        :param task_id: Id of the task
+        :param worker: Name of the worker. Defaults to worker_name()
+        :param result: Summary of the result, stored as JSON
+        '''
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = ?, worker = ?, finished = ?, "
+            "result = ?, error = NULL WHERE id = ? AND state != ?",
+            (DONE, worker or worker_name(), time.time(),
+             json.dumps(result, default=_to_json), task_id,
+             DONE)).rowcount) > 0
+
+    def fail(self, task_id, error, backup=False):
+        '''
+        Records the error of a run. The task is queued again, or failed
+        after max_attempts. The error of a backup run leaves the first run
+        going. Returns the state of the task.
+
+        :param task_id: Id of the task
+        :param error: Description of the error
+        :param backup: True for the error of a backup run
+        '''
+        def update(conn):
+            if backup:
+                conn.execute("UPDATE tasks SET error = ? WHERE id = ?",
+                             (error, task_id))
+            else:
+                conn.execute(
+                    "UPDATE tasks SET state = CASE WHEN attempts >= ? "
+                    "THEN ? ELSE ? END, error = ?, lease_until = NULL, "
+                    "backup = 0 WHERE id = ? AND state = ?",
+                    (self.max_attempts, FAILED, PENDING, error, task_id,
+                     LEASED))
+            return conn.execute("SELECT state FROM tasks WHERE id = ?",
+                                (task_id,)).fetchone()[0]
+
+        return self._transaction(update)
+
+
+class ResultStore(object):
+    '''
+    Results of the tasks in a directory tree partitioned by batch, model
+    and year, e.g. store/batch=b1/model=district/year=2019/<key>.pkl.
+    Entries are written atomically, so a crashed or dropped run leaves no
+    partial files. Their paths are relative to the root, so the store can
+    be mounted at another path on each machine.
+
+    :param store_dir: Root directory of the store
+    '''
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def path(self, batch, spec, key):
+        '''
+        Path of the result of a task
+
+        :param batch: Name of the batch
+        :param spec: Scenario specification dictionary
+        :param key: Key of the task
+        '''
+        return os.path.join(
+            self.store_dir, f"batch={batch}",
+            f"model={spec.get('model', 'district')}",
+            f"year={spec.get('year', 'all')}", key + ".pkl")
+
+    def put(self, batch, spec, key, value):
+        '''
+        Stores the result of a task and returns its path relative to the
+        root of the store
+
+        :param batch: Name of the batch
+        :param spec: Scenario specification dictionary
+        :param key: Key of the task
+        :param value: Picklable result
+        '''
+        path = self.path(batch, spec, key)
+        with atomic_write(path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return os.path.relpath(path, self.store_dir)
+
+    def get(self, path):
+        '''
+        Reads a stored result
+
+        :param path: Path of the result relative to the root of the store,
+            see the task results of the queue
+        '''
+        with open(os.path.join(self.store_dir, path), "rb") as f:
+            return pickle.load(f)
+
+
+def _heartbeats(queue, task_id, stop, interval):
+    while not stop.wait(interval):
+        if not queue.heartbeat(task_id):
+            return
+
+
+def run_task(queue, store, task, target, cache_dir=None, worker=None):
+    '''
+    Runs a claimed task, holding its lease with heartbeats, stores the
+    result and completes the task. Errors are recorded with fail.
+    Returns the state of the task after the run.
+
+    :param queue: WorkQueue
+    :param store: ResultStore
+    :param task: Task of WorkQueue.claim
+    :param target: Function running a scenario, see the module description
+    :param cache_dir: Result cache directory passed to the target
+    :param worker: Name of the worker. Defaults to worker_name()
+    '''
+    stop = threading.Event()
+    beat = threading.Thread(
+        target=_heartbeats, args=(queue, task["id"], stop, queue.lease / 3),
+        daemon=True)
+    beat.start()
+    start = time.perf_counter()
+    try:
+        output = target(task["spec"], cache=cache_dir, progress=None)
+    except Exception as e:
+        logger.warning(f"Task {task['id']} failed: {e!r}")
+        return queue.fail(task["id"], f"{e!r}\n{traceback.format_exc()}",
+                          backup=task["backup"])
+    finally:
+        stop.set()
+        beat.join()
+
+    path = store.put(task["batch"], task["spec"], task["key"],
+                     {"results": output.get("results"),
+                      "kpis": output.get("kpis")})
+    summary = {"path": path, "kpis": output.get("kpis"),
+               "timings": output.get("timings"),
+               "cached": output.get("cached"),
+               "run_time": round(time.perf_counter() - start, 4)}
+    if not queue.complete(task["id"], worker, summary):
+        # Both runs wrote the same entry, the first one is kept in the queue
+        logger.info(f"Task {task['id']} was finished by another run")
+    return DONE
+
+
+def run_worker(queue_path, store_dir, batch=None, target=DEFAULT_TARGET,
+               cache_dir=None, lease=LEASE_SECONDS, poll=5.,
+               max_tasks=None, wait=True):
+    '''
+    Claims and runs tasks until the batch is finished. Start any number of
+    workers, on any machine that sees the queue and the store.
+
+    Returns the number of tasks run by the worker.
+
+    :param queue_path: Path of the SQLite file of the queue
+    :param store_dir: Root directory of the result store
+    :param batch: Name of the batch. None for all batches
+    :param target: Function running a scenario, given as "module:function"
+    :param cache_dir: Result cache directory passed to the target
+    :param lease: Seconds a task stays leased without a heartbeat
+    :param poll: Seconds between claims while other workers hold all the
+        remaining tasks
+    :param max_tasks: Maximum number of tasks run. None for no limit
+    :param wait: If True, waits for the leases of other workers to run out
+        or their tasks to finish, otherwise stops once nothing is waiting
+    '''
+    queue = WorkQueue(queue_path, lease=lease)
+    store = ResultStore(store_dir)
+    function = _load_target(target)
+    worker = worker_name()
+    runs = 0
+    while max_tasks is None or runs < max_tasks:
+        task = queue.claim(worker, batch)
+        if task is None:
+            if not wait or queue.finished(batch):
+                break
+            time.sleep(poll)
+            continue
+        run_task(queue, store, task, function, cache_dir, worker)
+        runs += 1
+    logger.info(f"Worker {worker} stopped after {runs} tasks")
+    return runs
+
+
+def run_workers(queue_path, store_dir, processes=None, **kwargs):
+    '''
+    Runs several workers of run_worker on this machine in their own
+    processes and waits for them. Returns the number of tasks run.
+
+    :param queue_path: Path of the SQLite file of the queue
+    :param store_dir: Root directory of the result store
+    :param processes: Number of worker processes. None for one per CPU
+    :param kwargs: Other arguments of run_worker
+    '''
+    import multiprocessing
+
+    processes = processes or os.cpu_count()
+    # Fresh interpreters, like the workers of the job service
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        runs = [pool.apply_async(run_worker, (queue_path, store_dir),
+                                 kwargs) for _ in range(processes)]
+        return sum(r.get() for r in runs)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,47 @@
+'''
+Created on 19.10.2026
+
+Tests of the re-optimization of the district during the day.
+'''
+
+import numpy as np
+import pytest
+from examples import district_model_4_markets as district
+from examples.intraday_reoptimization import IntradayModel
+
+pytest.importorskip("highspy")
+
+YEAR = 2019
+DAY = 180
+STEPS = 24 * 4
+
+
+@pytest.fixture(scope="module")
+def day_data():
+    boundary_data = district.get_district_dataframe(year=YEAR)
+    market_data = district.get_market_dataframe(days=DAY + 1, year=YEAR)
+    day = slice(DAY * STEPS, (DAY + 1) * STEPS)
+    return boundary_data.iloc[day], market_data.iloc[day]
+
+
+def test_reoptimize_equals_fresh_solve(day_data):
+    boundary_data, market_data = day_data
+    intraday = IntradayModel(boundary_data.copy(), market_data.copy())
+    rng = np.random.default_rng(1)
+    for now in [0, 24, 36, 60, 72]:
+        prices = intraday.market_data["intra_day"].iloc[now:] * \
+            rng.normal(1, 0.1, STEPS - now)
+        metrics = intraday.reoptimize(now, intra_day=prices)
+        assert metrics["status"] == "optimal"
+
+    # The same past dispatch and prices on a model solved only once
+    fresh = IntradayModel(intraday.boundary_data.copy(),
+                          intraday.market_data.copy())
+    for t in range(now):
+        for var, planned in zip(fresh._step_variables[t],
+                                intraday._step_variables[t]):
+            var.setlb(planned.value)
+            var.setub(planned.value)
+    assert fresh.solve() == "optimal"
+    assert metrics["objective"] == pytest.approx(
+        fresh.model.objective(), rel=1e-6, abs=1e-6)
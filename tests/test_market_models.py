@@ -0,0 +1,111 @@
+'''
+Created on 19.10.2026
+
+Regression tests of the objective of the district model: the market
+constraints and compact costs of build_model_and_constraints, the matrix
+engine and the decomposition against the original constraints.
+'''
+
+import os
+import sys
+import pyomo.environ as po
+import pytest
+from oemof.solph import Model
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "examples"))
+from district_model_4_markets import (  # noqa: E402
+    Scenarios, create_energy_system, get_district_dataframe,
+    get_market_dataframe, solve_district_decomposed, solve_model)
+try:
+    from electricity_markets.electricity_market_constraints import \
+        build_model_and_constraints
+    from electricity_markets.matrix_model import solve_matrix_model
+except Exception:
+    from src.electricity_markets.electricity_market_constraints import \
+        build_model_and_constraints
+    from src.electricity_markets.matrix_model import solve_matrix_model
+
+DAYS = 7
+YEAR = 2019
+
+
+def baseline_model(energy_system):
+    '''
+    Model with the market constraints of the first version of
+    build_model_and_constraints: one constraint per time step and the
+    variable costs of every flow in the objective
+
+    :param energy_system: Energy System with the appropiate markets.
+    '''
+    model = Model(energy_system)
+    flows = {str(o): (i, o) for (i, o) in model.flows
+             if str(i) == "b_el_out"}
+    bus = [n for n in energy_system.nodes if n.label == "b_el_out"][0]
+    key = [k for k in bus.outputs.keys() if "s_fp" in str(k)][0]
+    peak_price = bus.outputs[key].variable_costs
+
+    i, o = flows["s_da"]
+    model.day_ahead = po.Constraint(
+        [t for t in model.TIMESTEPS if t % 4 != 0],
+        rule=lambda m, t: m.flow[i, o, t] == m.flow[i, o, t - t % 4])
+    i_fb, o_fb = flows["s_fb"]
+    model.future_base = po.Constraint(
+        [t for t in model.TIMESTEPS if t != 0],
+        rule=lambda m, t: m.flow[i_fb, o_fb, t] == m.flow[i_fb, o_fb, 0])
+    i_fp, o_fp = flows["s_fp"]
+    peak = [t for t in model.TIMESTEPS if abs(peak_price[t]) > 0.001]
+    model.future_peak = po.Constraint(
+        [t for t in model.TIMESTEPS if t not in peak[:1]],
+        rule=lambda m, t: m.flow[i_fp, o_fp, t] == (
+            m.flow[i_fp, o_fp, peak[0]] if t in peak else 0))
+    return model
+
+
+def energy_system(scenario, days=DAYS):
+    '''
+    Energy system of the district for a short horizon
+
+    :param scenario: One of the Scenarios
+    :param days: Number of days
+    '''
+    boundary_data = get_district_dataframe(year=YEAR).head(days * 24 * 4)
+    market_data = get_market_dataframe(days=days, year=YEAR,
+                                       scenario=scenario)
+    return create_energy_system(boundary_data, market_data)
+
+
+def objective(model):
+    '''
+    Objective of a model solved with cbc
+    '''
+    solve_model(model)
+    return model.objective()
+
+
+@pytest.fixture(scope="module", params=list(Scenarios),
+                ids=lambda s: s.name)
+def scenario(request):
+    model = baseline_model(energy_system(request.param))
+    return request.param, objective(model)
+
+
+def test_constraints(scenario):
+    scenario, expected = scenario
+    model = build_model_and_constraints(energy_system(scenario))
+    assert objective(model) == pytest.approx(expected, rel=1e-6)
+    model = build_model_and_constraints(energy_system(scenario),
+                                        compact_costs=False)
+    assert objective(model) == pytest.approx(expected, rel=1e-6)
+
+
+def test_matrix_model(scenario):
+    scenario, expected = scenario
+    solution = solve_matrix_model(energy_system(scenario))
+    assert solution["objective"] == pytest.approx(expected, rel=1e-6)
+
+
+def test_decomposition(scenario):
+    scenario, expected = scenario
+    _, report = solve_district_decomposed(days=DAYS, year=YEAR,
+                                          scenario=scenario, freq="D",
+                                          processes=2)
+    assert report["objective"] == pytest.approx(expected, rel=1e-5)
@@ -0,0 +1,73 @@
+'''
+Created on 19.10.2026
+
+Tests of the partitioned price store.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+try:
+    from electricity_markets.price_store import PriceStore
+except Exception:
+    from src.electricity_markets.price_store import PriceStore
+
+
+def synthetic_prices(year, hours=48):
+    '''
+    Prices of two markets in hourly resolution
+
+    :param year: Year of the time stamps
+    :param hours: Number of time steps
+    '''
+    index = pd.date_range(f"{year}-01-01", periods=hours, freq="H",
+                          tz="Europe/Berlin")
+    return pd.DataFrame({"day_ahead": np.arange(hours) + year,
+                         "future_base": np.full(hours, float(year))},
+                        index=index)
+
+
+def _append(root, year):
+    store = PriceStore(root)
+    store.append(synthetic_prices(year), year=year)
+    store.override(year, "future_base", year + 0.5)
+    return year
+
+
+def test_parallel_appends(tmp_path):
+    root = str(tmp_path / "prices")
+    years = list(range(2000, 2016))
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        assert sorted(executor.map(_append, [root] * len(years), years)) \
+            == years
+
+    store = PriceStore(root)
+    assert store.years() == years
+    for year in years:
+        prices = store.read(year)
+        assert (prices["day_ahead"].values == np.arange(48) + year).all()
+        assert (prices["future_base"].values == year + 0.5).all()
+    # Each override is a new version, none was written twice
+    assert store.vacuum() == len(years)
+
+
+def test_read_keeps_memory_maps(tmp_path):
+    store = PriceStore(str(tmp_path))
+    store.append(synthetic_prices(2019))
+    prices = store.read(2019)
+    prices.mean()
+    for market in prices:
+        values = prices[market].values
+        assert isinstance(values, np.memmap)
+        assert not values.flags.writeable
+
+
+def test_get_or_create_parameters(tmp_path):
+    store = PriceStore(str(tmp_path))
+    store.append(synthetic_prices(2019), parameters={"mean_da": 40})
+    assert len(store.get_or_create(2019, mean_da=40.)) == 48
+    with pytest.raises(ValueError):
+        store.get_or_create(2019, mean_da=50)
+    with pytest.raises(ValueError):
+        store.get_or_create(2019)